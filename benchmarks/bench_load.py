@@ -0,0 +1,332 @@
+#!/usr/bin/env python3
+"""
+Teste de carga ponta a ponta
+============================
+
+Sobe stubs do Ollama, do WTS e do PostgREST do Supabase com latências
+configuráveis, inicia o servidor (`src/server.py`) em um subprocesso apontando
+para eles (Qdrant em memória) e envia webhooks sintéticos do WTS para
+`/webhook/wts` em chegadas de Poisson na taxa pedida.
+
+Cada conversa tem no máximo uma mensagem aguardando resposta: a latência de
+resposta vai do POST do webhook até o envio chegar no stub do WTS. Mensagens
+sem resposta até `--reply-timeout` contam como erro.
+
+Relata vazão, latência de resposta e de confirmação (p50/p95/p99) e taxa de
+erro em JSON. Com `--max-p95-ms`/`--max-error-rate` o script sai com código 1
+quando o limite é ultrapassado, para uso como verificação de regressão.
+
+Uso:
+    python benchmarks/bench_load.py --rate 5 --duration 60 --conversations 50
+    python benchmarks/bench_load.py --rate 20 --ollama-latency 0.4 --env LLM_MAX_IN_FLIGHT=4 --max-p95-ms 8000
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import subprocess
+import sys
+import tempfile
+import time
+import uuid
+from datetime import datetime, timezone
+
+import httpx
+
+from stub_servers import create_ollama_stub, create_postgrest_stub, create_wts_stub, serve, shutdown
+
+SRC_DIR = os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "src")
+
+QUESTIONS = [
+    "Qual o horário de atendimento?",
+    "Vocês entregam no sábado?",
+    "Como faço para trocar um produto?",
+    "Quais formas de pagamento vocês aceitam?",
+    "Meu pedido ainda não chegou, o que faço?",
+    "Tem loja física em São Paulo?",
+    "Qual o prazo de entrega para o interior?",
+    "Posso cancelar uma compra feita ontem?",
+]
+
+DOCUMENTS = [
+    "Atendemos de segunda a sexta, das 8h às 18h, e aos sábados das 9h às 13h.",
+    "Entregas são feitas de segunda a sábado; o prazo para capitais é de 2 dias úteis.",
+    "Trocas podem ser solicitadas em até 30 dias após o recebimento, com nota fiscal.",
+    "Aceitamos cartão de crédito em até 10x, Pix e boleto bancário.",
+    "Pedidos atrasados podem ser acompanhados pelo código de rastreio enviado por e-mail.",
+    "Nossa loja física fica na Avenida Paulista, 1000, em São Paulo.",
+    "Para o interior o prazo de entrega é de 3 a 7 dias úteis.",
+    "Cancelamentos antes do envio são gratuitos e o estorno ocorre em até 5 dias úteis.",
+]
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+def latency_summary(values):
+    return {
+        "p50_ms": round(percentile(values, 0.50) * 1000, 1),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 1),
+        "p99_ms": round(percentile(values, 0.99) * 1000, 1),
+        "max_ms": round(max(values) * 1000, 1) if values else 0.0,
+    }
+
+def phone_for(conversation: int) -> str:
+    return f"119{conversation:08d}"
+
+def make_webhook(conversation: int, text: str, message_id: str) -> dict:
+    """Payload sintético no formato do WtsWebhookData"""
+    now = datetime.now(timezone.utc).isoformat()
+    phone = phone_for(conversation)
+    return {
+        "responseKeys": [],
+        "sessionId": f"session-{conversation}",
+        "session": {
+            "id": f"session-{conversation}",
+            "createdAt": now,
+            "departmentId": "dep-load",
+            "userId": "user-load",
+            "number": phone,
+        },
+        "channel": {"id": "channel-load", "key": "5511900000000", "platform": "WhatsApp", "displayName": "Load Test"},
+        "contact": {
+            "id": f"contact-{conversation}",
+            "name": f"Contato {conversation}",
+            "first-name": "Contato",
+            "phonenumber": f"+55|{phone}",
+            "display-phonenumber": f"+55 {phone}",
+            "metadata": {},
+        },
+        "questions": {},
+        "menus": {},
+        "templates": {},
+        "metadata": {},
+        "lastContactMessage": text,
+        "lastMessage": {"id": message_id, "createdAt": now, "type": "TEXT", "text": text},
+        "lastMessagesAggregated": {"text": text, "files": []},
+    }
+
+class ReplyTracker:
+    """Associa cada resposta que chega ao stub do WTS à mensagem pendente da conversa"""
+
+    def __init__(self):
+        self.pending = {}  # telefone -> instante do POST do webhook
+        self.latencies = []
+        self.unmatched = 0
+
+    def sent(self, phone: str):
+        self.pending[phone] = time.perf_counter()
+
+    def on_send(self, to: str, text: str):
+        started = self.pending.pop(to.replace("+55", "", 1), None)
+        if started is None:
+            self.unmatched += 1
+        else:
+            self.latencies.append(time.perf_counter() - started)
+
+    def expire(self, timeout: float) -> int:
+        now = time.perf_counter()
+        expired = [phone for phone, started in self.pending.items() if now - started > timeout]
+        for phone in expired:
+            del self.pending[phone]
+        return len(expired)
+
+def start_server(port: int, env: dict, log_path: str) -> subprocess.Popen:
+    log = open(log_path, "w")
+    return subprocess.Popen(
+        [sys.executable, "-m", "uvicorn", "server:app", "--app-dir", SRC_DIR,
+         "--host", "127.0.0.1", "--port", str(port), "--log-level", "warning"],
+        env=env, stdout=log, stderr=subprocess.STDOUT,
+    )
+
+async def wait_ready(client: httpx.AsyncClient, url: str, process: subprocess.Popen, timeout: float):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"servidor terminou durante a inicialização (código {process.returncode})")
+        try:
+            if (await client.get(url)).status_code == 200:
+                return
+        except httpx.HTTPError:
+            pass
+        await asyncio.sleep(0.5)
+    raise TimeoutError("servidor não ficou pronto a tempo")
+
+async def run_load(client: httpx.AsyncClient, base_url: str, tracker: ReplyTracker, args) -> dict:
+    idle = list(range(args.conversations))
+    busy = {}  # telefone -> conversa
+    ack_latencies = []
+    counters = {"sent": 0, "ack_errors": 0, "reply_timeouts": 0, "skipped_busy": 0}
+    in_flight = set()
+
+    async def post(conversation: int):
+        phone = phone_for(conversation)
+        payload = make_webhook(conversation, random.choice(QUESTIONS), str(uuid.uuid4()))
+        started = time.perf_counter()
+        try:
+            response = await client.post(f"{base_url}/webhook/wts", json=payload)
+            ok = response.status_code == 200 and response.json().get("status") == "success"
+        except httpx.HTTPError:
+            ok = False
+        ack_latencies.append(time.perf_counter() - started)
+        if not ok:
+            counters["ack_errors"] += 1
+            tracker.pending.pop(phone, None)
+
+    def release_answered():
+        for phone in [phone for phone in busy if phone not in tracker.pending]:
+            idle.append(busy.pop(phone))
+
+    started = time.perf_counter()
+    deadline = started + args.duration
+    next_arrival = started
+    while time.perf_counter() < deadline:
+        next_arrival += random.expovariate(args.rate)
+        await asyncio.sleep(max(0.0, next_arrival - time.perf_counter()))
+        counters["reply_timeouts"] += tracker.expire(args.reply_timeout)
+        release_answered()
+        if not idle:
+            counters["skipped_busy"] += 1
+            continue
+        conversation = idle.pop(random.randrange(len(idle)))
+        busy[phone_for(conversation)] = conversation
+        tracker.sent(phone_for(conversation))
+        counters["sent"] += 1
+        task = asyncio.create_task(post(conversation))
+        in_flight.add(task)
+        task.add_done_callback(in_flight.discard)
+
+    # Espera as respostas pendentes (até o timeout de resposta)
+    if in_flight:
+        await asyncio.gather(*in_flight)
+    drain_deadline = time.perf_counter() + args.reply_timeout
+    while tracker.pending and time.perf_counter() < drain_deadline:
+        await asyncio.sleep(0.1)
+    counters["reply_timeouts"] += len(tracker.pending)
+    elapsed = time.perf_counter() - started
+
+    replies = len(tracker.latencies)
+    sent = counters["sent"]
+    return {
+        **counters,
+        "replies": replies,
+        "unmatched_replies": tracker.unmatched,
+        "elapsed_seconds": round(elapsed, 2),
+        "throughput_replies_per_second": round(replies / elapsed, 3) if elapsed else 0.0,
+        "error_rate": round((counters["ack_errors"] + counters["reply_timeouts"]) / sent, 4) if sent else 0.0,
+        "reply_latency": latency_summary(tracker.latencies),
+        "ack_latency": latency_summary(ack_latencies),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Teste de carga ponta a ponta com stubs do Ollama, WTS e Supabase")
+    parser.add_argument("--rate", type=float, default=2.0, help="Webhooks por segundo (chegadas de Poisson)")
+    parser.add_argument("--duration", type=float, default=30.0, help="Duração da fase de carga em segundos")
+    parser.add_argument("--conversations", type=int, default=20, help="Conversas simultâneas distintas")
+    parser.add_argument("--reply-timeout", type=float, default=60.0)
+    parser.add_argument("--ollama-latency", type=float, default=0.3, help="Segundos até o primeiro token")
+    parser.add_argument("--tokens-per-second", type=float, default=40.0)
+    parser.add_argument("--reply-tokens", type=int, default=40)
+    parser.add_argument("--ollama-instances", type=int, default=1)
+    parser.add_argument("--wts-latency", type=float, default=0.1)
+    parser.add_argument("--wts-failure-rate", type=float, default=0.0)
+    parser.add_argument("--supabase-latency", type=float, default=0.03)
+    parser.add_argument("--jitter", type=float, default=0.2, help="Variação (fração) aplicada a todas as latências")
+    parser.add_argument("--seed-docs", type=int, default=len(DOCUMENTS), help="Documentos inseridos na base antes da carga")
+    parser.add_argument("--env", action="append", default=[], metavar="CHAVE=VALOR",
+                        help="Variável de ambiente extra para o servidor (ex: LLM_MAX_IN_FLIGHT=4)")
+    parser.add_argument("--startup-timeout", type=float, default=300.0)
+    parser.add_argument("--max-p95-ms", type=float, help="Falha se o p95 da latência de resposta passar disso")
+    parser.add_argument("--max-error-rate", type=float, help="Falha se a taxa de erro passar disso")
+    parser.add_argument("--output", help="Arquivo para gravar o resultado em JSON")
+    args = parser.parse_args()
+
+    tracker = ReplyTracker()
+    ollama_ports = [free_port() for _ in range(args.ollama_instances)]
+    wts_port, postgrest_port, server_port = free_port(), free_port(), free_port()
+    stubs = [
+        await serve(create_ollama_stub(latency=args.ollama_latency, tokens_per_second=args.tokens_per_second,
+                                       reply_tokens=args.reply_tokens, jitter=args.jitter, name=f"ollama-{i}"), port)
+        for i, port in enumerate(ollama_ports)
+    ]
+    wts_app = create_wts_stub(latency=args.wts_latency, jitter=args.jitter,
+                              failure_rate=args.wts_failure_rate, on_send=tracker.on_send)
+    postgrest_app = create_postgrest_stub(latency=args.supabase_latency, jitter=args.jitter)
+    stubs += [await serve(wts_app, wts_port), await serve(postgrest_app, postgrest_port)]
+
+    env = {
+        **os.environ,
+        "SUPABASE_PUBLIC_URL": f"http://127.0.0.1:{postgrest_port}",
+        "ANON_KEY": "stub.stub.stub",
+        "WTS_API_TOKEN": "stub",
+        "WTS_API_URL": f"http://127.0.0.1:{wts_port}",
+        "OLLAMA_HOST": "127.0.0.1",
+        "OLLAMA_PORT": str(ollama_ports[0]),
+        "OLLAMA_URLS": ",".join(f"http://127.0.0.1:{port}" for port in ollama_ports),
+        "OLLAMA_MODEL": "stub",
+        "QDRANT_HOST": ":memory:",
+        "WORK_QUEUE_BACKEND": "",
+        "DEDUPE_BACKEND": "memory",
+        "LOG_LEVEL": "WARNING",
+    }
+    env.update(item.split("=", 1) for item in args.env)
+
+    log_path = os.path.join(tempfile.gettempdir(), f"bench_load_server_{server_port}.log")
+    process = start_server(server_port, env, log_path)
+    base_url = f"http://127.0.0.1:{server_port}"
+    failed = False
+    try:
+        async with httpx.AsyncClient(timeout=args.reply_timeout) as client:
+            await wait_ready(client, f"{base_url}/", process, args.startup_timeout)
+            if args.seed_docs:
+                documents = [DOCUMENTS[i % len(DOCUMENTS)] for i in range(args.seed_docs)]
+                (await client.post(f"{base_url}/knowledge", json=documents)).raise_for_status()
+
+            results = await run_load(client, base_url, tracker, args)
+            server_stats = (await client.get(f"{base_url}/stats")).json()
+
+        report = {
+            "config": vars(args),
+            "results": results,
+            "stubs": {
+                "ollama_requests": sum(stub.config.app.state.requests for stub in stubs[:len(ollama_ports)]),
+                "wts_sent": wts_app.state.sent,
+                "wts_failed": wts_app.state.failed,
+                "supabase_requests": postgrest_app.state.requests,
+            },
+            "server_stats": {key: server_stats.get(key) for key in ("llm_scheduler", "ollama_pool", "message_coalescer")},
+        }
+        print(json.dumps(report, indent=2, ensure_ascii=False))
+        if args.output:
+            with open(args.output, "w") as f:
+                json.dump(report, f, indent=2, ensure_ascii=False)
+
+        if args.max_p95_ms is not None and results["reply_latency"]["p95_ms"] > args.max_p95_ms:
+            print(f"❌ p95 {results['reply_latency']['p95_ms']}ms acima do limite de {args.max_p95_ms}ms", file=sys.stderr)
+            failed = True
+        if args.max_error_rate is not None and results["error_rate"] > args.max_error_rate:
+            print(f"❌ Taxa de erro {results['error_rate']} acima do limite de {args.max_error_rate}", file=sys.stderr)
+            failed = True
+    except Exception as e:
+        print(f"❌ {e} (log do servidor: {log_path})", file=sys.stderr)
+        failed = True
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=15)
+        except subprocess.TimeoutExpired:
+            process.kill()
+        await shutdown(*stubs)
+
+    return 1 if failed else 0
+
+if __name__ == "__main__":
+    sys.exit(asyncio.run(main()))
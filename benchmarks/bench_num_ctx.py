@@ -0,0 +1,110 @@
+#!/usr/bin/env python3
+"""
+Benchmark de memória e latência por bucket de num_ctx
+=====================================================
+
+Para cada bucket de num_ctx envia algumas gerações a um Ollama real e relata:
+- latência da primeira requisição (inclui o recarregamento do modelo)
+- latência média das seguintes e tempos de avaliação do prompt/geração
+- memória do modelo carregado segundo /api/ps (size e size_vram)
+- estimativa do cache KV a partir dos metadados do modelo (/api/show)
+
+Uso:
+    python benchmarks/bench_num_ctx.py --url http://localhost:11434 --model llama3.2
+    python benchmarks/bench_num_ctx.py --buckets 2048,4096,8192 --num-predict 128 --output num_ctx.json
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import sys
+import time
+
+import httpx
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.prompt_builder import PromptBuilder  # noqa: E402
+
+def kv_cache_estimate(model_info: dict, num_ctx: int) -> int:
+    """Bytes do cache KV em f16: 2 (K e V) * camadas * num_ctx * cabeças KV * dimensão da cabeça * 2 bytes"""
+    arch = model_info.get("general.architecture", "")
+    layers = model_info.get(f"{arch}.block_count")
+    embedding = model_info.get(f"{arch}.embedding_length")
+    heads = model_info.get(f"{arch}.attention.head_count")
+    kv_heads = model_info.get(f"{arch}.attention.head_count_kv", heads)
+    if not all([layers, embedding, heads, kv_heads]):
+        return 0
+    head_dim = embedding // heads
+    return 2 * layers * num_ctx * kv_heads * head_dim * 2
+
+async def generate(client, url, model, messages, options):
+    started = time.perf_counter()
+    response = await client.post(f"{url}/api/chat", json={"model": model, "messages": messages, "options": options, "stream": False})
+    response.raise_for_status()
+    elapsed = time.perf_counter() - started
+    lines = [json.loads(line) for line in response.text.strip().split("\n") if line.strip()]
+    final = next((c for c in reversed(lines) if c.get("done")), {})
+    return elapsed, final
+
+async def main():
+    parser = argparse.ArgumentParser(description="Memória e latência por bucket de num_ctx")
+    parser.add_argument("--url", default="http://localhost:11434")
+    parser.add_argument("--model", default="llama3.2")
+    parser.add_argument("--buckets", default="2048,4096,8192")
+    parser.add_argument("--num-predict", type=int, default=128)
+    parser.add_argument("--requests", type=int, default=5, help="Gerações por bucket (além da primeira)")
+    parser.add_argument("--output", help="Arquivo JSON para salvar os resultados")
+    args = parser.parse_args()
+
+    builder = PromptBuilder()
+    messages = builder.build(
+        "Qual é o horário de atendimento?",
+        ["Atendemos de segunda a sexta, das 8h às 18h.", "Aos sábados o atendimento é das 8h às 12h."],
+        [{"direction": "incoming", "content": "Oi, tudo bem?"}, {"direction": "outgoing", "content": "Tudo sim! Como posso ajudar?"}],
+    )
+
+    results = []
+    async with httpx.AsyncClient(timeout=300.0) as client:
+        model_info = {}
+        try:
+            show = await client.post(f"{args.url}/api/show", json={"model": args.model})
+            model_info = show.json().get("model_info", {})
+        except Exception as e:
+            print(f"⚠️ /api/show indisponível: {e}")
+
+        for num_ctx in [int(x) for x in args.buckets.split(",")]:
+            options = {"temperature": 0.7, "num_ctx": num_ctx, "num_predict": args.num_predict}
+            first_latency, _ = await generate(client, args.url, args.model, messages, options)
+            runs = [await generate(client, args.url, args.model, messages, options) for _ in range(args.requests)]
+
+            memory = {}
+            try:
+                ps = (await client.get(f"{args.url}/api/ps")).json()
+                loaded = next((m for m in ps.get("models", []) if m.get("name", "").startswith(args.model)), {})
+                memory = {"size_bytes": loaded.get("size"), "size_vram_bytes": loaded.get("size_vram")}
+            except Exception as e:
+                print(f"⚠️ /api/ps indisponível: {e}")
+
+            n = len(runs) or 1
+            results.append({
+                "num_ctx": num_ctx,
+                "first_request_ms": round(first_latency * 1000, 1),
+                "avg_latency_ms": round(sum(r[0] for r in runs) / n * 1000, 1),
+                "avg_prompt_eval_ms": round(sum(r[1].get("prompt_eval_duration", 0) for r in runs) / n / 1e6, 1),
+                "avg_eval_ms": round(sum(r[1].get("eval_duration", 0) for r in runs) / n / 1e6, 1),
+                "avg_eval_count": sum(r[1].get("eval_count", 0) for r in runs) / n,
+                "kv_cache_estimate_bytes": kv_cache_estimate(model_info, num_ctx),
+                **memory,
+            })
+            print(json.dumps(results[-1]))
+
+    report = {"url": args.url, "model": args.model, "num_predict": args.num_predict, "results": results}
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"✅ Resultados salvos em {args.output}")
+
+if __name__ == "__main__":
+    asyncio.run(main())
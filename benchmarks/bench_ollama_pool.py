@@ -0,0 +1,112 @@
+#!/usr/bin/env python3
+"""
+Benchmark do roteamento entre instâncias do Ollama
+==================================================
+
+Sobe várias instâncias stub do Ollama com latências diferentes e dispara
+gerações concorrentes através do OllamaPool, comparando a distribuição de
+carga e a latência com e sem hedging.
+
+Uso:
+    python benchmarks/bench_ollama_pool.py
+    python benchmarks/bench_ollama_pool.py --latencies 0.05,0.2,0.8 --requests 300 --hedge-delay 0.3
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from services.ollama_pool import OllamaPool  # noqa: E402
+from stub_servers import create_ollama_stub, serve, shutdown  # noqa: E402
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+async def run_scenario(urls, args, hedge_delay):
+    pool = OllamaPool(urls, hedge_delay=hedge_delay, affinity=not args.no_affinity)
+    latencies = []
+    errors = 0
+    semaphore = asyncio.Semaphore(args.concurrency)
+
+    async def one(i):
+        nonlocal errors
+        conversation_id = f"conv-{i % args.conversations}"
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                response = await pool.post(
+                    "/api/chat",
+                    json={"model": "stub", "messages": [{"role": "user", "content": "x" * 400}]},
+                    conversation_id=conversation_id,
+                )
+                response.raise_for_status()
+                latencies.append(time.perf_counter() - started)
+            except Exception:
+                errors += 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(args.requests)))
+    elapsed = time.perf_counter() - started
+    stats = pool.stats()
+    await pool.close()
+    return {
+        "hedge_delay": hedge_delay,
+        "requests": args.requests,
+        "errors": errors,
+        "throughput_rps": round(args.requests / elapsed, 2),
+        "latency_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "p99": round(percentile(latencies, 0.99) * 1000, 1),
+            "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "distribution": {e["url"]: e["requests"] for e in stats["endpoints"]},
+        "hedges_fired": stats["hedges_fired"],
+        "hedges_won": stats["hedges_won"],
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Benchmark do OllamaPool com instâncias stub")
+    parser.add_argument("--latencies", default="0.05,0.2,0.6", help="Latência (s) de cada instância stub")
+    parser.add_argument("--jitter", type=float, default=0.5, help="Variação aleatória da latência")
+    parser.add_argument("--failure-rate", type=float, default=0.0, help="Taxa de erro 500 da instância mais lenta")
+    parser.add_argument("--requests", type=int, default=200)
+    parser.add_argument("--concurrency", type=int, default=20)
+    parser.add_argument("--conversations", type=int, default=50)
+    parser.add_argument("--hedge-delay", type=float, default=0.25)
+    parser.add_argument("--no-affinity", action="store_true")
+    parser.add_argument("--base-port", type=int, default=11500)
+    args = parser.parse_args()
+
+    latencies = [float(x) for x in args.latencies.split(",")]
+    servers = []
+    for i, latency in enumerate(latencies):
+        app = create_ollama_stub(
+            latency=latency,
+            jitter=args.jitter,
+            reply_tokens=5,
+            tokens_per_second=200,
+            failure_rate=args.failure_rate if i == len(latencies) - 1 else 0.0,
+            name=f"stub-{i}",
+        )
+        servers.append(await serve(app, args.base_port + i))
+    urls = [f"http://127.0.0.1:{args.base_port + i}" for i in range(len(latencies))]
+
+    try:
+        results = [await run_scenario(urls, args, 0.0)]
+        if args.hedge_delay:
+            results.append(await run_scenario(urls, args, args.hedge_delay))
+    finally:
+        await shutdown(*servers)
+
+    print(json.dumps({"latencies": latencies, "results": results}, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
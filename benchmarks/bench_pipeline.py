@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark de latência ponta a ponta do process_message
+======================================================
+
+Compara o pipeline atual (etapas independentes em paralelo) com a execução
+sequencial das mesmas etapas (histórico -> contexto -> geração -> salvar ->
+enviar), usando backends stub em memória com latências configuráveis.
+
+Uso:
+    python benchmarks/bench_pipeline.py
+    python benchmarks/bench_pipeline.py --history-ms 80 --search-ms 40 --generate-ms 300 --runs 50
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import config  # noqa: E402
+from controllers.messages import process_message  # noqa: E402
+from models.schemas import Message  # noqa: E402
+
+class StubSupabase:
+    def __init__(self, history_ms, save_ms):
+        self.history_s = history_ms / 1000
+        self.save_s = save_ms / 1000
+
+    async def get_conversation_history(self, conversation_id, limit=10):
+        await asyncio.sleep(self.history_s)
+        return [{"direction": "incoming", "content": "Qual o horário de atendimento?"}]
+
+    async def save_message(self, message):
+        await asyncio.sleep(self.save_s)
+        return message.id
+
+class StubRAG:
+    def __init__(self, embed_ms, search_ms, generate_ms):
+        self.embed_s = embed_ms / 1000
+        self.search_s = search_ms / 1000
+        self.generate_s = generate_ms / 1000
+
+    def embed_query(self, text):
+        time.sleep(self.embed_s)  # CPU do modelo de embedding
+        return [0.0] * 384
+
+    async def retrieve_context(self, query, conversation_history=None, n_results=3, query_embedding=None):
+        def search():
+            if query_embedding is None:
+                self.embed_query(query)
+            time.sleep(self.search_s)
+            return ["Atendemos de segunda a sexta, das 8h às 18h."]
+        return await asyncio.to_thread(search)
+
+    async def generate_response(self, user_message, context, conversation_history=None, conversation_id=None,
+                                summary=None):
+        await asyncio.sleep(self.generate_s)
+        return "Atendemos de segunda a sexta, das 8h às 18h."
+
+class StubWTS:
+    def __init__(self, send_ms):
+        self.send_s = send_ms / 1000
+
+    async def send_message(self, message):
+        await asyncio.sleep(self.send_s)
+        return True
+
+async def sequential(message, conversation_id, supabase, rag, wts):
+    """Ordem original: cada etapa espera a anterior"""
+    history = await supabase.get_conversation_history(conversation_id)
+    context = await rag.retrieve_context(message.content, history)
+    response = await rag.generate_response(message.content, context, history)
+    outgoing = message.model_copy(update={"content": response, "direction": "outgoing"})
+    await supabase.save_message(outgoing)
+    await wts.send_message(outgoing)
+
+def summarize(latencies):
+    latencies = sorted(latencies)
+    return {
+        "p50_ms": round(latencies[len(latencies) // 2] * 1000, 1),
+        "p95_ms": round(latencies[min(len(latencies) - 1, int(0.95 * len(latencies)))] * 1000, 1),
+        "mean_ms": round(statistics.mean(latencies) * 1000, 1),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Latência do process_message: sequencial x paralelo")
+    parser.add_argument("--history-ms", type=float, default=80)
+    parser.add_argument("--embed-ms", type=float, default=15)
+    parser.add_argument("--search-ms", type=float, default=40)
+    parser.add_argument("--generate-ms", type=float, default=300)
+    parser.add_argument("--save-ms", type=float, default=60)
+    parser.add_argument("--send-ms", type=float, default=120)
+    parser.add_argument("--runs", type=int, default=30)
+    args = parser.parse_args()
+
+    supabase = StubSupabase(args.history_ms, args.save_ms)
+    rag = StubRAG(args.embed_ms, args.search_ms, args.generate_ms)
+    wts = StubWTS(args.send_ms)
+    config._supabase_manager = supabase
+    config._rag_system = rag
+    config._external_api = wts
+
+    message = Message(
+        id="bench", conversation_id="conv-bench", platform="whatsapp", sender="11999999999",
+        receiver="bot", content="Qual o horário de atendimento?", direction="incoming", message_type="text",
+    )
+
+    results = {}
+    for name, run in (
+        ("sequential", lambda: sequential(message, "conv-bench", supabase, rag, wts)),
+        ("concurrent", lambda: process_message(message, "conv-bench")),
+    ):
+        latencies = []
+        for _ in range(args.runs):
+            started = time.perf_counter()
+            ok = await run()
+            latencies.append(time.perf_counter() - started)
+            if ok is False:
+                # Pipeline quebrado: a latência de uma execução que falhou não vale como comparação
+                raise SystemExit(f"{name}: process_message retornou False; veja o log acima")
+        results[name] = summarize(latencies)
+
+    results["speedup_p50"] = round(results["sequential"]["p50_ms"] / results["concurrent"]["p50_ms"], 2)
+    print(json.dumps({"stage_latency_ms": vars(args), "results": results}, indent=2))
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,254 @@
+#!/usr/bin/env python3
+"""
+Micro-benchmarks do RAGSystem
+=============================
+
+Mede, com o modelo de embedding real e o Qdrant em memória (ou um Qdrant local):
+
+- vazão do `encode` em vários tamanhos de lote;
+- documentos/s do `add_documents_to_rag`;
+- latência do `retrieve_context` (com e sem o embedding da consulta) conforme
+  a coleção cresce, preenchida com vetores sintéticos;
+- custo da montagem do prompt e das opções de geração;
+- RSS do processo após cada fase.
+
+O resultado vai em JSON, com commit, hardware e versões, para comparar
+execuções entre commits e máquinas.
+
+Uso:
+    python benchmarks/bench_rag.py --output rag.json
+    python benchmarks/bench_rag.py --sizes 1000,10000,100000,1000000 --qdrant-host localhost
+
+Obs: com o Qdrant em memória a busca é exaustiva e 1M de pontos ocupa ~1,5 GB
+só de vetores; para coleções grandes prefira um Qdrant local (--qdrant-host).
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import platform
+import random
+import statistics
+import subprocess
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+import numpy as np  # noqa: E402
+from qdrant_client.http.models import PointStruct  # noqa: E402
+from services.rag_system import RAGSystem  # noqa: E402
+
+QUERIES = [
+    "Qual o horário de atendimento?",
+    "Vocês entregam no sábado?",
+    "Como faço para trocar um produto?",
+    "Quais formas de pagamento vocês aceitam?",
+    "Meu pedido ainda não chegou, o que faço?",
+    "Qual o prazo de entrega para o interior?",
+]
+
+SENTENCES = [
+    "Atendemos de segunda a sexta, das 8h às 18h, e aos sábados das 9h às 13h.",
+    "Entregas são feitas de segunda a sábado; o prazo para capitais é de 2 dias úteis.",
+    "Trocas podem ser solicitadas em até 30 dias após o recebimento, com nota fiscal.",
+    "Aceitamos cartão de crédito em até 10x, Pix e boleto bancário.",
+    "Pedidos atrasados podem ser acompanhados pelo código de rastreio enviado por e-mail.",
+    "Cancelamentos antes do envio são gratuitos e o estorno ocorre em até 5 dias úteis.",
+]
+
+VECTOR_SIZE = 384
+
+def rss_bytes():
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+def percentile(values, p):
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+def latency_summary(values):
+    return {
+        "p50_ms": round(percentile(values, 0.50) * 1000, 3),
+        "p95_ms": round(percentile(values, 0.95) * 1000, 3),
+        "mean_ms": round(statistics.mean(values) * 1000, 3) if values else 0.0,
+    }
+
+def synthetic_texts(n):
+    return [f"{SENTENCES[i % len(SENTENCES)]} Referência {i}." for i in range(n)]
+
+def environment(rag):
+    try:
+        commit = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                cwd=os.path.dirname(__file__)).stdout.strip() or None
+    except OSError:
+        commit = None
+    try:
+        import torch
+        torch_info = {"version": torch.__version__, "threads": torch.get_num_threads()}
+    except ImportError:
+        torch_info = None
+    return {
+        "commit": commit,
+        "platform": platform.platform(),
+        "processor": platform.processor(),
+        "cpu_count": os.cpu_count(),
+        "python": platform.python_version(),
+        "torch": torch_info,
+        "embedding_device": str(getattr(rag.embedding_model, "device", "unknown")),
+    }
+
+def bench_encode(rag, batch_sizes, n_texts):
+    texts = synthetic_texts(n_texts)
+    rag.embedding_model.encode(texts[:8])  # aquecimento
+    results = {}
+    for batch_size in batch_sizes:
+        started = time.perf_counter()
+        rag.embedding_model.encode(texts, batch_size=batch_size)
+        elapsed = time.perf_counter() - started
+        results[str(batch_size)] = {"texts_per_second": round(n_texts / elapsed, 1), "seconds": round(elapsed, 3)}
+    return results
+
+async def bench_add_documents(rag, n_docs, batch):
+    texts = [f"{text} (add)" for text in synthetic_texts(n_docs)]
+    started = time.perf_counter()
+    for i in range(0, n_docs, batch):
+        await rag.add_documents_to_rag(texts[i:i + batch])
+    elapsed = time.perf_counter() - started
+    return {"documents": n_docs, "batch": batch, "docs_per_second": round(n_docs / elapsed, 1), "seconds": round(elapsed, 3)}
+
+def grow_collection(rag, current, target, rng, batch=1000):
+    """Completa a coleção até `target` pontos com vetores unitários aleatórios"""
+    for start in range(current, target, batch):
+        count = min(batch, target - start)
+        vectors = rng.standard_normal((count, VECTOR_SIZE)).astype(np.float32)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        rag.qdrant.upsert(
+            collection_name=rag.collection_name,
+            points=[
+                PointStruct(id=start + i, vector=vector.tolist(), payload={"document": f"documento sintético {start + i}"})
+                for i, vector in enumerate(vectors)
+            ],
+            wait=True,
+        )
+    return target
+
+async def bench_retrieve(rag, sizes, n_queries, seed):
+    rng = np.random.default_rng(seed)
+    embeddings = {query: rag.embed_query(query) for query in QUERIES}
+    results = []
+    size = 0
+    for target in sizes:
+        started = time.perf_counter()
+        size = grow_collection(rag, size, target, rng)
+        fill_seconds = time.perf_counter() - started
+
+        full, search_only, empty = [], [], 0
+        for i in range(n_queries):
+            query = QUERIES[i % len(QUERIES)]
+            started = time.perf_counter()
+            documents = await rag.retrieve_context(query)
+            full.append(time.perf_counter() - started)
+            empty += not documents
+
+            started = time.perf_counter()
+            await rag.retrieve_context(query, query_embedding=embeddings[query])
+            search_only.append(time.perf_counter() - started)
+
+        results.append({
+            "points": size,
+            "fill_seconds": round(fill_seconds, 2),
+            "retrieve_context": latency_summary(full),
+            "search_only": latency_summary(search_only),
+            "empty_results": empty,
+            "rss_bytes": rss_bytes(),
+        })
+        print(f"  {size} pontos: p50 {results[-1]['retrieve_context']['p50_ms']}ms", file=sys.stderr)
+    return results
+
+def bench_prompt(rag, iterations):
+    context = SENTENCES[:3]
+    history = [
+        {"direction": "incoming" if i % 2 == 0 else "outgoing", "content": SENTENCES[i % len(SENTENCES)]}
+        for i in range(10)
+    ]
+    started = time.perf_counter()
+    for _ in range(iterations):
+        messages = rag.prompt_builder.build(QUERIES[0], context, history)
+    build_elapsed = time.perf_counter() - started
+
+    started = time.perf_counter()
+    for _ in range(iterations):
+        rag.generation_options.build(messages)
+    options_elapsed = time.perf_counter() - started
+    return {
+        "iterations": iterations,
+        "prompt_build_us": round(build_elapsed / iterations * 1e6, 2),
+        "generation_options_us": round(options_elapsed / iterations * 1e6, 2),
+    }
+
+async def main():
+    parser = argparse.ArgumentParser(description="Micro-benchmarks do RAGSystem")
+    parser.add_argument("--qdrant-host", default=":memory:", help="':memory:' ou host de um Qdrant local")
+    parser.add_argument("--qdrant-port", type=int, default=6333)
+    parser.add_argument("--collection", default="bench_knowledge_base")
+    parser.add_argument("--batch-sizes", default="1,8,32,128")
+    parser.add_argument("--encode-texts", type=int, default=512)
+    parser.add_argument("--add-docs", type=int, default=1000)
+    parser.add_argument("--add-batch", type=int, default=100)
+    parser.add_argument("--sizes", default="1000,10000,100000", help="Tamanhos da coleção para a busca")
+    parser.add_argument("--queries", type=int, default=50)
+    parser.add_argument("--prompt-iterations", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--output", help="Arquivo para gravar o resultado em JSON")
+    args = parser.parse_args()
+    random.seed(args.seed)
+
+    rss_start = rss_bytes()
+    rag = RAGSystem(ollama_url="http://127.0.0.1:11434", ollama_model="bench",
+                    qdrant_host=args.qdrant_host, qdrant_port=args.qdrant_port)
+    rag.collection_name = args.collection
+    rss_model = rss_bytes()
+    if not await rag.initialize_qdrant():
+        raise SystemExit("Não foi possível inicializar o Qdrant")
+
+    report = {"config": vars(args), "environment": environment(rag)}
+    try:
+        # A coleção de benchmark começa vazia mesmo num Qdrant local
+        rag.qdrant.delete_collection(rag.collection_name)
+        rag._collection_ready = False
+        await rag.retrieve_context("aquecimento")
+
+        print("encode...", file=sys.stderr)
+        report["encode"] = bench_encode(rag, [int(x) for x in args.batch_sizes.split(",")], args.encode_texts)
+        print("add_documents_to_rag...", file=sys.stderr)
+        report["add_documents"] = await bench_add_documents(rag, args.add_docs, args.add_batch)
+        rag.qdrant.delete_collection(rag.collection_name)
+        rag._collection_ready = False
+        await rag.retrieve_context("aquecimento")
+
+        print("retrieve_context...", file=sys.stderr)
+        report["retrieve"] = await bench_retrieve(rag, sorted(int(x) for x in args.sizes.split(",")), args.queries, args.seed)
+        report["prompt"] = bench_prompt(rag, args.prompt_iterations)
+        report["memory"] = {
+            "rss_start_bytes": rss_start,
+            "rss_after_model_bytes": rss_model,
+            "rss_end_bytes": rss_bytes(),
+        }
+    finally:
+        if args.qdrant_host != ":memory:":
+            rag.qdrant.delete_collection(rag.collection_name)
+        await rag.ollama_pool.close()
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+
+if __name__ == "__main__":
+    asyncio.run(main())
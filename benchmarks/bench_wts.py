@@ -0,0 +1,132 @@
+#!/usr/bin/env python3
+"""
+Benchmark da fila de envio ao WTS
+=================================
+
+Sobe um stub do WTS com limite de envios por número de origem (429 com
+Retry-After acima dele) e falhas 5xx aleatórias, e envia rajadas de mensagens
+por vários canais com o WtsAPIService enviando direto (comportamento anterior:
+uma tentativa, qualquer erro descarta a mensagem) e com o OutboundDispatcher
+(token bucket por canal, retentativas e dead-letter). Mede vazão, entregues,
+descartadas, 429 recebidos e latência de envio.
+
+Uso:
+    python benchmarks/bench_wts.py
+    python benchmarks/bench_wts.py --messages 500 --channels 8 --arrival-rate 200 --stub-rate 5 --failure-rate 0.05
+"""
+
+import argparse
+import asyncio
+import json
+import os
+import random
+import socket
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(__file__), "..", "src"))
+
+from models.schemas import Message  # noqa: E402
+from services.outbound import DeadLetterStore  # noqa: E402
+from services.wts_api import WtsAPIService  # noqa: E402
+from stub_servers import create_wts_stub, serve_in_thread, shutdown_thread  # noqa: E402
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+def percentile(values, p: float) -> float:
+    values = sorted(values)
+    return values[min(len(values) - 1, int(p * len(values)))] if values else 0.0
+
+async def run(service: WtsAPIService, app, args) -> dict:
+    """Envia `messages` mensagens em chegadas de Poisson, distribuídas entre os canais"""
+    sent_before, limited_before = app.state.sent, app.state.rate_limited
+    latencies, results = [], []
+
+    async def send(i: int):
+        message = Message(
+            id=str(i), conversation_id="bench", platform="whatsapp",
+            sender=f"1190000{i % args.channels:04d}", receiver=f"1198{i:07d}",
+            content=f"resposta {i}", message_type="text", direction="outgoing"
+        )
+        started = time.perf_counter()
+        results.append(await service.send_message(message))
+        latencies.append(time.perf_counter() - started)
+
+    started = time.perf_counter()
+    tasks = []
+    for i in range(args.messages):
+        tasks.append(asyncio.create_task(send(i)))
+        await asyncio.sleep(random.expovariate(args.arrival_rate))
+    await asyncio.gather(*tasks)
+    elapsed = time.perf_counter() - started
+
+    delivered = app.state.sent - sent_before
+    report = {
+        "seconds": round(elapsed, 2),
+        "delivered": delivered,
+        "dropped": results.count(False),
+        "delivered_per_second": round(delivered / elapsed, 1),
+        "stub_429": app.state.rate_limited - limited_before,
+        "send_ms": {
+            "p50": round(percentile(latencies, 0.50) * 1000, 1),
+            "p95": round(percentile(latencies, 0.95) * 1000, 1),
+            "max": round(max(latencies) * 1000, 1),
+        },
+    }
+    if service.dispatcher is not None:
+        stats = await service.dispatcher.stats()
+        report["dispatcher"] = {key: stats[key] for key in ("sent", "retries", "rate_limited", "failed", "rejected", "expired", "dead_letters")}
+        report["dispatcher"]["rate_wait_seconds"] = round(stats["rate_wait_seconds"], 2)
+    return report
+
+async def main():
+    parser = argparse.ArgumentParser(description="Envio direto x OutboundDispatcher contra um stub do WTS com limite")
+    parser.add_argument("--messages", type=int, default=300)
+    parser.add_argument("--channels", type=int, default=4)
+    parser.add_argument("--arrival-rate", type=float, default=100, help="Mensagens/s geradas (todas as origens)")
+    parser.add_argument("--latency-ms", type=float, default=30)
+    parser.add_argument("--failure-rate", type=float, default=0.02, help="Fração de respostas 503 do stub")
+    parser.add_argument("--stub-rate", type=float, default=10, help="Envios/s aceitos por canal no stub")
+    parser.add_argument("--stub-burst", type=int, default=10)
+    parser.add_argument("--stub-retry-after", type=float, default=1.0)
+    parser.add_argument("--rate", type=float, default=None, help="Limite por canal do dispatcher (padrão: --stub-rate)")
+    parser.add_argument("--burst", type=int, default=None, help="Rajada do dispatcher (padrão: --stub-burst)")
+    parser.add_argument("--concurrency", type=int, default=16)
+    parser.add_argument("--max-attempts", type=int, default=4)
+    parser.add_argument("--retry-base-delay", type=float, default=0.2)
+    args = parser.parse_args()
+    random.seed(42)
+
+    port = free_port()
+    app = create_wts_stub(latency=args.latency_ms / 1000, failure_rate=args.failure_rate,
+                          rate_limit=args.stub_rate, rate_burst=args.stub_burst, retry_after=args.stub_retry_after)
+    server = serve_in_thread(app, port)
+    url = f"http://127.0.0.1:{port}"
+    report = {"config": vars(args)}
+    try:
+        direct = WtsAPIService("bench", api_url=url)
+        report["direct"] = await run(direct, app, args)
+        await direct.close()
+        # Limite do stub volta ao normal antes do próximo cenário
+        await asyncio.sleep(args.stub_burst / args.stub_rate)
+
+        dispatched = WtsAPIService("bench", api_url=url, dispatcher_options={
+            "rate": args.rate if args.rate is not None else args.stub_rate,
+            "burst": args.burst if args.burst is not None else args.stub_burst,
+            "max_concurrency": args.concurrency,
+            "max_attempts": args.max_attempts,
+            "retry_base_delay": args.retry_base_delay,
+            "dead_letters": DeadLetterStore(),
+        })
+        report["dispatcher"] = await run(dispatched, app, args)
+        await dispatched.close()
+    finally:
+        shutdown_thread(server)
+
+    print(json.dumps(report, indent=2, ensure_ascii=False))
+
+if __name__ == "__main__":
+    asyncio.run(main())
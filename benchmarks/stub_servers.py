@@ -0,0 +1,251 @@
+"""
+Servidores stub para benchmarks locais
+======================================
+
+Implementações mínimas das APIs externas usadas pelo servidor, com latência
+configurável, para medir o comportamento do sistema sem depender dos serviços reais.
+
+Uso:
+    from stub_servers import create_ollama_stub, serve
+    server = await serve(create_ollama_stub(latency=0.2), port=11500)
+
+Stubs disponíveis: Ollama (`create_ollama_stub`), WTS (`create_wts_stub`) e
+PostgREST do Supabase (`create_postgrest_stub`).
+"""
+
+import asyncio
+import json
+import random
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, Response, StreamingResponse
+
+def create_ollama_stub(latency: float = 0.1, tokens_per_second: float = 50.0, reply_tokens: int = 20,
+                       jitter: float = 0.0, failure_rate: float = 0.0, name: str = "ollama-stub") -> FastAPI:
+    """
+    Stub do Ollama (/api/chat, /api/tags)
+
+    Args:
+        latency: Tempo de avaliação do prompt em segundos (até o primeiro token)
+        tokens_per_second: Velocidade de geração dos tokens de resposta
+        reply_tokens: Quantidade de tokens na resposta
+        jitter: Variação aleatória (fração) aplicada à latência
+        failure_rate: Fração das requisições que respondem HTTP 500
+        name: Identificador devolvido na resposta
+    """
+    app = FastAPI()
+    app.state.requests = 0
+    app.state.in_flight = 0
+
+    @app.get("/api/tags")
+    async def tags():
+        return {"models": [{"name": "stub:latest"}]}
+
+    @app.post("/api/chat")
+    async def chat(request: Request):
+        body = await request.json()
+        app.state.requests += 1
+        if random.random() < failure_rate:
+            return JSONResponse({"error": "stub failure"}, status_code=500)
+        prompt_chars = sum(len(m.get("content", "")) for m in body.get("messages", []))
+        options = body.get("options", {})
+        n_tokens = min(reply_tokens, options.get("num_predict", reply_tokens) or reply_tokens)
+        delay = latency * (1 + random.uniform(-jitter, jitter))
+
+        async def generate():
+            app.state.in_flight += 1
+            started = time.perf_counter()
+            try:
+                await asyncio.sleep(delay)
+                prompt_done = time.perf_counter()
+                for i in range(n_tokens):
+                    yield json.dumps({"message": {"role": "assistant", "content": f"tok{i} "}, "done": False}) + "\n"
+                    await asyncio.sleep(1 / tokens_per_second)
+                yield json.dumps({
+                    "message": {"role": "assistant", "content": f"[{name}]"},
+                    "done": True,
+                    "prompt_eval_count": prompt_chars // 4,
+                    "prompt_eval_duration": int((prompt_done - started) * 1e9),
+                    "eval_count": n_tokens,
+                    "eval_duration": int((time.perf_counter() - prompt_done) * 1e9),
+                }) + "\n"
+            finally:
+                app.state.in_flight -= 1
+
+        return StreamingResponse(generate(), media_type="application/x-ndjson")
+
+    return app
+
+def create_wts_stub(latency: float = 0.05, jitter: float = 0.0, failure_rate: float = 0.0, on_send=None,
+                    rate_limit: float = 0.0, rate_burst: int = 1, retry_after: float = 1.0) -> FastAPI:
+    """
+    Stub da API do WTS (/core/v1/agent, /chat/v1/message/send)
+
+    Args:
+        latency: Tempo de resposta do envio em segundos
+        jitter: Variação aleatória (fração) aplicada à latência
+        failure_rate: Fração dos envios que respondem HTTP 500
+        on_send: Callback `on_send(to, text)` chamado a cada mensagem enviada com sucesso
+        rate_limit: Envios/s aceitos por número de origem (`from`); acima disso responde 429 (0 sem limite)
+        rate_burst: Rajada aceita antes do limite
+        retry_after: Valor do header Retry-After dos 429
+    """
+    app = FastAPI()
+    app.state.sent = 0
+    app.state.failed = 0
+    app.state.rate_limited = 0
+    buckets = {}
+
+    @app.get("/core/v1/agent")
+    async def agents():
+        return [{"id": "agent-stub", "name": "Stub"}]
+
+    @app.post("/chat/v1/message/send")
+    async def send(request: Request):
+        body = await request.json()
+        if rate_limit > 0:
+            # Token bucket por origem, como o limite de envio do provedor
+            now = time.monotonic()
+            tokens, updated = buckets.get(body.get("from"), (rate_burst, now))
+            tokens = min(rate_burst, tokens + (now - updated) * rate_limit)
+            if tokens < 1:
+                buckets[body.get("from")] = (tokens, now)
+                app.state.rate_limited += 1
+                return JSONResponse({"error": "rate limited"}, status_code=429, headers={"Retry-After": str(retry_after)})
+            buckets[body.get("from")] = (tokens - 1, now)
+        await asyncio.sleep(latency * (1 + random.uniform(-jitter, jitter)))
+        if random.random() < failure_rate:
+            app.state.failed += 1
+            return JSONResponse({"error": "stub failure"}, status_code=500)
+        app.state.sent += 1
+        if on_send is not None:
+            on_send(body.get("to", ""), body.get("body", {}).get("text", ""))
+        return {"id": f"wts-{app.state.sent}", "status": "SENT"}
+
+    return app
+
+_POSTGREST_OPERATORS = {
+    "eq": lambda value, arg: str(value) == arg,
+    "neq": lambda value, arg: str(value) != arg,
+    "gt": lambda value, arg: value is not None and str(value) > arg,
+    "gte": lambda value, arg: value is not None and str(value) >= arg,
+    "lt": lambda value, arg: value is not None and str(value) < arg,
+    "lte": lambda value, arg: value is not None and str(value) <= arg,
+    "in": lambda value, arg: str(value) in arg.strip("()").split(","),
+    "is": lambda value, arg: value is None if arg == "null" else str(value).lower() == arg,
+}
+
+def create_postgrest_stub(latency: float = 0.01, jitter: float = 0.0) -> FastAPI:
+    """
+    Stub do PostgREST do Supabase (/rest/v1/{tabela}) com tabelas em memória
+
+    Suporta o que o supabase-py gera para select/insert/update/delete: filtros
+    `coluna=op.valor` (eq, neq, gt, gte, lt, lte, in, is), `select` com lista de
+    colunas, `order=coluna.desc` e `limit`/`offset`.
+
+    Args:
+        latency: Tempo de resposta de cada requisição em segundos
+        jitter: Variação aleatória (fração) aplicada à latência
+    """
+    app = FastAPI()
+    app.state.tables = {}
+    app.state.requests = 0
+
+    def matching(table, params):
+        rows = app.state.tables.setdefault(table, [])
+        for column, condition in params.items():
+            if column in ("select", "order", "limit", "offset", "on_conflict", "columns"):
+                continue
+            operator, _, arg = condition.partition(".")
+            check = _POSTGREST_OPERATORS.get(operator)
+            if check is not None:
+                rows = [row for row in rows if check(row.get(column), arg)]
+        return rows
+
+    def shape(rows, params):
+        for clause in reversed(params.get("order", "").split(",") if params.get("order") else []):
+            column, _, direction = clause.partition(".")
+            rows = sorted(rows, key=lambda row: (row.get(column) is None, row.get(column) or ""),
+                          reverse=direction.startswith("desc"))
+        offset = int(params.get("offset", 0))
+        limit = params.get("limit")
+        rows = rows[offset:offset + int(limit)] if limit else rows[offset:]
+        select = params.get("select", "*")
+        if select != "*":
+            columns = [column.strip() for column in select.split(",")]
+            rows = [{column: row.get(column) for column in columns} for row in rows]
+        return rows
+
+    async def delay():
+        app.state.requests += 1
+        await asyncio.sleep(latency * (1 + random.uniform(-jitter, jitter)))
+
+    @app.get("/rest/v1/{table}")
+    async def select(table: str, request: Request):
+        await delay()
+        params = dict(request.query_params)
+        return shape(matching(table, params), params)
+
+    @app.post("/rest/v1/{table}")
+    async def insert(table: str, request: Request):
+        await delay()
+        body = await request.json()
+        rows = body if isinstance(body, list) else [body]
+        app.state.tables.setdefault(table, []).extend(dict(row) for row in rows)
+        if "return=minimal" in request.headers.get("prefer", ""):
+            return Response(status_code=201)
+        return JSONResponse(rows, status_code=201)
+
+    @app.patch("/rest/v1/{table}")
+    async def update(table: str, request: Request):
+        await delay()
+        changes = await request.json()
+        rows = matching(table, dict(request.query_params))
+        for row in rows:
+            row.update(changes)
+        return rows
+
+    @app.delete("/rest/v1/{table}")
+    async def delete(table: str, request: Request):
+        await delay()
+        rows = matching(table, dict(request.query_params))
+        ids = {id(row) for row in rows}
+        app.state.tables[table] = [row for row in app.state.tables.get(table, []) if id(row) not in ids]
+        return rows
+
+    return app
+
+async def serve(app: FastAPI, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """Sobe o app em background no loop atual e espera ele ficar pronto"""
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    server.task = asyncio.create_task(server.serve())
+    while not server.started:
+        await asyncio.sleep(0.01)
+    return server
+
+async def shutdown(*servers: uvicorn.Server):
+    """Encerra os servidores iniciados com serve()"""
+    for server in servers:
+        server.should_exit = True
+    await asyncio.gather(*(server.task for server in servers), return_exceptions=True)
+
+def serve_in_thread(app: FastAPI, port: int, host: str = "127.0.0.1") -> uvicorn.Server:
+    """Sobe o app em uma thread com loop próprio (para medir clientes que bloqueiam o loop atual)"""
+    config = uvicorn.Config(app, host=host, port=port, log_level="warning", lifespan="off")
+    server = uvicorn.Server(config)
+    server.thread = threading.Thread(target=server.run, daemon=True)
+    server.thread.start()
+    while not server.started:
+        time.sleep(0.01)
+    return server
+
+def shutdown_thread(*servers: uvicorn.Server):
+    """Encerra os servidores iniciados com serve_in_thread()"""
+    for server in servers:
+        server.should_exit = True
+    for server in servers:
+        server.thread.join()
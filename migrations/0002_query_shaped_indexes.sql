@@ -0,0 +1,22 @@
+-- Índices no formato das consultas quentes:
+--   conversa mais recente do telefone: WHERE phone_number = $1 ORDER BY created_at DESC LIMIT 1
+--   histórico da conversa:             WHERE conversation_id = $1 ORDER BY created_at DESC LIMIT n
+-- Os dois viram um index scan que para na primeira (ou n-ésima) entrada, sem sort.
+--
+-- Obs: CREATE INDEX bloqueia gravações na tabela enquanto roda. Em tabelas grandes
+-- já em produção, crie os índices antes com CREATE INDEX CONCURRENTLY (mesmos nomes)
+-- no SQL Editor; os IF NOT EXISTS abaixo então não fazem nada.
+
+CREATE INDEX IF NOT EXISTS idx_conversations_phone_created
+    ON conversations (phone_number, created_at DESC);
+
+CREATE INDEX IF NOT EXISTS idx_messages_conversation_created
+    ON messages (conversation_id, created_at DESC);
+
+-- Coberto pelo índice composto acima (mesma coluna inicial)
+DROP INDEX IF EXISTS idx_messages_conversation_id;
+
+-- Nenhuma consulta filtra por essas colunas: só custavam a cada insert
+DROP INDEX IF EXISTS idx_messages_platform;
+DROP INDEX IF EXISTS idx_messages_sender;
+DROP INDEX IF EXISTS idx_messages_receiver;
@@ -0,0 +1,79 @@
+-- messages particionada por mês em created_at (uma partição messages_AAAA_MM por mês, em UTC).
+--
+-- As consultas de histórico filtram por created_at (janela MESSAGE_HISTORY_LOOKBACK_DAYS), o que
+-- limita a busca às partições recentes; partições antigas saem inteiras pelo job de retenção
+-- (python src/maintenance.py), sem DELETE nem VACUUM na tabela principal.
+--
+-- Obs: a conversão copia todas as linhas e segura um lock exclusivo em messages até o fim.
+-- Em bancos grandes rode em uma janela de manutenção.
+
+ALTER TABLE messages RENAME TO messages_unpartitioned;
+ALTER TABLE messages_unpartitioned RENAME CONSTRAINT messages_pkey TO messages_unpartitioned_pkey;
+ALTER INDEX IF EXISTS idx_messages_conversation_created RENAME TO idx_messages_unpartitioned_conversation_created;
+ALTER INDEX IF EXISTS idx_messages_created_at RENAME TO idx_messages_unpartitioned_created_at;
+
+-- A chave de partição precisa fazer parte da chave primária
+CREATE TABLE messages (
+    id UUID NOT NULL DEFAULT gen_random_uuid(),
+    conversation_id UUID NOT NULL REFERENCES conversations(id) ON DELETE CASCADE,
+    platform VARCHAR(20) NOT NULL,
+    sender VARCHAR(20) NOT NULL,
+    receiver VARCHAR(20) NOT NULL,
+    content TEXT NOT NULL,
+    direction VARCHAR(20) NOT NULL,
+    message_type VARCHAR(20) NOT NULL,
+    external_message_id VARCHAR(100),
+    metadata JSONB DEFAULT '{}'::jsonb,
+    created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+-- Criado em cada partição (inclusive nas futuras); idx_messages_created_at deixa de ser necessário,
+-- o filtro por created_at já é resolvido pela escolha das partições
+CREATE INDEX idx_messages_conversation_created ON messages (conversation_id, created_at DESC);
+
+-- Rede de segurança para linhas fora das partições mensais; o job mantém partições à frente
+-- para que fique vazia (uma partição não pode ser criada se a default tiver linhas daquele mês)
+CREATE TABLE messages_default PARTITION OF messages DEFAULT;
+
+-- Cria as partições mensais de `start_month` até `months_ahead` meses depois do mês atual
+CREATE OR REPLACE FUNCTION ensure_message_partitions(start_month DATE, months_ahead INT DEFAULT 2)
+RETURNS INT LANGUAGE plpgsql AS $$
+DECLARE
+    month DATE := date_trunc('month', start_month)::date;
+    last_month DATE := (date_trunc('month', now() AT TIME ZONE 'UTC') + make_interval(months => months_ahead))::date;
+    partition_name TEXT;
+    created INT := 0;
+BEGIN
+    WHILE month <= last_month LOOP
+        partition_name := 'messages_' || to_char(month, 'YYYY_MM');
+        IF to_regclass(partition_name) IS NULL THEN
+            EXECUTE format(
+                'CREATE TABLE %I PARTITION OF messages FOR VALUES FROM (%L) TO (%L)',
+                partition_name, month::text || ' 00:00:00+00', (month + interval '1 month')::date::text || ' 00:00:00+00'
+            );
+            created := created + 1;
+        END IF;
+        month := (month + interval '1 month')::date;
+    END LOOP;
+    RETURN created;
+END
+$$;
+
+SELECT ensure_message_partitions(
+    (COALESCE((SELECT min(created_at) FROM messages_unpartitioned), now()) AT TIME ZONE 'UTC')::date, 2
+);
+
+INSERT INTO messages (id, conversation_id, platform, sender, receiver, content, direction, message_type,
+                      external_message_id, metadata, created_at)
+SELECT id, conversation_id, platform, sender, receiver, content, direction, message_type,
+       external_message_id, metadata, created_at
+FROM messages_unpartitioned;
+
+DROP TABLE messages_unpartitioned;
+
+COMMENT ON TABLE messages IS 'Tabela para armazenar mensagens das conversas (particionada por mês em created_at)';
+COMMENT ON COLUMN messages.platform IS 'Plataforma da mensagem: whatsapp, instagram, messenger';
+COMMENT ON COLUMN messages.sender IS 'Remetente da mensagem';
+COMMENT ON COLUMN messages.receiver IS 'Destinatário da mensagem';
+COMMENT ON COLUMN messages.message_type IS 'Tipo da mensagem: incoming ou outgoing';
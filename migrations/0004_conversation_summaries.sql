@@ -0,0 +1,11 @@
+-- Resumo incremental da conversa (services/summarizer.py).
+--
+-- summary cobre todas as mensagens até summary_through (created_at da última mensagem resumida);
+-- o prompt usa o resumo mais as mensagens posteriores, em vez do histórico bruto.
+
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary TEXT;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_through TIMESTAMPTZ;
+ALTER TABLE conversations ADD COLUMN IF NOT EXISTS summary_updated_at TIMESTAMPTZ;
+
+COMMENT ON COLUMN conversations.summary IS 'Resumo das mensagens da conversa até summary_through';
+COMMENT ON COLUMN conversations.summary_through IS 'created_at da última mensagem incluída no resumo';
@@ -0,0 +1,35 @@
+-- Uma conversa por telefone, garantida pelo banco.
+--
+-- A busca-ou-criação da conversa só era serializada dentro de cada processo (lock do
+-- ConversationCache); com vários processos web/workers a primeira mensagem de um telefone
+-- podia criar duas conversas. Com o índice único os inserts usam ON CONFLICT DO NOTHING e
+-- quem perde a corrida lê a conversa criada pelo outro.
+--
+-- Não mexe em dados: se já houver telefones com mais de uma conversa, a migração falha
+-- (nada é aplicado) e lista os telefones. Decida o que fazer com as duplicadas (juntar as
+-- mensagens, arquivar, apagar) e rode de novo. Para listá-las:
+--
+--   SELECT phone_number, array_agg(id ORDER BY created_at DESC) AS conversations
+--   FROM conversations GROUP BY phone_number HAVING count(*) > 1;
+
+DO $$
+DECLARE
+    duplicated INT;
+    sample TEXT;
+BEGIN
+    SELECT count(*), string_agg(phone_number, ', ') FILTER (WHERE rn <= 10)
+    INTO duplicated, sample
+    FROM (
+        SELECT phone_number, row_number() OVER (ORDER BY phone_number) AS rn
+        FROM conversations GROUP BY phone_number HAVING count(*) > 1
+    ) d;
+    IF duplicated > 0 THEN
+        RAISE EXCEPTION '% telefone(s) com mais de uma conversa (ex: %)', duplicated, sample
+            USING HINT = 'Resolva as conversas duplicadas antes de aplicar 0005 (consulta no cabeçalho do arquivo)';
+    END IF;
+END $$;
+
+CREATE UNIQUE INDEX IF NOT EXISTS idx_conversations_phone ON conversations (phone_number);
+
+-- A busca por telefone passa a usar o índice único (no máximo uma linha por telefone)
+DROP INDEX IF EXISTS idx_conversations_phone_created;
@@ -1,5 +1,7 @@
 -- Script para criar as novas tabelas no Supabase
 -- Execute este script no SQL Editor do Supabase
+-- Com acesso direto ao Postgres (DATABASE_URL), prefira as migrações versionadas: python src/migrate.py
+-- (a migração 0003 também particiona messages por mês; este script cria a tabela sem partições)
 
 -- 1. Remover tabelas existentes (se existirem)
 DROP TABLE IF EXISTS messages CASCADE;
@@ -13,7 +15,10 @@ CREATE TABLE conversations (
     status VARCHAR(20) DEFAULT 'active',
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
     updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
-    last_message_at TIMESTAMPTZ
+    last_message_at TIMESTAMPTZ,
+    summary TEXT,
+    summary_through TIMESTAMPTZ,
+    summary_updated_at TIMESTAMPTZ
 );
 
 -- Criar tabela de mensagens com nova estrutura
@@ -31,15 +36,15 @@ CREATE TABLE messages (
     created_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
 );
 
--- Criar índices para performance
-CREATE INDEX idx_messages_conversation_id ON messages(conversation_id);
+-- Criar índices para performance (no formato das consultas: filtro + ORDER BY created_at DESC; ver migrations/0002)
+-- Uma conversa por telefone: a criação concorrente usa ON CONFLICT (phone_number) DO NOTHING (ver migrations/0005)
+CREATE UNIQUE INDEX idx_conversations_phone ON conversations(phone_number);
+CREATE INDEX idx_messages_conversation_created ON messages(conversation_id, created_at DESC);
 CREATE INDEX idx_messages_created_at ON messages(created_at);
-CREATE INDEX idx_messages_platform ON messages(platform);
-CREATE INDEX idx_messages_sender ON messages(sender);
-CREATE INDEX idx_messages_receiver ON messages(receiver);
 
 -- Comentários para documentação
 COMMENT ON TABLE conversations IS 'Tabela para armazenar conversas dos usuários';
+COMMENT ON COLUMN conversations.summary IS 'Resumo das mensagens da conversa até summary_through';
 COMMENT ON TABLE messages IS 'Tabela para armazenar mensagens das conversas';
 COMMENT ON COLUMN messages.platform IS 'Plataforma da mensagem: whatsapp, instagram, messenger';
 COMMENT ON COLUMN messages.sender IS 'Remetente da mensagem';
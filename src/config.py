@@ -2,10 +2,28 @@
 Configurações globais e instâncias compartilhadas
 """
 import os
+from dataclasses import replace
+from typing import Optional
 from dotenv import load_dotenv
+from services.storage import MessageStore, STORAGE_BACKENDS
 from services.supabase_manager import SupabaseManager
+from services.postgres_manager import PostgresManager
 from services.rag_system import RAGSystem
+from services.prompt_builder import PROMPT_TEMPLATES, DEFAULT_PROMPT_VERSION
 from services.wts_api import WtsAPIService
+from services.outbound import DeadLetterStore
+from services.llm_scheduler import LLMScheduler
+from services.generation_options import GenerationOptions
+from services.intent_router import IntentRouter, DEFAULT_INTENTS
+from services.message_coalescer import MessageCoalescer
+from services.work_queue import WorkQueue, create_work_queue
+from services.dedupe import WebhookDeduplicator
+from services.conversation_cache import ConversationCache
+from services.history_cache import HistoryCache
+from services.summarizer import ConversationSummarizer
+from services.admission import AdmissionController, ADMISSION_MODES
+from services.profiler import RequestProfiler
+from services.health import HealthProber
 
 # Carregar variáveis de ambiente
 load_dotenv()
@@ -18,16 +36,65 @@ DEBUG = os.getenv("DEBUG", "true").lower() == "true"
 SUPABASE_URL = os.getenv("SUPABASE_PUBLIC_URL")
 SUPABASE_KEY = os.getenv("ANON_KEY")
 
+# Backend de armazenamento: "supabase" (PostgREST) ou "postgres" (conexão direta via asyncpg em DATABASE_URL)
+STORAGE_BACKEND = os.getenv("STORAGE_BACKEND", "supabase").lower()
+DATABASE_URL = os.getenv("DATABASE_URL")
+POSTGRES_POOL_MIN_SIZE = int(os.getenv("POSTGRES_POOL_MIN_SIZE", "2"))
+POSTGRES_POOL_MAX_SIZE = int(os.getenv("POSTGRES_POOL_MAX_SIZE", "10"))
+# 0 desativa os prepared statements (necessário atrás do pooler do Supabase em modo transação)
+POSTGRES_STATEMENT_CACHE_SIZE = int(os.getenv("POSTGRES_STATEMENT_CACHE_SIZE", "100"))
+
 # Configurações do Ollama
 OLLAMA_MODEL = os.getenv("OLLAMA_MODEL")
 OLLAMA_HOST = os.getenv("OLLAMA_HOST")
 OLLAMA_PORT = os.getenv("OLLAMA_PORT")
 OLLAMA_URL = f"http://{OLLAMA_HOST}:{OLLAMA_PORT}"
+# Pool de instâncias: lista separada por vírgula (se vazio, usa apenas OLLAMA_URL)
+OLLAMA_URLS = [url.strip() for url in os.getenv("OLLAMA_URLS", "").split(",") if url.strip()] or [OLLAMA_URL]
+OLLAMA_HEDGE_DELAY = float(os.getenv("OLLAMA_HEDGE_DELAY", "0"))
+OLLAMA_AFFINITY = os.getenv("OLLAMA_AFFINITY", "true").lower() == "true"
+OLLAMA_FAILURE_THRESHOLD = int(os.getenv("OLLAMA_FAILURE_THRESHOLD", "3"))
+OLLAMA_COOLDOWN = float(os.getenv("OLLAMA_COOLDOWN", "30"))
+PROMPT_TEMPLATE_VERSION = os.getenv("PROMPT_TEMPLATE_VERSION", DEFAULT_PROMPT_VERSION)
+
+# Opções de geração: num_ctx arredondado para buckets e limite de tokens da resposta
+OLLAMA_CTX_BUCKETS = [int(x) for x in os.getenv("OLLAMA_CTX_BUCKETS", "2048,4096,8192").split(",") if x.strip()]
+OLLAMA_NUM_PREDICT = int(os.getenv("OLLAMA_NUM_PREDICT", "256"))
+OLLAMA_STOP = [x for x in os.getenv("OLLAMA_STOP", "").split("|") if x]
+OLLAMA_TEMPERATURE = float(os.getenv("OLLAMA_TEMPERATURE", "0.7"))
+
+# Configurações do agendador de gerações (fila na frente do Ollama)
+LLM_MAX_IN_FLIGHT = int(os.getenv("LLM_MAX_IN_FLIGHT", "2"))
+LLM_MAX_QUEUE_TIME = float(os.getenv("LLM_MAX_QUEUE_TIME", "120"))
+LLM_MAX_QUEUE_SIZE = int(os.getenv("LLM_MAX_QUEUE_SIZE", "0"))
+
+# Fast-path para mensagens triviais: intenções de services/intent_router.py (ex: "confirmacao,agradecimento,emoji")
+FAST_PATH_INTENTS = [x.strip() for x in os.getenv("FAST_PATH_INTENTS", "").split(",") if x.strip()]
+FAST_PATH_THRESHOLD = os.getenv("FAST_PATH_THRESHOLD")
+FAST_PATH_MAX_CHARS = int(os.getenv("FAST_PATH_MAX_CHARS", "40"))
+
+# Janela (s) para agrupar mensagens seguidas do mesmo contato; 0 desativa o agrupamento (toda resposta
+# espera a janela, por isso é opcional; 2 costuma cobrir quem manda a frase em várias mensagens)
+COALESCE_WINDOW = float(os.getenv("COALESCE_WINDOW", "0"))
 
 # Configurações do WTS API
 WTS_API_TOKEN = os.getenv("WTS_API_TOKEN")
+WTS_API_URL = os.getenv("WTS_API_URL", "https://api.wts.chat")
+# Fila de envio: limite por canal (envios/s e rajada; 0 desativa), envios simultâneos, retentativas em 429/5xx
+# e dead-letter ("memory" ou "redis") para os envios que falharam de vez
+WTS_DISPATCHER = os.getenv("WTS_DISPATCHER", "true").lower() == "true"
+WTS_RATE_PER_SECOND = float(os.getenv("WTS_RATE_PER_SECOND", "5"))
+WTS_RATE_BURST = int(os.getenv("WTS_RATE_BURST", "10"))
+WTS_MAX_CONCURRENCY = int(os.getenv("WTS_MAX_CONCURRENCY", "8"))
+WTS_MAX_ATTEMPTS = int(os.getenv("WTS_MAX_ATTEMPTS", "4"))
+WTS_RETRY_BASE_DELAY = float(os.getenv("WTS_RETRY_BASE_DELAY", "1"))
+WTS_MAX_RETRY_DELAY = float(os.getenv("WTS_MAX_RETRY_DELAY", "30"))
+WTS_MAX_PENDING = int(os.getenv("WTS_MAX_PENDING", "1000"))
+WTS_MAX_SEND_TIME = float(os.getenv("WTS_MAX_SEND_TIME", "60"))
+WTS_DEAD_LETTER_BACKEND = os.getenv("WTS_DEAD_LETTER_BACKEND", "memory").lower()
+WTS_DEAD_LETTER_MAX = int(os.getenv("WTS_DEAD_LETTER_MAX", "1000"))
 
-# Configurações do Qdrant
+# Configurações do Qdrant (QDRANT_HOST=":memory:" usa uma instância local em memória)
 QDRANT_HOST = os.getenv("QDRANT_HOST", "localhost")
 QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 
@@ -35,6 +102,87 @@ QDRANT_PORT = int(os.getenv("QDRANT_PORT", "6333"))
 REDIS_HOST = os.getenv("REDIS_HOST", "localhost")
 REDIS_PORT = int(os.getenv("REDIS_PORT", "6379"))
 
+# Fila de trabalho durável: "redis", "sqlite" ou vazio para processar no próprio servidor
+WORK_QUEUE_BACKEND = os.getenv("WORK_QUEUE_BACKEND", "").lower()
+WORK_QUEUE_NAME = os.getenv("WORK_QUEUE_NAME", "rag:jobs")
+WORK_QUEUE_SQLITE_PATH = os.getenv("WORK_QUEUE_SQLITE_PATH", "work_queue.db")
+WORKER_CONCURRENCY = int(os.getenv("WORKER_CONCURRENCY", "4"))
+WORKER_MAX_ATTEMPTS = int(os.getenv("WORKER_MAX_ATTEMPTS", "5"))
+WORKER_RETRY_BASE_DELAY = float(os.getenv("WORKER_RETRY_BASE_DELAY", "2"))
+# Porta do exportador Prometheus de cada worker (0 desativa; com vários workers no mesmo host, uma porta por worker)
+WORKER_METRICS_PORT = int(os.getenv("WORKER_METRICS_PORT", "9101"))
+
+# Histórico recente de cada conversa em memória; só é consistente se as mensagens da conversa são salvas
+# neste processo, por isso fica desligado por padrão com fila de trabalho (webhook e workers em processos separados)
+HISTORY_CACHE = os.getenv("HISTORY_CACHE", "false" if WORK_QUEUE_BACKEND else "true").lower() == "true"
+HISTORY_CACHE_MAX_CONVERSATIONS = int(os.getenv("HISTORY_CACHE_MAX_CONVERSATIONS", "10000"))
+HISTORY_CACHE_MAX_MESSAGES = int(os.getenv("HISTORY_CACHE_MAX_MESSAGES", "20"))
+HISTORY_CACHE_TTL = float(os.getenv("HISTORY_CACHE_TTL", "300"))
+
+# Janela do histórico usado nas respostas, em dias (0 = sem limite, padrão). Conversas paradas há mais
+# tempo que a janela perdem o contexto; só compensa com messages particionada por mês (migrations/0003),
+# onde a consulta lê apenas as partições da janela
+MESSAGE_HISTORY_LOOKBACK_DAYS = float(os.getenv("MESSAGE_HISTORY_LOOKBACK_DAYS", "0"))
+
+# Resumo incremental das conversas longas (requer as colunas de migrations/0004): a cada SUMMARY_EVERY_MESSAGES
+# mensagens além das SUMMARY_KEEP_MESSAGES mais recentes, as antigas são incorporadas ao resumo em background
+SUMMARY_ENABLED = os.getenv("SUMMARY_ENABLED", "false").lower() == "true"
+SUMMARY_EVERY_MESSAGES = int(os.getenv("SUMMARY_EVERY_MESSAGES", "10"))
+SUMMARY_KEEP_MESSAGES = int(os.getenv("SUMMARY_KEEP_MESSAGES", "4"))
+SUMMARY_MAX_CHARS = int(os.getenv("SUMMARY_MAX_CHARS", "1200"))
+SUMMARY_NUM_PREDICT = int(os.getenv("SUMMARY_NUM_PREDICT", "300"))
+SUMMARY_CACHE_TTL = float(os.getenv("SUMMARY_CACHE_TTL", "300"))
+
+# Deduplicação de webhooks por ID da mensagem: "memory" ou "redis" (compartilhado entre processos)
+DEDUPE_BACKEND = os.getenv("DEDUPE_BACKEND", "memory").lower()
+DEDUPE_TTL = float(os.getenv("DEDUPE_TTL", "86400"))
+
+# Cache telefone -> conversa: "memory", "redis" (compartilhado entre processos) ou "none"
+CONVERSATION_CACHE_BACKEND = os.getenv("CONVERSATION_CACHE_BACKEND", "memory").lower()
+CONVERSATION_CACHE_TTL = float(os.getenv("CONVERSATION_CACHE_TTL", "3600"))
+CONVERSATION_CACHE_MAX_ENTRIES = int(os.getenv("CONVERSATION_CACHE_MAX_ENTRIES", "50000"))
+
+# Write-behind das mensagens: grava em lote a cada MESSAGE_WRITE_BATCH linhas ou MESSAGE_WRITE_INTERVAL_MS
+MESSAGE_WRITE_BEHIND = os.getenv("MESSAGE_WRITE_BEHIND", "false").lower() == "true"
+MESSAGE_WRITE_BATCH = int(os.getenv("MESSAGE_WRITE_BATCH", "100"))
+MESSAGE_WRITE_INTERVAL_MS = float(os.getenv("MESSAGE_WRITE_INTERVAL_MS", "50"))
+MESSAGE_WRITE_MAX_BUFFERED = int(os.getenv("MESSAGE_WRITE_MAX_BUFFERED", "10000"))
+MESSAGE_WRITE_MAX_RETRIES = int(os.getenv("MESSAGE_WRITE_MAX_RETRIES", "5"))
+
+# Controle de admissão do webhook: limites de trabalho pendente (0 desativa) e o que fazer ao passar deles
+ADMISSION_MAX_BACKLOG = int(os.getenv("ADMISSION_MAX_BACKLOG", "0"))
+ADMISSION_MAX_QUEUE_DEPTH = int(os.getenv("ADMISSION_MAX_QUEUE_DEPTH", "0"))
+ADMISSION_MODE = os.getenv("ADMISSION_MODE", "reject").lower()
+ADMISSION_RETRY_AFTER = int(os.getenv("ADMISSION_RETRY_AFTER", "30"))
+ADMISSION_BUSY_MESSAGE = os.getenv(
+    "ADMISSION_BUSY_MESSAGE",
+    "Estamos com muitas mensagens no momento. Por favor, envie sua pergunta novamente em alguns minutos."
+)
+ADMISSION_BUSY_REPLY_COOLDOWN = float(os.getenv("ADMISSION_BUSY_REPLY_COOLDOWN", "300"))
+
+# Logging: nível global, formato ("text" ou "json"), níveis por logger ("services.wts_api=DEBUG,httpx=WARNING")
+# e amostragem de eventos de alto volume ("webhook.received=0.1")
+LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO").upper()
+LOG_FORMAT = os.getenv("LOG_FORMAT", "text").lower()
+LOG_LEVELS = {
+    name.strip(): level.strip()
+    for name, level in (item.split("=", 1) for item in os.getenv("LOG_LEVELS", "").split(",") if "=" in item)
+}
+LOG_SAMPLE_RATES = {
+    event.strip(): float(rate)
+    for event, rate in (item.split("=", 1) for item in os.getenv("LOG_SAMPLE_RATES", "").split(",") if "=" in item)
+}
+LOG_QUEUE_SIZE = int(os.getenv("LOG_QUEUE_SIZE", "10000"))
+
+# Verificação das dependências em background: /health e /test-services respondem com o último resultado
+HEALTH_PROBE_INTERVAL = float(os.getenv("HEALTH_PROBE_INTERVAL", "15"))
+HEALTH_PROBE_TIMEOUT = float(os.getenv("HEALTH_PROBE_TIMEOUT", "10"))
+HEALTH_PROBE_WTS_INTERVAL = float(os.getenv("HEALTH_PROBE_WTS_INTERVAL", "60"))
+
+# Endpoints /admin (profiling); vazio desativa
+ADMIN_TOKEN = os.getenv("ADMIN_TOKEN", "")
+PROFILER_INTERVAL_MS = float(os.getenv("PROFILER_INTERVAL_MS", "5"))
+
 # Configurações do servidor
 SERVER_HOST = os.getenv("SERVER_HOST", "0.0.0.0")
 SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
@@ -42,14 +190,68 @@ SERVER_PORT = int(os.getenv("SERVER_PORT", "8000"))
 _supabase_manager = None
 _rag_system = None
 _external_api = None
+_llm_scheduler = None
+_intent_router = None
+_message_coalescer = None
+_work_queue = None
+_redis_client = None
+_webhook_deduplicator = None
+_profiler = None
+_admission_controller = None
+_conversation_cache = None
+_history_cache = None
+_summarizer = None
+_health_prober = None
 
-def get_supabase_manager() -> SupabaseManager:
-    """Retorna instância global do SupabaseManager"""
+def get_supabase_manager() -> MessageStore:
+    """Retorna instância global do armazenamento (SupabaseManager ou PostgresManager, conforme STORAGE_BACKEND)"""
     global _supabase_manager
     if _supabase_manager is None:
-        _supabase_manager = SupabaseManager(SUPABASE_URL, SUPABASE_KEY)
+        options = {
+            "conversation_cache": get_conversation_cache(),
+            "write_buffer_options": {
+                "max_batch": MESSAGE_WRITE_BATCH,
+                "flush_interval": MESSAGE_WRITE_INTERVAL_MS / 1000,
+                "max_buffered": MESSAGE_WRITE_MAX_BUFFERED,
+                "max_retries": MESSAGE_WRITE_MAX_RETRIES
+            } if MESSAGE_WRITE_BEHIND else None,
+            "history_cache": get_history_cache(),
+            "history_lookback_days": MESSAGE_HISTORY_LOOKBACK_DAYS
+        }
+        if STORAGE_BACKEND == "postgres":
+            _supabase_manager = PostgresManager(
+                DATABASE_URL,
+                min_size=POSTGRES_POOL_MIN_SIZE,
+                max_size=POSTGRES_POOL_MAX_SIZE,
+                statement_cache_size=POSTGRES_STATEMENT_CACHE_SIZE,
+                **options
+            )
+        else:
+            _supabase_manager = SupabaseManager(SUPABASE_URL, SUPABASE_KEY, **options)
     return _supabase_manager
 
+def get_history_cache() -> Optional[HistoryCache]:
+    """Retorna instância global do HistoryCache (None se desativado)"""
+    global _history_cache
+    if _history_cache is None and HISTORY_CACHE:
+        _history_cache = HistoryCache(
+            max_conversations=HISTORY_CACHE_MAX_CONVERSATIONS,
+            max_messages=HISTORY_CACHE_MAX_MESSAGES,
+            ttl=HISTORY_CACHE_TTL
+        )
+    return _history_cache
+
+def get_conversation_cache() -> Optional[ConversationCache]:
+    """Retorna instância global do ConversationCache (None se desativado)"""
+    global _conversation_cache
+    if _conversation_cache is None and CONVERSATION_CACHE_BACKEND != "none":
+        _conversation_cache = ConversationCache(
+            ttl=CONVERSATION_CACHE_TTL,
+            max_entries=CONVERSATION_CACHE_MAX_ENTRIES,
+            redis_client=get_redis_client() if CONVERSATION_CACHE_BACKEND == "redis" else None
+        )
+    return _conversation_cache
+
 def get_rag_system() -> RAGSystem:
     """Retorna instância global do RAGSystem"""
     global _rag_system
@@ -58,7 +260,21 @@ def get_rag_system() -> RAGSystem:
             ollama_url=OLLAMA_URL,
             ollama_model=OLLAMA_MODEL,
             qdrant_host=QDRANT_HOST,
-            qdrant_port=QDRANT_PORT
+            qdrant_port=QDRANT_PORT,
+            prompt_version=PROMPT_TEMPLATE_VERSION,
+            ollama_urls=OLLAMA_URLS,
+            ollama_pool_options={
+                "hedge_delay": OLLAMA_HEDGE_DELAY,
+                "affinity": OLLAMA_AFFINITY,
+                "failure_threshold": OLLAMA_FAILURE_THRESHOLD,
+                "cooldown": OLLAMA_COOLDOWN
+            },
+            generation_options=GenerationOptions(
+                ctx_buckets=OLLAMA_CTX_BUCKETS,
+                num_predict=OLLAMA_NUM_PREDICT,
+                stop=OLLAMA_STOP,
+                temperature=OLLAMA_TEMPERATURE
+            )
         )
     return _rag_system
 
@@ -66,18 +282,166 @@ def get_external_api() -> WtsAPIService:
     """Retorna instância global do WtsAPIService"""
     global _external_api
     if _external_api is None:
-        _external_api = WtsAPIService(WTS_API_TOKEN)
+        _external_api = WtsAPIService(
+            WTS_API_TOKEN,
+            api_url=WTS_API_URL,
+            dispatcher_options={
+                "rate": WTS_RATE_PER_SECOND,
+                "burst": WTS_RATE_BURST,
+                "max_concurrency": WTS_MAX_CONCURRENCY,
+                "max_attempts": WTS_MAX_ATTEMPTS,
+                "retry_base_delay": WTS_RETRY_BASE_DELAY,
+                "max_retry_delay": WTS_MAX_RETRY_DELAY,
+                "max_pending": WTS_MAX_PENDING,
+                "max_send_time": WTS_MAX_SEND_TIME,
+                "dead_letters": DeadLetterStore(
+                    max_entries=WTS_DEAD_LETTER_MAX,
+                    redis_client=get_redis_client() if WTS_DEAD_LETTER_BACKEND == "redis" else None
+                )
+            } if WTS_DISPATCHER else None
+        )
     return _external_api
 
+def get_llm_scheduler() -> LLMScheduler:
+    """Retorna instância global do LLMScheduler"""
+    global _llm_scheduler
+    if _llm_scheduler is None:
+        _llm_scheduler = LLMScheduler(
+            max_in_flight=LLM_MAX_IN_FLIGHT,
+            max_queue_time=LLM_MAX_QUEUE_TIME,
+            max_queue_size=LLM_MAX_QUEUE_SIZE
+        )
+    return _llm_scheduler
+
+def get_summarizer() -> Optional[ConversationSummarizer]:
+    """Retorna instância global do ConversationSummarizer (None se desativado)"""
+    global _summarizer
+    if _summarizer is None and SUMMARY_ENABLED:
+        _summarizer = ConversationSummarizer(
+            get_supabase_manager(),
+            get_rag_system(),
+            get_llm_scheduler(),
+            every=SUMMARY_EVERY_MESSAGES,
+            keep=SUMMARY_KEEP_MESSAGES,
+            max_chars=SUMMARY_MAX_CHARS,
+            num_predict=SUMMARY_NUM_PREDICT,
+            cache_ttl=SUMMARY_CACHE_TTL
+        )
+    return _summarizer
+
+def get_health_prober() -> HealthProber:
+    """Retorna instância global do HealthProber"""
+    global _health_prober
+    if _health_prober is None:
+        rag_system = get_rag_system()
+        _health_prober = HealthProber(
+            {
+                "supabase": get_supabase_manager().health_check,
+                "qdrant": rag_system.check_qdrant,
+                "ollama": rag_system.check_ollama,
+                "wts_api": get_external_api().health_check,
+            },
+            interval=HEALTH_PROBE_INTERVAL,
+            timeout=HEALTH_PROBE_TIMEOUT,
+            intervals={"wts_api": HEALTH_PROBE_WTS_INTERVAL}
+        )
+    return _health_prober
+
+def get_intent_router() -> IntentRouter:
+    """Retorna instância global do IntentRouter"""
+    global _intent_router
+    if _intent_router is None:
+        intents = [DEFAULT_INTENTS[name] for name in FAST_PATH_INTENTS if name in DEFAULT_INTENTS]
+        if FAST_PATH_THRESHOLD:
+            # Cópias: DEFAULT_INTENTS é compartilhado e não deve mudar
+            intents = [replace(intent, threshold=float(FAST_PATH_THRESHOLD)) for intent in intents]
+        _intent_router = IntentRouter(
+            get_rag_system(),
+            intents,
+            max_chars=FAST_PATH_MAX_CHARS,
+            emoji_only="emoji" in FAST_PATH_INTENTS
+        )
+    return _intent_router
+
+def get_message_coalescer() -> Optional[MessageCoalescer]:
+    """Retorna instância global do MessageCoalescer (None se o agrupamento estiver desativado)"""
+    global _message_coalescer
+    if _message_coalescer is None and COALESCE_WINDOW > 0:
+        from controllers.messages import process_message
+        _message_coalescer = MessageCoalescer(process_message, window=COALESCE_WINDOW)
+    return _message_coalescer
+
+def get_work_queue() -> Optional[WorkQueue]:
+    """Retorna instância global da fila de trabalho (None se o processamento é local)"""
+    global _work_queue
+    if _work_queue is None and WORK_QUEUE_BACKEND:
+        _work_queue = create_work_queue(
+            WORK_QUEUE_BACKEND,
+            redis_host=REDIS_HOST,
+            redis_port=REDIS_PORT,
+            name=WORK_QUEUE_NAME,
+            sqlite_path=WORK_QUEUE_SQLITE_PATH
+        )
+    return _work_queue
+
+def get_redis_client():
+    """Retorna cliente Redis assíncrono global"""
+    global _redis_client
+    if _redis_client is None:
+        import redis.asyncio as redis
+        _redis_client = redis.Redis(host=REDIS_HOST, port=REDIS_PORT, decode_responses=True)
+    return _redis_client
+
+def get_webhook_deduplicator() -> WebhookDeduplicator:
+    """Retorna instância global do WebhookDeduplicator"""
+    global _webhook_deduplicator
+    if _webhook_deduplicator is None:
+        _webhook_deduplicator = WebhookDeduplicator(
+            ttl=DEDUPE_TTL,
+            redis_client=get_redis_client() if DEDUPE_BACKEND == "redis" else None
+        )
+    return _webhook_deduplicator
+
+def get_admission_controller() -> AdmissionController:
+    """Retorna instância global do AdmissionController"""
+    global _admission_controller
+    if _admission_controller is None:
+        _admission_controller = AdmissionController(
+            get_llm_scheduler(),
+            message_coalescer=get_message_coalescer(),
+            work_queue=get_work_queue(),
+            max_backlog=ADMISSION_MAX_BACKLOG,
+            max_queue_depth=ADMISSION_MAX_QUEUE_DEPTH,
+            mode=ADMISSION_MODE,
+            retry_after=ADMISSION_RETRY_AFTER,
+            busy_message=ADMISSION_BUSY_MESSAGE,
+            busy_reply_cooldown=ADMISSION_BUSY_REPLY_COOLDOWN
+        )
+    return _admission_controller
+
+def get_profiler() -> RequestProfiler:
+    """Retorna instância global do RequestProfiler"""
+    global _profiler
+    if _profiler is None:
+        _profiler = RequestProfiler(interval=PROFILER_INTERVAL_MS / 1000)
+    return _profiler
+
 def validate_env():
     """Valida se todas as configurações necessárias estão presentes"""
     errors = []
     
-    if not SUPABASE_URL:
-        errors.append("SUPABASE_PUBLIC_URL não configurado")
-    
-    if not SUPABASE_KEY:
-        errors.append("ANON_KEY não configurado")
+    if STORAGE_BACKEND not in STORAGE_BACKENDS:
+        errors.append(f"STORAGE_BACKEND inválido: {STORAGE_BACKEND}")
+
+    if STORAGE_BACKEND == "postgres":
+        if not DATABASE_URL:
+            errors.append("DATABASE_URL não configurado")
+    else:
+        if not SUPABASE_URL:
+            errors.append("SUPABASE_PUBLIC_URL não configurado")
+
+        if not SUPABASE_KEY:
+            errors.append("ANON_KEY não configurado")
     
     if not WTS_API_TOKEN:
         errors.append("WTS_API_TOKEN não configurado")
@@ -88,6 +452,34 @@ def validate_env():
     
     if not QDRANT_PORT:
         errors.append("QDRANT_PORT não configurado")
+
+    if WORK_QUEUE_BACKEND not in ("", "redis", "sqlite"):
+        errors.append(f"WORK_QUEUE_BACKEND inválido: {WORK_QUEUE_BACKEND}")
+
+    if CONVERSATION_CACHE_BACKEND not in ("memory", "redis", "none"):
+        errors.append(f"CONVERSATION_CACHE_BACKEND inválido: {CONVERSATION_CACHE_BACKEND}")
+
+    if ADMISSION_MODE not in ADMISSION_MODES:
+        errors.append(f"ADMISSION_MODE inválido: {ADMISSION_MODE}")
+
+    if LOG_FORMAT not in ("text", "json"):
+        errors.append(f"LOG_FORMAT inválido: {LOG_FORMAT}")
+
+    if DEDUPE_BACKEND not in ("memory", "redis"):
+        errors.append(f"DEDUPE_BACKEND inválido: {DEDUPE_BACKEND}")
+
+    if WTS_DEAD_LETTER_BACKEND not in ("memory", "redis"):
+        errors.append(f"WTS_DEAD_LETTER_BACKEND inválido: {WTS_DEAD_LETTER_BACKEND}")
+
+    template = PROMPT_TEMPLATES.get(PROMPT_TEMPLATE_VERSION)
+    if template is None:
+        errors.append(f"PROMPT_TEMPLATE_VERSION inválido: {PROMPT_TEMPLATE_VERSION}")
+    elif SUMMARY_ENABLED and template.summary is None:
+        errors.append(f"SUMMARY_ENABLED requer um template com resumo (PROMPT_TEMPLATE_VERSION={PROMPT_TEMPLATE_VERSION})")
+
+    unknown_intents = set(FAST_PATH_INTENTS) - set(DEFAULT_INTENTS) - {"emoji"}
+    if unknown_intents:
+        errors.append(f"FAST_PATH_INTENTS com intenções desconhecidas: {', '.join(sorted(unknown_intents))}")
     
     if errors:
         raise ValueError(f"Configurações inválidas: {'; '.join(errors)}")
@@ -1,88 +1,202 @@
 import uuid
+import asyncio
+import logging
 from datetime import datetime
 from fastapi import BackgroundTasks
 from models.schemas import WtsWebhookData, Message
-from config import get_supabase_manager, get_rag_system, get_external_api
+from services.llm_scheduler import PRIORITY_NORMAL, QueueTimeoutError, QueueFullError
+from services.message_coalescer import begin_reply, reply_sent
+from services.metrics import timed, WEBHOOKS_TOTAL
+from config import get_supabase_manager, get_rag_system, get_external_api, get_llm_scheduler, get_intent_router, get_message_coalescer, get_work_queue, get_webhook_deduplicator, get_profiler, get_admission_controller, get_summarizer
 
-async def process_message(incoming_message: Message, conversation_id):
-    """Processa mensagem em background"""
-    print(f"🔄 Iniciando processamento em background para {incoming_message.sender}")
+logger = logging.getLogger(__name__)
+
+async def process_message(incoming_message: Message, conversation_id, priority: int = PRIORITY_NORMAL) -> bool:
+    """Processa mensagem em background. Retorna False se alguma etapa falhou"""
+    work = timed("process_message", _process_message(incoming_message, conversation_id, priority))
+    profiler = get_profiler()
+    return await (profiler.track(work) if profiler.armed else work)
+
+async def _process_message(incoming_message: Message, conversation_id, priority: int) -> bool:
+    """
+    Etapas independentes rodam em paralelo:
+        histórico ─────────────┐
+        roteamento → contexto ─┴→ geração → (salvar ∥ enviar)
+    """
+    log_extra = {"conversation_id": conversation_id, "message_id": incoming_message.id}
+    logger.info("🔄 Iniciando processamento em background para %s", incoming_message.sender, extra=log_extra)
     
     # Obter instâncias
     supabase_manager = get_supabase_manager()
     rag_system = get_rag_system()
-    external_api = get_external_api()
+    llm_scheduler = get_llm_scheduler()
+    intent_router = get_intent_router()
+    summarizer = get_summarizer()
 
     log_prefix = incoming_message.sender
-    
-    # 1. Buscar histórico
-    try:
-        print(f"{log_prefix} - Recuperando histórico de conversa...", end="")
-        history = await supabase_manager.get_conversation_history(conversation_id)
-        print('OK')
-    except Exception as e:
-        print(f"Erro no processamento em background: {e}")
-        return
-    
-    # 2. Recuperar contexto
-    try:
-        print(f"{log_prefix} - Recuperando contexto...", end="")
-        context = await rag_system.retrieve_context(incoming_message.content, history)
-        print("OK")
-    except Exception as e:
-        print(f"Erro ao recuperar contexto: {e}")
-        return
-    
-    # 3. Gerar resposta
-    try:
-        print(f"{log_prefix} - Gerando resposta...", end="")
-        generated_response = await rag_system.generate_response(incoming_message.content, context, history)
-        print('OK')
-    except Exception as e:
-        print(f"Erro ao gerar resposta: {e}")
-        return
+    query_embedding = None
+
+    # 1. Buscar histórico (em paralelo com o roteamento e a busca de contexto)
+    logger.debug("%s - Recuperando histórico de conversa e contexto...", log_prefix, extra=log_extra)
+    history_limit = summarizer.history_limit if summarizer is not None else 10
+    history_task = asyncio.create_task(timed("history_fetch", supabase_manager.get_conversation_history(conversation_id, history_limit)))
+    summary_task = asyncio.create_task(summarizer.get(conversation_id)) if summarizer is not None else None
+    context_task = None
 
-    # 5. Salvar resposta
+    # Se o turno for cancelado (mensagem nova no agrupamento) ou sair antes, nada fica rodando solto
     try:
-        outgoing_message = Message(
-            id=str(uuid.uuid4()),
-            conversation_id=incoming_message.conversation_id,
-            platform="whatsapp",
-            sender=incoming_message.receiver,  # O bot envia para quem recebeu
-            receiver=incoming_message.sender,  # O bot responde para quem enviou
-            content=generated_response,
-            direction="outgoing",
-            message_type="text"
+        # 0. Mensagens triviais (ok, obrigado, emojis) não passam por recuperação e geração
+        if intent_router.enabled:
+            try:
+                decision = await asyncio.to_thread(intent_router.route, incoming_message.content)
+                query_embedding = decision.embedding
+                if decision.fast_path:
+                    logger.info("%s - Fast-path: %s (score %.2f)", log_prefix, decision.intent, decision.score, extra=log_extra)
+                    if decision.reply:
+                        return await send_reply(incoming_message, decision.reply, log_prefix)
+                    return True
+            except Exception as e:
+                logger.warning("Erro no roteamento de intenção, seguindo fluxo normal: %s", e, extra=log_extra)
+
+        # 2. Recuperar contexto a partir da mensagem, sem esperar o histórico
+        context_task = asyncio.create_task(
+            rag_system.retrieve_context(incoming_message.content, query_embedding=query_embedding)
+        )
+
+        try:
+            history = await history_task
+        except Exception as e:
+            logger.error("Erro ao recuperar histórico: %s", e, extra=log_extra)
+            return False
+
+        # Com resumo, o prompt leva o resumo e só as mensagens posteriores a ele
+        summary = await summary_task if summary_task is not None else None
+        prompt_history = summarizer.recent(summary, history) if summarizer is not None else history
+
+        try:
+            context = await context_task
+        except Exception as e:
+            logger.error("Erro ao recuperar contexto: %s", e, extra=log_extra)
+            return False
+        logger.debug("%s - Histórico e contexto recuperados", log_prefix, extra=log_extra)
+
+        # 3. Gerar resposta
+        try:
+            logger.debug("%s - Gerando resposta...", log_prefix, extra=log_extra)
+            generated_response = await llm_scheduler.submit(
+                lambda: rag_system.generate_response(incoming_message.content, context, prompt_history,
+                                                     conversation_id=conversation_id, summary=(summary or {}).get("summary")),
+                conversation_id=conversation_id,
+                priority=priority
             )
-            
-        print(f"{log_prefix} - Salvando resposta...", end="")
-        await supabase_manager.save_message(outgoing_message)
+        except (QueueTimeoutError, QueueFullError) as e:
+            logger.warning("Geração não agendada: %s", e, extra=log_extra)
+            return False
+        except Exception as e:
+            logger.error("Erro ao gerar resposta: %s", e, extra=log_extra)
+            return False
 
-        print("OK")
-    except Exception as e:
-        print(f"Erro ao salvar resposta: {e}")
-        return
+        sent = await send_reply(incoming_message, generated_response, log_prefix)
+        # Depois da resposta: o resumo usa o LLM em prioridade baixa, sem disputar com este turno
+        if summarizer is not None:
+            summarizer.maybe_schedule(conversation_id, summary, history)
+        return sent
+    finally:
+        for task in (history_task, summary_task, context_task):
+            if task is not None and not task.done():
+                task.cancel()
 
-    # 6. Enviar resposta
-    try:
-        print(f"{log_prefix} - Enviando resposta...", end="")
-        await external_api.send_message(outgoing_message)        
-        print('OK')
-        
-    except Exception as e:
-        print(f"Erro ao enviar resposta: {e}")
-        return
+async def send_reply(incoming_message: Message, content: str, log_prefix: str) -> bool:
+    """Salva e envia a resposta do bot para quem enviou a mensagem. Retorna se a resposta foi enviada"""
+    supabase_manager = get_supabase_manager()
+    external_api = get_external_api()
+
+    # A partir daqui uma mensagem nova do contato não cancela mais este turno
+    begin_reply()
+
+    outgoing_message = Message(
+        id=str(uuid.uuid4()),
+        conversation_id=incoming_message.conversation_id,
+        platform="whatsapp",
+        sender=incoming_message.receiver,  # O bot envia para quem recebeu
+        receiver=incoming_message.sender,  # O bot responde para quem enviou
+        content=content,
+        direction="outgoing",
+        message_type="text"
+        )
+
+    # 5. Salvar e 6. Enviar resposta são independentes: rodam em paralelo
+    log_extra = {"conversation_id": incoming_message.conversation_id, "message_id": incoming_message.id}
+    logger.debug("%s - Salvando e enviando resposta...", log_prefix, extra=log_extra)
+    saved, sent = await asyncio.gather(
+        timed("supabase_insert", supabase_manager.save_message(outgoing_message)),
+        timed("wts_send", external_api.send_message(outgoing_message)),
+        return_exceptions=True
+    )
+
+    if isinstance(saved, Exception):
+        logger.error("Erro ao salvar resposta: %s", saved, extra=log_extra)
+    if isinstance(sent, Exception):
+        logger.error("Erro ao enviar resposta: %s", sent, extra=log_extra)
+        return False
+    if sent:
+        reply_sent()
+
+    logger.info("%s - Resposta %s%s", log_prefix, "enviada" if sent else "NÃO enviada",
+                " (não salva)" if isinstance(saved, Exception) else "", extra=log_extra)
+    return bool(sent)
+
+async def send_busy_reply(incoming_message: Message):
+    """Resposta imediata de "ocupado" para mensagens descartadas pelo controle de admissão"""
+    admission = get_admission_controller()
+    if admission.claim_busy_reply(incoming_message.conversation_id):
+        await send_reply(incoming_message, admission.busy_message, incoming_message.sender)
+
+def message_job(incoming_message: Message, conversation_id: str, aggregated_text: str = None) -> dict:
+    """Payload do job de processamento enviado para a fila de trabalho"""
+    return {
+        "message": incoming_message.model_dump(),
+        "conversation_id": conversation_id,
+        "aggregated_text": aggregated_text
+    }
 
 async def receive_webhook(webhook_data: WtsWebhookData, background_tasks: BackgroundTasks):
-    print("🚀 Iniciando processamento do webhook...")
+    # Reenvios do WTS recebem a resposta original, sem salvar nem processar de novo
+    deduplicator = get_webhook_deduplicator()
+    message_id = webhook_data.lastMessage.id
+    original_ack = await deduplicator.claim(message_id)
+    if original_ack is not None:
+        logger.info("♻️ Webhook duplicado: %s", message_id, extra={"event": "webhook.duplicate", "message_id": message_id})
+        WEBHOOKS_TOTAL.labels("duplicate").inc()
+        return original_ack
+
+    # Sobrecarga: rejeita antes de salvar (o WTS reenvia) ou segue só para a resposta de "ocupado"
+    admission = get_admission_controller()
+    shed_reason = await admission.check() if admission.enabled else None
+    if shed_reason is not None and admission.mode == "reject":
+        await deduplicator.release(message_id)
+        WEBHOOKS_TOTAL.labels("shed").inc()
+        return {"status": "busy", "message": "Servidor sobrecarregado, tente novamente", "retry_after": admission.retry_after}
+
+    try:
+        result = await _receive_new_webhook(webhook_data, background_tasks, shed=shed_reason is not None)
+    except BaseException:
+        await deduplicator.release(message_id)
+        raise
+    if result["status"] == "success":
+        await deduplicator.complete(message_id, result)
+    else:
+        await deduplicator.release(message_id)
+    WEBHOOKS_TOTAL.labels(result["status"]).inc()
+    return result
+
+async def _receive_new_webhook(webhook_data: WtsWebhookData, background_tasks: BackgroundTasks, shed: bool = False):
     # Obter instâncias
     supabase_manager = get_supabase_manager()
     try:
         if webhook_data.channel.platform.lower() == "whatsapp":
-            print(f"📱 Processando mensagem WhatsApp")
-            print(f"👤 Sender: {webhook_data.contact.phonenumber}")
-            print(f"📞 Receiver: {webhook_data.channel.key}")
-            print(f"💬 Content: {webhook_data.lastContactMessage}")
+            logger.debug("📱 Mensagem WhatsApp de %s para %s: %s", webhook_data.contact.phonenumber,
+                         webhook_data.channel.key, webhook_data.lastContactMessage)
             
             # Limpar o número de telefone
             contact_phone = webhook_data.contact.phonenumber.replace("+55|", "").replace("+55", "")
@@ -98,27 +212,31 @@ async def receive_webhook(webhook_data: WtsWebhookData, background_tasks: Backgr
                 direction="incoming"
             )
 
-            print(f"✅ Message criada com sucesso")
-            conversation_id = await supabase_manager.get_or_create_conversation(contact_phone)
-            
-            # 2. Atualizar conversation_id na mensagem
-            incoming_message.conversation_id = conversation_id
-            
-            # 3. Salvar mensagem recebida
-            await supabase_manager.save_message(incoming_message)
+            # Buscar ou criar a conversa e salvar a mensagem recebida (uma ida ao banco quando o backend permite)
+            conversation_id = await supabase_manager.save_incoming_message(contact_phone, incoming_message)
 
     except Exception as e:
-        print(f"❌ Erro ao buscar ou criar conversa: {e}")
-        import traceback
-        print(f"📋 Traceback: {traceback.format_exc()}")
+        logger.exception("❌ Erro ao buscar ou criar conversa: %s", e)
         return {"status": "error", "message": f"Erro ao buscar ou criar conversa: {str(e)}"}
 
+    if shed:
+        background_tasks.add_task(send_busy_reply, incoming_message)
+        return {"status": "success", "message": "Mensagem recebida; servidor sobrecarregado, processamento descartado"}
+
     try:
-        print("🔄 Adicionando tarefa em background...")
-        background_tasks.add_task(process_message, incoming_message, conversation_id)
-        print("✅ Tarefa adicionada com sucesso")
+        work_queue = get_work_queue()
+        message_coalescer = get_message_coalescer()
+        if work_queue is not None:
+            # Processamento fica a cargo dos workers (src/worker.py)
+            await work_queue.enqueue(message_job(incoming_message, conversation_id, webhook_data.lastMessagesAggregated.text))
+        elif message_coalescer is not None:
+            message_coalescer.submit(incoming_message, conversation_id, webhook_data.lastMessagesAggregated.text)
+        else:
+            background_tasks.add_task(process_message, incoming_message, conversation_id)
+        logger.info("✅ Mensagem %s recebida na conversa %s", incoming_message.id, conversation_id,
+                    extra={"event": "webhook.accepted", "conversation_id": conversation_id})
         return {"status": "success", "message": "Mensagem adicionada para processamento em background"}
 
     except Exception as e:
-        print(f"Erro ao processar mensagem: {e}")
+        logger.exception("Erro ao encaminhar mensagem para processamento: %s", e)
         return {"status": "error", "message": f"Erro ao processar mensagem: {str(e)}"}
\ No newline at end of file
@@ -0,0 +1,81 @@
+import hmac
+from fastapi import Header, HTTPException
+from fastapi.responses import PlainTextResponse
+from services.profiler import ProfilerBusyError
+from config import (
+    get_profiler,
+    get_supabase_manager,
+    get_rag_system,
+    get_external_api,
+    get_llm_scheduler,
+    get_intent_router,
+    get_message_coalescer,
+    get_work_queue,
+    get_webhook_deduplicator,
+    get_conversation_cache,
+    get_summarizer,
+    get_health_prober,
+    ADMIN_TOKEN
+)
+
+def require_admin(x_admin_token: str = Header(default="")):
+    """Dependência dos endpoints /admin: exige o header X-Admin-Token"""
+    if not ADMIN_TOKEN:
+        raise HTTPException(status_code=404, detail="Not Found")
+    if not hmac.compare_digest(x_admin_token.encode(), ADMIN_TOKEN.encode()):
+        raise HTTPException(status_code=403, detail="Token de administração inválido")
+
+async def profile_cpu(requests: int, timeout: float, interval_ms: float = None, include_idle: bool = False, output: str = "collapsed"):
+    """Amostra a CPU durante as próximas `requests` mensagens processadas"""
+    try:
+        session = await get_profiler().profile_requests(
+            requests,
+            timeout,
+            interval=interval_ms / 1000 if interval_ms else None,
+            include_idle=include_idle
+        )
+    except ProfilerBusyError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+    if output == "json":
+        return session.summary()
+    return PlainTextResponse(session.collapsed())
+
+def memory_start(frames: int):
+    return get_profiler().start_tracemalloc(frames)
+
+def memory_stop():
+    return get_profiler().stop_tracemalloc()
+
+def memory_snapshot(top: int, group_by: str):
+    try:
+        return get_profiler().memory_snapshot(top, group_by)
+    except RuntimeError as e:
+        raise HTTPException(status_code=409, detail=str(e))
+
+def memory_components():
+    """Memória estimada do modelo de embedding, caches e filas"""
+    rag_system = get_rag_system()
+    store = get_supabase_manager()
+    dispatcher = get_external_api().dispatcher
+    components = {
+        "llm_scheduler": get_llm_scheduler(),
+        "intent_router": get_intent_router(),
+        "message_coalescer": get_message_coalescer(),
+        "work_queue": get_work_queue(),
+        "webhook_dedupe": get_webhook_deduplicator(),
+        "conversation_cache": get_conversation_cache(),
+        "history_cache": store.history_cache,
+        "message_writer": store.write_buffer,
+        "summarizer": get_summarizer(),
+        "wts_dead_letters": dispatcher.dead_letters if dispatcher else None,
+        "wts_dispatcher": dispatcher,
+        "health": get_health_prober(),
+        "ollama_pool": rag_system.ollama_pool,
+        "prompt_builder": rag_system.prompt_builder,
+        "generation_options": rag_system.generation_options,
+        # Por último: o que sobra do armazenamento e do RAGSystem (clientes, coleção) sem os itens acima
+        "storage": store,
+        "rag_system": rag_system,
+    }
+    return get_profiler().component_memory(components, embedding_model=rag_system.embedding_model)
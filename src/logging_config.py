@@ -0,0 +1,117 @@
+"""
+Configuração de logging estruturado
+
+Os handlers de saída rodam numa thread própria (QueueListener): no caminho da
+requisição o log só coloca o LogRecord numa fila limitada, sem formatar a
+mensagem nem escrever no stdout. Eventos de alto volume podem ser amostrados
+pelo campo `event` (ex: `logger.info("...", extra={"event": "webhook.received"})`).
+"""
+import json
+import logging
+import logging.handlers
+import queue
+import random
+import sys
+from datetime import datetime, timezone
+from typing import Dict, Optional
+
+# Atributos padrão do LogRecord; o resto veio de `extra` e vai como campo estruturado
+_RESERVED_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime", "taskName"}
+
+class JsonFormatter(logging.Formatter):
+    """Uma linha JSON por registro, com os campos de `extra`"""
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED_ATTRS:
+                entry[key] = value
+        if record.exc_info:
+            entry["exc"] = self.formatException(record.exc_info)
+        return json.dumps(entry, ensure_ascii=False, default=str)
+
+class TextFormatter(logging.Formatter):
+    """Formato legível com os campos de `extra` no final da linha"""
+
+    def __init__(self):
+        super().__init__("%(asctime)s %(levelname)-7s %(name)s - %(message)s")
+
+    def format(self, record: logging.LogRecord) -> str:
+        line = super().format(record)
+        fields = " ".join(f"{key}={value}" for key, value in vars(record).items() if key not in _RESERVED_ATTRS)
+        return f"{line} [{fields}]" if fields else line
+
+class SamplingFilter(logging.Filter):
+    """Deixa passar só uma fração dos registros de cada `event`; WARNING ou acima sempre passa"""
+
+    def __init__(self, rates: Dict[str, float]):
+        super().__init__()
+        self.rates = rates
+
+    def filter(self, record: logging.LogRecord) -> bool:
+        if record.levelno >= logging.WARNING:
+            return True
+        rate = self.rates.get(getattr(record, "event", None))
+        return rate is None or random.random() < rate
+
+class _NonBlockingQueueHandler(logging.handlers.QueueHandler):
+    """QueueHandler que descarta (e conta) registros com a fila cheia em vez de bloquear"""
+
+    def __init__(self, log_queue: queue.Queue):
+        super().__init__(log_queue)
+        self.dropped = 0
+
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # A formatação (getMessage, traceback) fica para a thread do listener
+        return record
+
+    def enqueue(self, record: logging.LogRecord):
+        try:
+            self.queue.put_nowait(record)
+        except queue.Full:
+            self.dropped += 1
+
+_listener: Optional[logging.handlers.QueueListener] = None
+_handler: Optional[_NonBlockingQueueHandler] = None
+
+def setup_logging(level: str = "INFO", fmt: str = "text", levels: Optional[Dict[str, str]] = None,
+                  sample_rates: Optional[Dict[str, float]] = None, queue_size: int = 10000) -> logging.handlers.QueueListener:
+    """Configura o logger raiz com fila + thread de escrita (idempotente)"""
+    global _listener, _handler
+    if _listener is not None:
+        return _listener
+
+    output = logging.StreamHandler(sys.stdout)
+    output.setFormatter(JsonFormatter() if fmt == "json" else TextFormatter())
+
+    handler = _NonBlockingQueueHandler(queue.Queue(maxsize=queue_size))
+    if sample_rates:
+        handler.addFilter(SamplingFilter(sample_rates))
+
+    root = logging.getLogger()
+    root.setLevel(level.upper())
+    root.addHandler(handler)
+    for name, logger_level in (levels or {}).items():
+        logging.getLogger(name).setLevel(logger_level.upper())
+
+    _handler = handler
+    _listener = logging.handlers.QueueListener(handler.queue, output, respect_handler_level=True)
+    _listener.start()
+    return _listener
+
+def dropped_records() -> int:
+    """Registros descartados por fila cheia desde o início"""
+    return _handler.dropped if _handler is not None else 0
+
+def shutdown_logging():
+    """Esvazia a fila e para a thread de escrita"""
+    global _listener, _handler
+    if _listener is not None:
+        logging.getLogger().removeHandler(_handler)
+        _listener.stop()
+        _listener = _handler = None
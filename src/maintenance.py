@@ -0,0 +1,53 @@
+"""
+Manutenção das partições mensais de messages
+
+Cria as partições dos próximos meses e retira (arquiva em CSV gzip, desanexa
+ou apaga) as partições mais antigas que MESSAGE_RETENTION_MONTHS. Requer o
+schema particionado (migrations/0003) e acesso direto ao Postgres (DATABASE_URL).
+
+Uso:
+    python src/maintenance.py --once
+    python src/maintenance.py --interval 3600
+"""
+import argparse
+import asyncio
+import json
+import os
+import signal
+from dotenv import load_dotenv
+from logging_config import setup_logging, shutdown_logging
+from services.partitions import PartitionMaintainer, RETENTION_MODES
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Manutenção das partições de messages")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--retention-months", type=int, default=int(os.getenv("MESSAGE_RETENTION_MONTHS", "0")),
+                        help="Meses completos mantidos em messages; 0 mantém tudo")
+    parser.add_argument("--mode", choices=RETENTION_MODES, default=os.getenv("MESSAGE_RETENTION_MODE", "archive"))
+    parser.add_argument("--archive-dir", default=os.getenv("MESSAGE_ARCHIVE_DIR", "archive"))
+    parser.add_argument("--months-ahead", type=int, default=int(os.getenv("MESSAGE_PARTITIONS_AHEAD", "2")))
+    parser.add_argument("--interval", type=float, default=float(os.getenv("PARTITION_MAINTENANCE_INTERVAL", "3600")),
+                        help="Segundos entre execuções")
+    parser.add_argument("--once", action="store_true", help="Executa uma vez e sai")
+    args = parser.parse_args()
+    if not args.database_url:
+        raise SystemExit("DATABASE_URL não configurado")
+
+    setup_logging(os.getenv("LOG_LEVEL", "INFO").upper(), os.getenv("LOG_FORMAT", "text").lower())
+    maintainer = PartitionMaintainer(args.database_url, args.retention_months, args.mode, args.archive_dir, args.months_ahead)
+    try:
+        if args.once:
+            print(json.dumps(await maintainer.run_once(), indent=2, ensure_ascii=False))
+            return
+        stop = asyncio.Event()
+        loop = asyncio.get_running_loop()
+        for sig in (signal.SIGINT, signal.SIGTERM):
+            loop.add_signal_handler(sig, stop.set)
+        print(f"🧹 Manutenção de partições a cada {args.interval:.0f}s (retenção: {args.retention_months or '∞'} meses, modo {args.mode})")
+        await maintainer.run_forever(args.interval, stop)
+    finally:
+        shutdown_logging()
+
+if __name__ == "__main__":
+    asyncio.run(main())
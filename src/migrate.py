@@ -0,0 +1,58 @@
+"""
+Migrações do schema (conversations/messages)
+
+Aplica os arquivos de migrations/ ainda não aplicados no Postgres de
+DATABASE_URL (ou --database-url), registrando as versões em schema_migrations.
+Com --explain mostra o tempo das consultas quentes (EXPLAIN ANALYZE) antes e
+depois das migrações.
+
+Uso:
+    python src/migrate.py
+    python src/migrate.py --status
+    python src/migrate.py --target 0001
+    python src/migrate.py --explain
+"""
+import argparse
+import asyncio
+import json
+import os
+from dotenv import load_dotenv
+from services.migrations import MigrationRunner, explain_hot_queries
+
+async def main():
+    load_dotenv()
+    parser = argparse.ArgumentParser(description="Migrações do schema do Postgres")
+    parser.add_argument("--database-url", default=os.getenv("DATABASE_URL"))
+    parser.add_argument("--status", action="store_true", help="Só lista as migrações e se já foram aplicadas")
+    parser.add_argument("--target", help="Aplica até esta versão (inclusive)")
+    parser.add_argument("--explain", action="store_true", help="EXPLAIN ANALYZE das consultas quentes antes e depois")
+    args = parser.parse_args()
+    if not args.database_url:
+        raise SystemExit("DATABASE_URL não configurado")
+
+    import asyncpg
+
+    connection = await asyncpg.connect(args.database_url)
+    try:
+        runner = MigrationRunner(connection)
+        if args.status:
+            for item in await runner.status():
+                state = f"aplicada em {item['applied_at']}" if item["applied_at"] else "pendente"
+                print(f"{item['version']}_{item['name']}: {state}{' (arquivo alterado!)' if item['modified'] else ''}")
+            return
+
+        before = await explain_hot_queries(connection) if args.explain else None
+        applied = await runner.migrate(args.target)
+        if applied:
+            for migration in applied:
+                print(f"✅ {migration.version}_{migration.name}")
+        else:
+            print("Nenhuma migração pendente")
+        if args.explain:
+            after = await explain_hot_queries(connection)
+            print(json.dumps({"before": before, "after": after}, indent=2, ensure_ascii=False))
+    finally:
+        await connection.close()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -1,10 +1,16 @@
 from typing import List, Dict, Any
-from fastapi import APIRouter, BackgroundTasks
+from fastapi import APIRouter, BackgroundTasks, Response, Depends, Query
+from fastapi.responses import JSONResponse
 from datetime import datetime
 from controllers.messages import receive_webhook
+from controllers import profiling
 from models.schemas import WtsWebhookData, Message
-from config import get_supabase_manager, get_rag_system, get_external_api
-import asyncio
+from services.metrics import publish_stats, render as render_metrics
+from logging_config import dropped_records
+from config import get_supabase_manager, get_rag_system, get_external_api, get_llm_scheduler, get_intent_router, get_message_coalescer, get_work_queue, get_webhook_deduplicator, get_admission_controller, get_conversation_cache, get_summarizer, get_health_prober
+import logging
+
+logger = logging.getLogger(__name__)
 
 router = APIRouter()
 
@@ -20,33 +26,36 @@ async def hello():
             "conversation": "/conversation/{phone_number}",
             "knowledge": "/knowledge",
             "health": "/health",
+            "stats": "/stats",
+            "metrics": "/metrics",
             "test_services": "/test-services"
         }
     }
 
+def _missing(snapshot: Dict[str, Any]) -> List[str]:
+    return [name for name, result in snapshot.items() if result is None]
+
 @router.get("/health")
 async def health_check():
-    """Health check completo do sistema"""
+    """Health check do sistema a partir do último resultado do HealthProber"""
     try:
-        # Obter instâncias
-        supabase_manager = get_supabase_manager()
-        rag_system = get_rag_system()
-        
-        # Verificar Supabase
-        supabase_healthy = await supabase_manager.health_check()
-        
-        # Verificar Ollama
-        ollama_healthy = await rag_system.test_ollama_connection()
-        
-        # Determinar status geral
-        all_healthy = supabase_healthy and ollama_healthy
-        
+        prober = get_health_prober()
+        snapshot = prober.snapshot(["supabase", "ollama"])
+        if _missing(snapshot):
+            # Prober ainda não rodou (ex: antes do startup): verifica na hora
+            snapshot.update(await prober.refresh(_missing(snapshot)))
+
+        all_healthy = all(result["healthy"] for result in snapshot.values())
         return {
             "status": "healthy" if all_healthy else "unhealthy",
             "timestamp": datetime.now().isoformat(),
             "services": {
-                "supabase": "healthy" if supabase_healthy else "unhealthy",
-                "ollama": "healthy" if ollama_healthy else "unhealthy"
+                name: "healthy" if result["healthy"] else "unhealthy"
+                for name, result in snapshot.items()
+            },
+            "checks": {
+                name: {key: result[key] for key in ("latency_ms", "age_seconds", "checked_at", "error")}
+                for name, result in snapshot.items()
             }
         }
     except Exception as e:
@@ -60,54 +69,77 @@ async def health_check():
             }
         }
 
+async def collect_stats() -> Dict[str, Any]:
+    """Estatísticas de cada componente, compartilhadas por /stats e /metrics"""
+    rag_system = get_rag_system()
+    supabase_manager = get_supabase_manager()
+    work_queue = get_work_queue()
+    return {
+        "prompt": rag_system.prompt_builder.stats(),
+        "ollama_pool": rag_system.ollama_pool.stats(),
+        "generation": rag_system.generation_options.stats(),
+        "llm_scheduler": get_llm_scheduler().stats(),
+        "intent_router": get_intent_router().stats(),
+        "message_coalescer": get_message_coalescer().stats() if get_message_coalescer() else None,
+        "work_queue": await work_queue.stats() if work_queue else None,
+        "webhook_dedupe": get_webhook_deduplicator().stats(),
+        "conversation_cache": get_conversation_cache().stats() if get_conversation_cache() else None,
+        "message_writer": supabase_manager.write_buffer.stats() if supabase_manager.write_buffer else None,
+        "history_cache": supabase_manager.history_cache.stats() if supabase_manager.history_cache else None,
+        "summarizer": get_summarizer().stats() if get_summarizer() else None,
+        "wts_dispatcher": await get_external_api().dispatcher.stats() if get_external_api().dispatcher else None,
+        "admission": get_admission_controller().stats(),
+        "health": get_health_prober().stats(),
+        "logging": {"dropped_records": dropped_records()}
+    }
+
+@router.get("/stats")
+async def stats():
+    """Estatísticas internas de processamento"""
+    return {"timestamp": datetime.now().isoformat(), **await collect_stats()}
+
+@router.get("/metrics")
+async def metrics():
+    """Métricas no formato de exposição do Prometheus"""
+    for component, component_stats in (await collect_stats()).items():
+        publish_stats(component, component_stats)
+    body, content_type = render_metrics()
+    return Response(body, media_type=content_type)
+
 @router.get("/test-services")
-async def test_all_services():
-    """Testa todos os serviços de forma assíncrona e retorna resultados detalhados"""
+async def test_all_services(refresh: bool = Query(False, description="Verifica os serviços agora em vez de usar o último resultado")):
+    """Estado de todos os serviços (último resultado do HealthProber, ou verificação na hora com refresh=true)"""
     try:
-        # Obter instâncias
-        supabase_manager = get_supabase_manager()
-        rag_system = get_rag_system()
-        external_api = get_external_api()
-        
-        # Definir todas as tarefas de teste com timeouts
-        tasks = {
-            "supabase": asyncio.wait_for(supabase_manager.initialize(), timeout=30),
-            "qdrant": asyncio.wait_for(rag_system.initialize_qdrant(), timeout=30),
-            "ollama": asyncio.wait_for(rag_system.test_ollama_connection(), timeout=30),
-            "wts_api": asyncio.wait_for(external_api.test_connection(), timeout=30)
-        }
-        
-        # Executar todas as tarefas em paralelo
-        task_results = await asyncio.gather(*tasks.values(), return_exceptions=True)
-        
-        # Mapear resultados
+        prober = get_health_prober()
+        snapshot = prober.snapshot()
+        if refresh:
+            snapshot = await prober.refresh()
+        elif _missing(snapshot):
+            snapshot.update(await prober.refresh(_missing(snapshot)))
+
         results = {}
-        all_success = True
-        
-        for service_name, result in zip(tasks.keys(), task_results):
-            if isinstance(result, asyncio.TimeoutError):
-                results[service_name] = {
-                    "status": "timeout",
-                    "message": "Timeout após 30s",
-                    "success": False
-                }
-                all_success = False
-            elif isinstance(result, Exception):
-                results[service_name] = {
-                    "status": "error",
-                    "message": str(result),
-                    "success": False
-                }
-                all_success = False
+        for service_name, result in snapshot.items():
+            if result["healthy"]:
+                status, message = "success", "Serviço funcionando"
+            elif result["stale"]:
+                status, message = "failed", f"Sem verificação há {result['age_seconds']:.0f}s"
+            elif result["error"] and result["error"].startswith("Timeout"):
+                status, message = "timeout", result["error"]
+            elif result["error"]:
+                status, message = "error", result["error"]
             else:
-                results[service_name] = {
-                    "status": "success" if result else "failed",
-                    "message": "Serviço funcionando" if result else "Serviço não respondeu",
-                    "success": bool(result)
-                }
-                if not result:
-                    all_success = False
-        
+                status, message = "failed", "Serviço não respondeu"
+            results[service_name] = {
+                "status": status,
+                "message": message,
+                "success": result["healthy"],
+                "latency_ms": result["latency_ms"],
+                "checked_at": result["checked_at"],
+                "age_seconds": result["age_seconds"],
+                "consecutive_failures": result["consecutive_failures"]
+            }
+        all_success = all(r["success"] for r in results.values())
+
         return {
             "timestamp": datetime.now().isoformat(),
             "overall_status": "healthy" if all_success else "unhealthy",
@@ -139,17 +171,19 @@ async def receive_message_endpoint(message: Message):
 @router.post("/webhook/wts")
 async def receive_wts_webhook_endpoint(webhook_data: WtsWebhookData, background_tasks: BackgroundTasks):    
     try:
-        print(f"📥 Webhook recebido: {webhook_data.channel.platform}")
-        print(f"👤 Contato: {webhook_data.contact.name}")
-        print(f"💬 Mensagem: {webhook_data.lastContactMessage}")
-        return await receive_webhook(webhook_data, background_tasks)
+        logger.info("📥 Webhook recebido: %s de %s", webhook_data.channel.platform, webhook_data.contact.name,
+                    extra={"event": "webhook.received", "message_id": webhook_data.lastMessage.id})
+        result = await receive_webhook(webhook_data, background_tasks)
+        if result.get("status") == "busy":
+            return JSONResponse(result, status_code=503, headers={"Retry-After": str(result["retry_after"])})
+        return result
     except Exception as e:
-        print(f"❌ Erro no webhook: {e}")
+        logger.exception("❌ Erro no webhook: %s", e)
         return {"status": "error", "message": str(e)}
 
 @router.post("/knowledge")
 async def add_knowledge_endpoint(documents: List[str], source: str = "manual"):
-    print('inserindo doc na base de conhecimento', documents)
+    logger.info("Inserindo %d documento(s) na base de conhecimento (source=%s)", len(documents), source)
     from controllers.knowledge import add_knowledge
     result = await add_knowledge(documents, source)
     return result 
@@ -158,7 +192,7 @@ async def add_knowledge_endpoint(documents: List[str], source: str = "manual"):
 async def clear_knowledge_endpoint():
     """Limpa todos os dados da base de conhecimento"""
     try:
-        print('🗑️ Limpando base de conhecimento...')
+        logger.info("🗑️ Limpando base de conhecimento...")
         from config import get_rag_system
         
         rag_system = get_rag_system()
@@ -174,22 +208,58 @@ async def clear_knowledge_endpoint():
                 points_selector={"all": True}
             )
             
-            print(f'✅ Base de conhecimento limpa com sucesso!')
+            logger.info("✅ Base de conhecimento limpa com sucesso!")
             return {
                 "status": "success",
                 "message": "Base de conhecimento limpa com sucesso",
                 "collection": rag_system.collection_name
             }
         else:
-            print('❌ Não foi possível conectar ao Qdrant')
+            logger.error("❌ Não foi possível conectar ao Qdrant")
             return {
                 "status": "error",
                 "message": "Não foi possível conectar ao Qdrant"
             }
             
     except Exception as e:
-        print(f'❌ Erro ao limpar base de conhecimento: {e}')
+        logger.exception("❌ Erro ao limpar base de conhecimento: %s", e)
         return {
             "status": "error",
             "message": str(e)
-        } 
\ No newline at end of file
+        } 
+
+# Profiling sob demanda (exige ADMIN_TOKEN no header X-Admin-Token)
+@router.post("/admin/profile/cpu", dependencies=[Depends(profiling.require_admin)])
+async def profile_cpu_endpoint(
+    requests: int = Query(10, ge=1, le=1000),
+    timeout: float = Query(120, gt=0, le=3600),
+    interval_ms: float = Query(None, gt=0),
+    include_idle: bool = False,
+    output: str = Query("collapsed", pattern="^(collapsed|json)$")
+):
+    """Pilhas amostradas das próximas mensagens processadas (formato collapsed para flamegraph)"""
+    return await profiling.profile_cpu(requests, timeout, interval_ms, include_idle, output)
+
+@router.post("/admin/profile/memory/start", dependencies=[Depends(profiling.require_admin)])
+async def memory_start_endpoint(frames: int = Query(25, ge=1, le=100)):
+    return profiling.memory_start(frames)
+
+@router.post("/admin/profile/memory/stop", dependencies=[Depends(profiling.require_admin)])
+async def memory_stop_endpoint():
+    return profiling.memory_stop()
+
+@router.get("/admin/profile/memory/snapshot", dependencies=[Depends(profiling.require_admin)])
+async def memory_snapshot_endpoint(top: int = Query(25, ge=1, le=500), group_by: str = Query("lineno", pattern="^(lineno|filename|traceback)$")):
+    """Maiores alocações do tracemalloc e diff em relação ao snapshot anterior"""
+    return profiling.memory_snapshot(top, group_by)
+
+@router.get("/admin/profile/memory/components", dependencies=[Depends(profiling.require_admin)])
+async def memory_components_endpoint():
+    """Memória estimada por componente (modelo de embedding, caches, filas)"""
+    return profiling.memory_components()
+
+@router.get("/admin/wts/dead-letters", dependencies=[Depends(profiling.require_admin)])
+async def wts_dead_letters_endpoint(limit: int = Query(50, ge=1, le=1000)):
+    """Envios ao WTS que falharam de vez (dead-letter), mais recentes primeiro"""
+    dispatcher = get_external_api().dispatcher
+    return await dispatcher.dead_letters.recent(limit) if dispatcher else []
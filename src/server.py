@@ -1,18 +1,31 @@
 import uvicorn
 import asyncio
+import logging
 from contextlib import asynccontextmanager
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from routes import router
+from logging_config import setup_logging, shutdown_logging
 from config import (
     get_supabase_manager, 
     get_rag_system, 
     get_external_api,
+    get_work_queue,
+    get_redis_client,
+    get_summarizer,
+    get_health_prober,
     validate_env,
     SERVER_HOST,
-    SERVER_PORT
+    SERVER_PORT,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_LEVELS,
+    LOG_SAMPLE_RATES,
+    LOG_QUEUE_SIZE
 )
 
+logger = logging.getLogger(__name__)
+
 async def test_services():
     """Testa todos os serviços de forma assíncrona e paralela"""
         # Obter instâncias globais
@@ -54,8 +67,7 @@ async def test_services():
         return results
         
     except Exception as e:
-        print(f"❌")
-        print(f"Erro durante testes paralelos: {e}")
+        logger.error("❌ Erro durante testes paralelos: %s", e)
         return {
             "error": {
                 "status": "error",
@@ -68,52 +80,56 @@ def check_services(results):
     """Analisa e compara os resultados de todos os serviços"""
     
     all_success = True
-    services = []
     
     for service_name, result in results.items():
         if result["success"]:
-            services.append(f"   - {service_name.upper()}: ✅")
+            logger.info("   - %s: ✅", service_name.upper(), extra={"event": "startup.service_ok"})
         else:
             all_success = False
-            services.append(f"   - {service_name.upper()}: ❌")      
+            logger.error("   - %s: ❌ %s", service_name.upper(), result["message"], extra={"event": "startup.service_failed"})
     
-    if all_success:
-        print("✅")
-        print("\n".join(services))
-        return True
-    else:
-        print("⚠️")
-        print("\n".join(services))
-        return False
+    return all_success
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     """Gerencia o ciclo de vida da aplicação"""
     # Startup
+    setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_LEVELS, LOG_SAMPLE_RATES, LOG_QUEUE_SIZE)
     try:
-        print("\n🚀 Iniciando servidor...\n\n⚙️  Validando configurações: ", end="")
+        logger.info("🚀 Iniciando servidor...", extra={"event": "startup.begin"})
         
         # Validar configurações
         validate_env()
-        print("✅\n⚙️  Verificando serviços: ", end="")
+        logger.info("⚙️  Configurações válidas; verificando serviços...")
         
         results = await test_services()
         if not check_services(results):
             raise Exception("Um ou mais serviços não estão funcionando corretamente")
+
+        # /health e /test-services passam a responder com o resultado das verificações em background
+        await get_health_prober().start()
         
-        print("\n🎉 Servidor iniciado com sucesso!\n")
-        print("Ignorando warnings de torch.nn.modules.module, verificar isso depois")
+        logger.info("🎉 Servidor iniciado com sucesso!", extra={"event": "startup.done"})
         
     except Exception as e:
-        print(f"❌ Erro ao inicializar servidor: {e}")
+        logger.error("❌ Erro ao inicializar servidor: %s", e, extra={"event": "startup.failed"})
         raise e
     
     yield
     
     # Shutdown
-    print("🛑 Desligando servidor...")
-    # Aqui você pode adicionar cleanup se necessário
-    print("✅ Servidor desligado!")
+    logger.info("🛑 Desligando servidor...", extra={"event": "shutdown.begin"})
+    await get_health_prober().close()
+    if get_summarizer() is not None:
+        await get_summarizer().close()
+    await get_rag_system().ollama_pool.close()
+    await get_external_api().close()
+    await get_supabase_manager().close()
+    if get_work_queue() is not None:
+        await get_work_queue().close()
+    await get_redis_client().aclose()
+    logger.info("✅ Servidor desligado!", extra={"event": "shutdown.done"})
+    shutdown_logging()
 
 app = FastAPI(title="WhatsApp RAG Bot com Supabase", lifespan=lifespan)
 
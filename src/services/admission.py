@@ -0,0 +1,108 @@
+import logging
+import time
+from collections import Counter
+from typing import Dict, Optional
+
+from services.metrics import SHED_TOTAL
+
+logger = logging.getLogger(__name__)
+
+ADMISSION_MODES = ("reject", "busy_reply")
+
+class AdmissionController:
+    """Decide se um webhook novo entra para processamento ou é descartado (load shedding).
+
+    Sinais: gerações em andamento + na fila do LLMScheduler + mensagens esperando
+    no MessageCoalescer (`max_backlog`) e, com fila durável, a profundidade da
+    fila de trabalho (`max_queue_depth`, lida no máximo a cada `depth_ttl` s).
+
+    Modos ao passar do limite:
+        reject: o webhook responde 503 com Retry-After e o WTS reenvia depois
+        busy_reply: a mensagem é salva e o contato recebe `busy_message`
+            (no máximo uma vez a cada `busy_reply_cooldown` s por conversa)
+    """
+
+    def __init__(self, llm_scheduler, message_coalescer=None, work_queue=None, max_backlog: int = 0,
+                 max_queue_depth: int = 0, mode: str = "reject", retry_after: int = 30,
+                 busy_message: str = "", busy_reply_cooldown: float = 300.0, depth_ttl: float = 1.0):
+        if mode not in ADMISSION_MODES:
+            raise ValueError(f"Modo de admissão desconhecido: {mode}. Disponíveis: {list(ADMISSION_MODES)}")
+        self.llm_scheduler = llm_scheduler
+        self.message_coalescer = message_coalescer
+        self.work_queue = work_queue
+        self.max_backlog = max_backlog
+        self.max_queue_depth = max_queue_depth
+        self.mode = mode
+        self.retry_after = retry_after
+        self.busy_message = busy_message
+        self.busy_reply_cooldown = busy_reply_cooldown
+        self.depth_ttl = depth_ttl
+        self._queue_depth = 0
+        self._depth_checked_at = 0.0
+        self._busy_replied: Dict[str, float] = {}
+        self._counters = {"admitted": 0, "shed": 0, "busy_replies": 0}
+        self._shed_reasons: Counter = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.max_backlog or (self.max_queue_depth and self.work_queue is not None))
+
+    def backlog(self) -> int:
+        """Trabalho local em andamento ou esperando: gerações e mensagens agrupando"""
+        backlog = self.llm_scheduler.in_flight + self.llm_scheduler.queue_depth
+        if self.message_coalescer is not None:
+            backlog += self.message_coalescer.pending_messages
+        return backlog
+
+    async def check(self) -> Optional[str]:
+        """Retorna None se a mensagem pode entrar ou o motivo do descarte"""
+        reason = None
+        if self.max_backlog and self.backlog() >= self.max_backlog:
+            reason = "backlog"
+        elif self.max_queue_depth and self.work_queue is not None and await self._work_queue_depth() >= self.max_queue_depth:
+            reason = "queue_depth"
+
+        if reason is None:
+            self._counters["admitted"] += 1
+            return None
+        self._counters["shed"] += 1
+        self._shed_reasons[reason] += 1
+        SHED_TOTAL.labels(reason, self.mode).inc()
+        logger.warning("Webhook descartado por sobrecarga (%s, modo %s)", reason, self.mode)
+        return reason
+
+    def claim_busy_reply(self, conversation_id: str) -> bool:
+        """Se a conversa deve receber a resposta de "ocupado" agora (respeitando o cooldown)"""
+        if not self.busy_message:
+            return False
+        now = time.monotonic()
+        if now - self._busy_replied.get(conversation_id, float("-inf")) < self.busy_reply_cooldown:
+            return False
+        self._busy_replied[conversation_id] = now
+        # Limpeza preguiçosa das conversas fora do cooldown
+        if len(self._busy_replied) > 10000:
+            self._busy_replied = {k: t for k, t in self._busy_replied.items() if now - t < self.busy_reply_cooldown}
+        self._counters["busy_replies"] += 1
+        return True
+
+    async def _work_queue_depth(self) -> int:
+        now = time.monotonic()
+        if now - self._depth_checked_at >= self.depth_ttl:
+            self._depth_checked_at = now
+            try:
+                self._queue_depth = (await self.work_queue.stats()).get("depth", 0)
+            except Exception as e:
+                logger.error("Erro ao ler profundidade da fila de trabalho: %s", e)
+        return self._queue_depth
+
+    def stats(self) -> Dict:
+        return {
+            "enabled": self.enabled,
+            "mode": self.mode,
+            "backlog": self.backlog(),
+            "max_backlog": self.max_backlog,
+            "queue_depth": self._queue_depth,
+            "max_queue_depth": self.max_queue_depth,
+            **self._counters,
+            "shed_reasons": dict(self._shed_reasons),
+        }
@@ -0,0 +1,149 @@
+import asyncio
+import logging
+import time
+import uuid
+from collections import OrderedDict
+from contextlib import asynccontextmanager
+from typing import Dict, Optional
+
+from services.metrics import CONVERSATION_CACHE_TOTAL
+
+logger = logging.getLogger(__name__)
+
+class ConversationCache:
+    """Cache telefone -> ID da conversa na frente do get_or_create_conversation.
+
+    Em memória é um LRU com TTL e limite de entradas; com `redis_client` os
+    IDs também ficam no Redis (compartilhados entre processos) e o LRU local
+    serve de primeiro nível. `creation_lock` serializa a criação por telefone
+    para que duas primeiras mensagens simultâneas não criem duas conversas:
+    no mesmo processo com um asyncio.Lock e, com Redis, também com SET NX.
+    """
+
+    def __init__(self, ttl: float = 3600, max_entries: int = 50000, redis_client=None,
+                 prefix: str = "rag:conversation:", lock_timeout: float = 10.0):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.redis = redis_client
+        self.prefix = prefix
+        self.lock_timeout = lock_timeout
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._locks: Dict[str, list] = {}
+        self._counters = {"hits": 0, "misses": 0, "coalesced": 0, "created": 0, "round_trips_saved": 0}
+
+    async def get(self, phone_number: str) -> Optional[str]:
+        """ID em cache da conversa do telefone (None se não houver)"""
+        conversation_id = await self._lookup(phone_number)
+        if conversation_id is None:
+            self._count("misses", "miss")
+        else:
+            self._count("hits", "hit")
+            # Cada acerto evita o SELECT em conversations
+            self._counters["round_trips_saved"] += 1
+        return conversation_id
+
+    async def get_after_wait(self, phone_number: str) -> Optional[str]:
+        """Releitura dentro do creation_lock: outra requisição pode ter acabado de criar a conversa"""
+        conversation_id = await self._lookup(phone_number)
+        if conversation_id is not None:
+            self._count("coalesced", "coalesced")
+            self._counters["round_trips_saved"] += 1
+        return conversation_id
+
+    async def set(self, phone_number: str, conversation_id: str, created: bool = False):
+        if created:
+            self._counters["created"] += 1
+        self._set_local(phone_number, conversation_id)
+        if self.redis:
+            try:
+                await self.redis.set(self.prefix + phone_number, conversation_id, ex=int(self.ttl))
+            except Exception as e:
+                logger.error("Erro ao gravar conversa no Redis: %s", e)
+
+    async def invalidate(self, phone_number: str):
+        self._entries.pop(phone_number, None)
+        if self.redis:
+            await self.redis.delete(self.prefix + phone_number)
+
+    @asynccontextmanager
+    async def creation_lock(self, phone_number: str):
+        """Exclusão mútua por telefone entre buscar e criar a conversa"""
+        entry = self._locks.setdefault(phone_number, [asyncio.Lock(), 0])
+        entry[1] += 1
+        try:
+            async with entry[0]:
+                token = await self._acquire_redis_lock(phone_number) if self.redis else None
+                try:
+                    yield
+                finally:
+                    if token is not None:
+                        await self._release_redis_lock(phone_number, token)
+        finally:
+            entry[1] -= 1
+            if entry[1] == 0:
+                self._locks.pop(phone_number, None)
+
+    async def _lookup(self, phone_number: str) -> Optional[str]:
+        now = time.monotonic()
+        entry = self._entries.get(phone_number)
+        if entry is not None:
+            if entry[0] > now:
+                self._entries.move_to_end(phone_number)
+                return entry[1]
+            del self._entries[phone_number]
+
+        if self.redis:
+            try:
+                conversation_id = await self.redis.get(self.prefix + phone_number)
+            except Exception as e:
+                logger.error("Erro ao ler conversa do Redis: %s", e)
+                return None
+            if conversation_id:
+                self._set_local(phone_number, conversation_id)
+                return conversation_id
+        return None
+
+    def _set_local(self, phone_number: str, conversation_id: str):
+        self._entries[phone_number] = (time.monotonic() + self.ttl, conversation_id)
+        self._entries.move_to_end(phone_number)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+
+    def _count(self, counter: str, result: str):
+        self._counters[counter] += 1
+        CONVERSATION_CACHE_TOTAL.labels(result).inc()
+
+    async def _acquire_redis_lock(self, phone_number: str) -> Optional[str]:
+        key = f"{self.prefix}lock:{phone_number}"
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_timeout
+        while True:
+            try:
+                if await self.redis.set(key, token, nx=True, px=int(self.lock_timeout * 1000)):
+                    return token
+            except Exception as e:
+                logger.error("Erro ao obter lock de criação no Redis: %s", e)
+                return None
+            if time.monotonic() >= deadline:
+                # O lock expira sozinho; seguir sem ele é melhor que travar o webhook
+                logger.warning("Timeout no lock de criação da conversa de %s", phone_number)
+                return None
+            await asyncio.sleep(0.05)
+
+    async def _release_redis_lock(self, phone_number: str, token: str):
+        key = f"{self.prefix}lock:{phone_number}"
+        try:
+            # Só apaga o próprio lock (pode ter expirado e sido obtido por outro processo)
+            if await self.redis.get(key) == token:
+                await self.redis.delete(key)
+        except Exception as e:
+            logger.error("Erro ao liberar lock de criação no Redis: %s", e)
+
+    def stats(self) -> Dict:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            "backend": "redis" if self.redis else "memory",
+            "entries": len(self._entries),
+            **self._counters,
+            "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+        }
@@ -0,0 +1,81 @@
+import json
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, Optional
+
+logger = logging.getLogger(__name__)
+
+# Resposta devolvida a um reenvio que chega enquanto o original ainda está sendo recebido
+IN_PROGRESS_ACK = {"status": "success", "message": "Mensagem já recebida, processamento em andamento"}
+
+class WebhookDeduplicator:
+    """Conjunto com TTL dos IDs de mensagem já recebidos do WTS.
+
+    `claim` registra o ID e devolve None na primeira vez; em reenvios devolve
+    a resposta original. Com `redis_client` o conjunto é compartilhado entre
+    processos (SET NX EX); sem ele fica em memória com limite de entradas.
+    """
+
+    def __init__(self, ttl: float = 86400, max_entries: int = 100000, redis_client=None, prefix: str = "rag:webhook:"):
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.redis = redis_client
+        self.prefix = prefix
+        self._entries: "OrderedDict[str, tuple]" = OrderedDict()
+        self._counters = {"received": 0, "duplicates": 0}
+
+    async def claim(self, message_id: str) -> Optional[Dict]:
+        """Registra o ID; retorna None se é novo ou a resposta original se for duplicado"""
+        self._counters["received"] += 1
+        original = await (self._claim_redis(message_id) if self.redis else self._claim_local(message_id))
+        if original is not None:
+            self._counters["duplicates"] += 1
+            logger.info("Webhook duplicado ignorado: %s", message_id)
+        return original
+
+    async def complete(self, message_id: str, ack: Dict):
+        """Guarda a resposta enviada ao WTS para devolver em reenvios"""
+        if self.redis:
+            await self.redis.set(self.prefix + message_id, json.dumps(ack), ex=int(self.ttl))
+        else:
+            self._entries[message_id] = (time.monotonic() + self.ttl, ack)
+
+    async def release(self, message_id: str):
+        """Esquece o ID (ex: falha ao salvar) para que o reenvio do WTS seja processado"""
+        if self.redis:
+            await self.redis.delete(self.prefix + message_id)
+        else:
+            self._entries.pop(message_id, None)
+
+    async def _claim_redis(self, message_id: str) -> Optional[Dict]:
+        key = self.prefix + message_id
+        if await self.redis.set(key, json.dumps(IN_PROGRESS_ACK), nx=True, ex=int(self.ttl)):
+            return None
+        stored = await self.redis.get(key)
+        return json.loads(stored) if stored else IN_PROGRESS_ACK
+
+    async def _claim_local(self, message_id: str) -> Optional[Dict]:
+        now = time.monotonic()
+        entry = self._entries.get(message_id)
+        if entry is not None and entry[0] > now:
+            return entry[1]
+
+        self._entries[message_id] = (now + self.ttl, IN_PROGRESS_ACK)
+        self._entries.move_to_end(message_id)
+        # Entradas mais antigas saem primeiro (por expiração ou pelo limite de tamanho)
+        while self._entries:
+            oldest_id, (expires_at, _) = next(iter(self._entries.items()))
+            if expires_at > now and len(self._entries) <= self.max_entries:
+                break
+            del self._entries[oldest_id]
+        return None
+
+    def stats(self) -> Dict:
+        received = self._counters["received"]
+        return {
+            "backend": "redis" if self.redis else "memory",
+            "entries": len(self._entries) if not self.redis else None,
+            **self._counters,
+            "duplicate_rate": self._counters["duplicates"] / received if received else 0.0,
+        }
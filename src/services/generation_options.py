@@ -0,0 +1,91 @@
+import logging
+import time
+from typing import Dict, List, Sequence
+
+logger = logging.getLogger(__name__)
+
+class GenerationOptions:
+    """Calcula as opções do Ollama (num_ctx, num_predict, stop) para cada requisição.
+
+    O num_ctx é arredondado para um conjunto pequeno de buckets: cada valor
+    diferente de num_ctx obriga o Ollama a recarregar o modelo, então usar
+    poucos tamanhos mantém o modelo quente e ainda evita alocar o cache KV
+    do contexto máximo para prompts pequenos.
+    """
+
+    def __init__(self, ctx_buckets: Sequence[int] = (2048, 4096, 8192), num_predict: int = 256,
+                 stop: List[str] = None, temperature: float = 0.7, chars_per_token: float = 3.0):
+        if not ctx_buckets:
+            raise ValueError("É necessário informar pelo menos um bucket de num_ctx")
+        self.ctx_buckets = sorted(ctx_buckets)
+        self.num_predict = num_predict
+        self.stop = stop or []
+        self.temperature = temperature
+        self.chars_per_token = chars_per_token
+        self._buckets = {
+            bucket: {"requests": 0, "prompt_tokens": 0, "total_seconds": 0.0,
+                     "prompt_eval_ns": 0, "eval_ns": 0, "eval_count": 0}
+            for bucket in self.ctx_buckets
+        }
+        self._overflows = 0
+
+    def estimate_tokens(self, messages: List[Dict]) -> int:
+        """Estimativa conservadora de tokens do prompt (inclui sobrecarga do template de chat)"""
+        chars = sum(len(m["content"]) for m in messages)
+        return int(chars / self.chars_per_token) + 8 * len(messages)
+
+    def bucket_for(self, prompt_tokens: int) -> int:
+        """Menor bucket que comporta o prompt e a resposta"""
+        needed = prompt_tokens + (self.num_predict if self.num_predict > 0 else 0)
+        for bucket in self.ctx_buckets:
+            if needed <= bucket:
+                return bucket
+        self._overflows += 1
+        logger.warning("Prompt de ~%s tokens excede o maior bucket (%s)", prompt_tokens, self.ctx_buckets[-1])
+        return self.ctx_buckets[-1]
+
+    def build(self, messages: List[Dict]) -> Dict:
+        """Retorna o dicionário `options` para o /api/chat"""
+        prompt_tokens = self.estimate_tokens(messages)
+        options = {
+            "temperature": self.temperature,
+            "num_ctx": self.bucket_for(prompt_tokens),
+        }
+        if self.num_predict > 0:
+            options["num_predict"] = self.num_predict
+        if self.stop:
+            options["stop"] = self.stop
+        return options
+
+    def record(self, options: Dict, messages: List[Dict], started: float, final_chunk: Dict = None):
+        """Registra latência e contagens do Ollama no bucket usado"""
+        bucket = self._buckets.get(options.get("num_ctx"))
+        if bucket is None:
+            return
+        final_chunk = final_chunk or {}
+        bucket["requests"] += 1
+        bucket["prompt_tokens"] += self.estimate_tokens(messages)
+        bucket["total_seconds"] += time.monotonic() - started
+        bucket["prompt_eval_ns"] += final_chunk.get("prompt_eval_duration", 0)
+        bucket["eval_ns"] += final_chunk.get("eval_duration", 0)
+        bucket["eval_count"] += final_chunk.get("eval_count", 0)
+
+    def stats(self) -> Dict:
+        """Latência média por bucket de num_ctx"""
+        buckets = {}
+        for size, data in self._buckets.items():
+            requests = data["requests"] or 1
+            buckets[str(size)] = {
+                "requests": data["requests"],
+                "avg_prompt_tokens": data["prompt_tokens"] / requests,
+                "avg_latency_ms": data["total_seconds"] / requests * 1000,
+                "avg_prompt_eval_ms": data["prompt_eval_ns"] / requests / 1e6,
+                "avg_eval_ms": data["eval_ns"] / requests / 1e6,
+                "avg_eval_count": data["eval_count"] / requests,
+            }
+        return {
+            "num_predict": self.num_predict,
+            "stop": self.stop,
+            "overflows": self._overflows,
+            "buckets": buckets,
+        }
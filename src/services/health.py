@@ -0,0 +1,112 @@
+import asyncio
+import logging
+import time
+from datetime import datetime, timezone
+from typing import Awaitable, Callable, Dict, Iterable, Optional
+
+logger = logging.getLogger(__name__)
+
+class HealthProber:
+    """Verifica as dependências em background e guarda o último resultado de cada uma.
+
+    Cada verificação (`probes`: nome -> corrotina que retorna bool) roda no
+    próprio intervalo (`intervals`, ou `interval`) com `timeout`; /health e
+    /test-services leem o snapshot em memória em vez de chamar os serviços a
+    cada requisição. Um resultado mais velho que três intervalos (ex: o loop
+    travou) conta como falha.
+    """
+
+    def __init__(self, probes: Dict[str, Callable[[], Awaitable[bool]]], interval: float = 15.0,
+                 timeout: float = 10.0, intervals: Optional[Dict[str, float]] = None):
+        self.probes = probes
+        self.interval = interval
+        self.timeout = timeout
+        self.intervals = {name: (intervals or {}).get(name, interval) for name in probes}
+        self._results: Dict[str, Dict] = {}
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._counters = {"probes": 0, "failures": 0}
+
+    async def check(self, name: str) -> Dict:
+        """Executa a verificação agora e atualiza o snapshot"""
+        started = time.perf_counter()
+        error = None
+        try:
+            healthy = bool(await asyncio.wait_for(self.probes[name](), timeout=self.timeout))
+        except asyncio.TimeoutError:
+            healthy, error = False, f"Timeout após {self.timeout:g}s"
+        except Exception as e:
+            healthy, error = False, str(e) or type(e).__name__
+        previous = self._results.get(name)
+        result = {
+            "healthy": healthy,
+            "latency_ms": round((time.perf_counter() - started) * 1000, 1),
+            "checked_at": datetime.now(timezone.utc).isoformat(),
+            "error": error,
+            "consecutive_failures": 0 if healthy else (previous["consecutive_failures"] + 1 if previous else 1),
+            "_monotonic": time.monotonic(),
+        }
+        self._results[name] = result
+        self._counters["probes"] += 1
+        if not healthy:
+            self._counters["failures"] += 1
+            if previous is None or previous["healthy"]:
+                logger.warning("Dependência %s ficou indisponível: %s", name, error or "verificação falhou")
+        elif previous is not None and not previous["healthy"]:
+            logger.info("Dependência %s voltou a responder", name)
+        return self._public(name, result)
+
+    async def refresh(self, names: Iterable[str] = None) -> Dict[str, Dict]:
+        """Verifica as dependências (todas ou `names`) em paralelo"""
+        names = list(names or self.probes)
+        results = await asyncio.gather(*(self.check(name) for name in names))
+        return dict(zip(names, results))
+
+    async def start(self):
+        """Faz a primeira rodada (o snapshot já sai preenchido) e inicia os loops"""
+        await self.refresh()
+        for name in self.probes:
+            if name not in self._tasks:
+                self._tasks[name] = asyncio.create_task(self._run(name))
+
+    async def _run(self, name: str):
+        while True:
+            await asyncio.sleep(self.intervals[name])
+            try:
+                await self.check(name)
+            except Exception as e:
+                logger.exception("Erro na verificação de %s: %s", name, e)
+
+    async def close(self):
+        tasks = list(self._tasks.values())
+        self._tasks.clear()
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def _public(self, name: str, result: Dict) -> Dict:
+        age = time.monotonic() - result["_monotonic"]
+        stale = age > 3 * self.intervals[name] + self.timeout
+        return {
+            "healthy": result["healthy"] and not stale,
+            "latency_ms": result["latency_ms"],
+            "checked_at": result["checked_at"],
+            "age_seconds": round(age, 1),
+            "stale": stale,
+            "error": result["error"],
+            "consecutive_failures": result["consecutive_failures"],
+        }
+
+    def snapshot(self, names: Iterable[str] = None) -> Dict[str, Optional[Dict]]:
+        """Último resultado de cada dependência (None se ainda não foi verificada)"""
+        return {
+            name: self._public(name, self._results[name]) if name in self._results else None
+            for name in (names or self.probes)
+        }
+
+    def stats(self) -> Dict:
+        snapshot = self.snapshot()
+        return {
+            **self._counters,
+            **{f"{name}_healthy": bool(result and result["healthy"]) for name, result in snapshot.items()},
+            **{f"{name}_latency_ms": result["latency_ms"] for name, result in snapshot.items() if result},
+        }
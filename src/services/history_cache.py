@@ -0,0 +1,111 @@
+import time
+from collections import OrderedDict, deque
+from typing import Dict, List, Optional
+
+# Colunas do histórico usadas pelo retrieve_context e pelo PromptBuilder (id e created_at para ordenar e deduplicar)
+HISTORY_COLUMNS = ("id", "direction", "content", "created_at")
+
+class _History:
+    __slots__ = ("rows", "complete", "expires_at")
+
+    def __init__(self, rows: deque, complete: bool, expires_at: float):
+        self.rows = rows
+        # True se o banco não tem mensagens mais antigas que as do buffer
+        self.complete = complete
+        self.expires_at = expires_at
+
+class HistoryCache:
+    """Buffer circular em memória com as últimas mensagens de cada conversa.
+
+    `get` devolve o histórico sem ir ao banco quando o buffer cobre o limite
+    pedido; `append` é chamado a cada save_message e `load` preenche o buffer
+    depois de uma consulta ao banco (miss). Conversas saem por LRU
+    (`max_conversations`) ou por `ttl`, que limita o quanto o buffer pode
+    ficar defasado se outro processo gravar na mesma conversa.
+    """
+
+    def __init__(self, max_conversations: int = 10000, max_messages: int = 20, ttl: float = 300.0):
+        self.max_conversations = max_conversations
+        self.max_messages = max_messages
+        self.ttl = ttl
+        self._conversations: "OrderedDict[str, _History]" = OrderedDict()
+        # Gravações que chegam durante um load, para não se perderem quando o resultado do banco chegar
+        self._loading: Dict[str, list] = {}
+        self._counters = {"hits": 0, "misses": 0, "appends": 0, "loads": 0, "evictions": 0}
+
+    @staticmethod
+    def project(row: Dict) -> Dict:
+        return {column: row.get(column) for column in HISTORY_COLUMNS}
+
+    def get(self, conversation_id: str, limit: int) -> Optional[List[Dict]]:
+        """Últimas `limit` mensagens da conversa (None se o buffer não cobre o pedido)"""
+        history = self._conversations.get(conversation_id)
+        if history is not None and history.expires_at <= time.monotonic():
+            del self._conversations[conversation_id]
+            history = None
+        if history is None or limit > self.max_messages or (len(history.rows) < limit and not history.complete):
+            self._counters["misses"] += 1
+            return None
+        self._conversations.move_to_end(conversation_id)
+        self._counters["hits"] += 1
+        return list(history.rows)[-limit:] if limit else []
+
+    def append(self, conversation_id: str, row: Dict):
+        """Registra uma mensagem recém-salva"""
+        row = self.project(row)
+        loading = self._loading.get(conversation_id)
+        if loading is not None:
+            loading[1].append(row)
+        history = self._conversations.get(conversation_id)
+        if history is not None:
+            if len(history.rows) == history.rows.maxlen:
+                history.complete = False
+            history.rows.append(row)
+            self._counters["appends"] += 1
+
+    def begin_load(self, conversation_id: str):
+        """Marca o início de uma consulta ao banco para a conversa"""
+        loading = self._loading.setdefault(conversation_id, [0, []])
+        loading[0] += 1
+
+    def load(self, conversation_id: str, rows: List[Dict], limit: int):
+        """Guarda o resultado da consulta (`rows` em ordem cronológica, até `limit` linhas)"""
+        loading = self._loading.get(conversation_id)
+        written = []
+        if loading is not None:
+            written = loading[1]
+            loading[0] -= 1
+            if loading[0] <= 0:
+                del self._loading[conversation_id]
+        if limit > self.max_messages:
+            return
+
+        seen = {row["id"] for row in rows}
+        merged = [self.project(row) for row in rows] + [row for row in written if row["id"] not in seen]
+        merged.sort(key=lambda row: row["created_at"] or "")
+        history = _History(deque(merged, maxlen=self.max_messages), len(rows) < limit and len(merged) <= self.max_messages,
+                           time.monotonic() + self.ttl)
+        self._conversations[conversation_id] = history
+        self._conversations.move_to_end(conversation_id)
+        self._counters["loads"] += 1
+        while len(self._conversations) > self.max_conversations:
+            self._conversations.popitem(last=False)
+            self._counters["evictions"] += 1
+
+    def abort_load(self, conversation_id: str):
+        """Consulta falhou: descarta o registro de gravações em andamento"""
+        loading = self._loading.get(conversation_id)
+        if loading is not None:
+            loading[0] -= 1
+            if loading[0] <= 0:
+                del self._loading[conversation_id]
+
+    def stats(self) -> Dict:
+        lookups = self._counters["hits"] + self._counters["misses"]
+        return {
+            "conversations": len(self._conversations),
+            "max_conversations": self.max_conversations,
+            "max_messages": self.max_messages,
+            **self._counters,
+            "hit_rate": self._counters["hits"] / lookups if lookups else 0.0,
+        }
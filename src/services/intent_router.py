@@ -0,0 +1,138 @@
+import logging
+import re
+import unicodedata
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Dict, List, Optional
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Intent:
+    name: str
+    examples: List[str]
+    reply: Optional[str] = None  # None = não responder
+    threshold: float = 0.85
+
+@dataclass
+class RouteDecision:
+    intent: Optional[str]
+    score: float
+    reply: Optional[str] = None
+    embedding: Optional[List[float]] = field(default=None, repr=False)
+
+    @property
+    def fast_path(self) -> bool:
+        return self.intent is not None
+
+DEFAULT_INTENTS: Dict[str, Intent] = {
+    "confirmacao": Intent(
+        name="confirmacao",
+        examples=["ok", "okay", "blz", "beleza", "certo", "entendi", "tá bom", "ta bom", "combinado", "show", "perfeito", "👍"],
+        reply=None,
+    ),
+    "agradecimento": Intent(
+        name="agradecimento",
+        examples=["obrigado", "obrigada", "muito obrigado", "valeu", "vlw", "obg", "grato", "agradeço", "brigado"],
+        reply="Por nada! Se precisar de mais alguma coisa, é só chamar.",
+    ),
+    "saudacao": Intent(
+        name="saudacao",
+        examples=["oi", "olá", "ola", "bom dia", "boa tarde", "boa noite", "e aí", "oie", "opa"],
+        reply="Olá! Como posso ajudar?",
+    ),
+    "despedida": Intent(
+        name="despedida",
+        examples=["tchau", "até mais", "ate logo", "falou", "até amanhã", "flw"],
+        reply=None,
+    ),
+}
+
+# Partes de emoji que não são símbolos: modificadores de tom de pele, ZWJ e seletores de variação
+_EMOJI_PARTS = {"\u200d", "\ufe0e", "\ufe0f"} | {chr(cp) for cp in range(0x1F3FB, 0x1F400)}
+_KEYCAP = re.compile("[0-9#*]\ufe0f?\u20e3")
+
+def _is_emoji_only(text: str) -> bool:
+    """Só emojis (e espaços): "👍", "🙏🏽", "❤️", "1️⃣"; pontuação como "?" ou "..." não conta"""
+    text, keycaps = _KEYCAP.subn("", text)
+    chars = [ch for ch in text if not ch.isspace()]
+    symbols = sum(1 for ch in chars if unicodedata.category(ch) == "So")
+    return symbols + keycaps > 0 and all(unicodedata.category(ch) == "So" or ch in _EMOJI_PARTS for ch in chars)
+
+def _normalize(text: str) -> str:
+    text = unicodedata.normalize("NFKD", text.lower().strip())
+    text = "".join(ch for ch in text if not unicodedata.combining(ch))
+    return " ".join(text.strip(" .!?,;~").split())
+
+class IntentRouter:
+    """Classifica mensagens triviais antes da recuperação e geração.
+
+    Compara o embedding da mensagem com o centróide dos exemplos de cada
+    intenção configurada. Mensagens longas nunca são roteadas, para não
+    engolir perguntas como "ok, mas qual o preço?".
+    """
+
+    def __init__(self, rag_system, intents: List[Intent], max_chars: int = 40, emoji_only: bool = True):
+        self.rag_system = rag_system
+        self.intents = intents
+        self.max_chars = max_chars
+        self.emoji_only = emoji_only
+        self._centroids = None
+        self._exact = {_normalize(example): intent for intent in intents for example in intent.examples}
+        self._counts = Counter()
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.intents) or self.emoji_only
+
+    def _ensure_centroids(self):
+        if self._centroids is not None:
+            return
+        centroids = []
+        for intent in self.intents:
+            vectors = self.rag_system.embedding_model.encode(intent.examples, normalize_embeddings=True)
+            centroid = np.mean(vectors, axis=0)
+            centroids.append(centroid / np.linalg.norm(centroid))
+        self._centroids = np.array(centroids) if centroids else None
+
+    def route(self, message: str) -> RouteDecision:
+        """Decide se a mensagem pode pular recuperação e geração"""
+        embedding = self.rag_system.embed_query(message)
+        decision = self._classify(message, embedding)
+        self._counts[decision.intent or "rag"] += 1
+        if decision.fast_path:
+            logger.debug("Fast-path: intenção '%s' (score %.2f) para '%s'", decision.intent, decision.score, message)
+        return decision
+
+    def _classify(self, message: str, embedding: List[float]) -> RouteDecision:
+        if self.emoji_only and _is_emoji_only(message):
+            return RouteDecision("emoji", 1.0, None, embedding)
+
+        if not self.intents or len(message) > self.max_chars:
+            return RouteDecision(None, 0.0, None, embedding)
+
+        exact = self._exact.get(_normalize(message))
+        if exact:
+            return RouteDecision(exact.name, 1.0, exact.reply, embedding)
+
+        self._ensure_centroids()
+        vector = np.asarray(embedding)
+        vector = vector / (np.linalg.norm(vector) or 1.0)
+        scores = self._centroids @ vector
+        best = int(np.argmax(scores))
+        intent = self.intents[best]
+        score = float(scores[best])
+        if score >= intent.threshold:
+            return RouteDecision(intent.name, score, intent.reply, embedding)
+        return RouteDecision(None, score, None, embedding)
+
+    def stats(self) -> Dict:
+        total = sum(self._counts.values())
+        fast_path = total - self._counts.get("rag", 0)
+        return {
+            "intents": [intent.name for intent in self.intents],
+            "decisions": dict(self._counts),
+            "fast_path_ratio": fast_path / total if total else 0.0,
+        }
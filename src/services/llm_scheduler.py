@@ -0,0 +1,172 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Deque, Dict
+
+logger = logging.getLogger(__name__)
+
+PRIORITY_HIGH = 0
+PRIORITY_NORMAL = 1
+PRIORITY_LOW = 2
+
+class QueueTimeoutError(Exception):
+    """A requisição esperou na fila mais que o tempo máximo permitido"""
+
+class QueueFullError(Exception):
+    """A fila de geração atingiu o tamanho máximo"""
+
+class _Job:
+    __slots__ = ("conversation_id", "priority", "future", "enqueued_at")
+
+    def __init__(self, conversation_id: str, priority: int, future: asyncio.Future):
+        self.conversation_id = conversation_id
+        self.priority = priority
+        self.future = future
+        self.enqueued_at = time.monotonic()
+
+class LLMScheduler:
+    """Limita as gerações simultâneas no Ollama com fila justa por conversa.
+
+    Cada prioridade tem uma fila round-robin entre conversas: uma conversa com
+    várias mensagens pendentes não passa na frente das demais. Jobs que esperam
+    mais que `max_queue_time` são descartados com QueueTimeoutError.
+    """
+
+    def __init__(self, max_in_flight: int = 2, max_queue_time: float = 120.0, max_queue_size: int = 0):
+        self.max_in_flight = max(1, max_in_flight)
+        self.max_queue_time = max_queue_time
+        self.max_queue_size = max_queue_size
+        self._in_flight = 0
+        self._queued = 0
+        # prioridade -> conversa -> jobs pendentes
+        self._queues: Dict[int, "OrderedDict[str, Deque[_Job]]"] = {}
+        self._wait_times: Deque[float] = deque(maxlen=1000)
+        self._counters = {"submitted": 0, "completed": 0, "failed": 0, "timeouts": 0, "rejected": 0, "cancelled": 0}
+        self._max_wait = 0.0
+
+    @property
+    def in_flight(self) -> int:
+        return self._in_flight
+
+    @property
+    def queue_depth(self) -> int:
+        return self._queued
+
+    async def submit(self, func: Callable[[], Awaitable[Any]], conversation_id: str = "", priority: int = PRIORITY_NORMAL) -> Any:
+        """Executa `func()` assim que houver vaga, respeitando prioridade e justiça entre conversas"""
+        self._counters["submitted"] += 1
+        await self._acquire(conversation_id, priority)
+        try:
+            result = await func()
+            self._counters["completed"] += 1
+            return result
+        except asyncio.CancelledError:
+            self._counters["cancelled"] += 1
+            raise
+        except Exception:
+            self._counters["failed"] += 1
+            raise
+        finally:
+            self._release()
+
+    async def _acquire(self, conversation_id: str, priority: int):
+        if self._in_flight < self.max_in_flight and self._queued == 0:
+            self._in_flight += 1
+            self._record_wait(0.0)
+            return
+
+        if self.max_queue_size and self._queued >= self.max_queue_size:
+            self._counters["rejected"] += 1
+            raise QueueFullError(f"Fila de geração cheia ({self._queued} pendentes)")
+
+        job = _Job(conversation_id, priority, asyncio.get_running_loop().create_future())
+        conversations = self._queues.setdefault(priority, OrderedDict())
+        conversations.setdefault(conversation_id, deque()).append(job)
+        self._queued += 1
+
+        try:
+            await asyncio.wait_for(job.future, timeout=self.max_queue_time)
+        except asyncio.TimeoutError:
+            self._discard(job)
+            self._counters["timeouts"] += 1
+            logger.warning("Geração descartada após %ss na fila (conversa %s)", self.max_queue_time, conversation_id)
+            raise QueueTimeoutError(f"Tempo máximo de fila excedido ({self.max_queue_time}s)")
+        except asyncio.CancelledError:
+            if job.future.done() and not job.future.cancelled():
+                # A vaga foi concedida, mas o chamador foi cancelado antes de usá-la
+                self._release()
+            else:
+                self._discard(job)
+            raise
+
+    def _discard(self, job: _Job):
+        conversations = self._queues.get(job.priority)
+        if not conversations or job.conversation_id not in conversations:
+            return
+        jobs = conversations[job.conversation_id]
+        try:
+            jobs.remove(job)
+            self._queued -= 1
+        except ValueError:
+            return
+        if not jobs:
+            del conversations[job.conversation_id]
+
+    def _release(self):
+        self._in_flight -= 1
+        while self._in_flight < self.max_in_flight:
+            job = self._next_job()
+            if job is None:
+                return
+            if job.future.done():
+                continue
+            self._in_flight += 1
+            self._record_wait(time.monotonic() - job.enqueued_at)
+            job.future.set_result(True)
+
+    def _next_job(self):
+        for priority in sorted(self._queues):
+            conversations = self._queues[priority]
+            if not conversations:
+                continue
+            conversation_id, jobs = next(iter(conversations.items()))
+            job = jobs.popleft()
+            self._queued -= 1
+            if jobs:
+                # Round-robin: a conversa volta para o fim da fila
+                conversations.move_to_end(conversation_id)
+            else:
+                del conversations[conversation_id]
+            return job
+        return None
+
+    def _record_wait(self, wait: float):
+        self._wait_times.append(wait)
+        self._max_wait = max(self._max_wait, wait)
+
+    def stats(self) -> Dict:
+        """Profundidade de fila, ocupação e tempos de espera"""
+        waits = sorted(self._wait_times)
+
+        def percentile(p: float) -> float:
+            if not waits:
+                return 0.0
+            return waits[min(len(waits) - 1, int(p * len(waits)))]
+
+        return {
+            "max_in_flight": self.max_in_flight,
+            "in_flight": self._in_flight,
+            "queue_depth": self._queued,
+            "queue_depth_by_priority": {
+                priority: sum(len(jobs) for jobs in conversations.values())
+                for priority, conversations in self._queues.items()
+            },
+            "wait_seconds": {
+                "p50": percentile(0.50),
+                "p95": percentile(0.95),
+                "p99": percentile(0.99),
+                "max": self._max_wait,
+            },
+            **self._counters,
+        }
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+from contextvars import ContextVar
+from typing import Any, Awaitable, Callable, Dict, List, Optional
+
+from models.schemas import Message
+
+logger = logging.getLogger(__name__)
+
+class _Turn:
+    """Um turno de processamento: mensagens agrupadas que recebem uma única resposta"""
+
+    def __init__(self, messages: List[Message], waiters: List[asyncio.Future]):
+        self.messages = messages
+        self.waiters = waiters
+        self.committed = False
+        self.replied = False
+
+_current_turn: ContextVar[Optional[_Turn]] = ContextVar("current_turn", default=None)
+
+def _retrieve_exception(future: asyncio.Future):
+    # O webhook não espera o future: sem isso, um turno com erro gera "Future exception was never retrieved"
+    if not future.cancelled():
+        future.exception()
+
+def begin_reply():
+    """Marca o turno atual como confirmado: a resposta vai ser enviada e não pode mais ser cancelada"""
+    turn = _current_turn.get()
+    if turn is not None:
+        turn.committed = True
+
+def reply_sent():
+    """Marca que a resposta do turno atual saiu: repetir o turno mandaria outra ao contato"""
+    turn = _current_turn.get()
+    if turn is not None:
+        turn.replied = True
+
+def track_turn(messages: List[Message]) -> _Turn:
+    """Abre um turno no contexto atual, para quem processa sem o agrupamento acompanhar begin_reply/reply_sent"""
+    turn = _Turn(messages, [])
+    _current_turn.set(turn)
+    return turn
+
+class _ConversationState:
+    def __init__(self):
+        self.pending: List[Message] = []
+        self.waiters: List[asyncio.Future] = []
+        self.aggregated: Optional[str] = None
+        self.timer: Optional[asyncio.Task] = None
+        self.turn: Optional[_Turn] = None
+        self.turn_task: Optional[asyncio.Task] = None
+
+class MessageCoalescer:
+    """Agrupa rajadas de mensagens da mesma conversa em um único turno.
+
+    Cada mensagem reinicia uma janela de `window` segundos; quando a janela
+    fecha, as mensagens pendentes viram uma só e seguem para o `handler`.
+    Se chegar mensagem nova enquanto o turno anterior ainda não confirmou a
+    resposta (begin_reply), a geração em andamento é cancelada e as mensagens
+    voltam para o próximo turno.
+    """
+
+    def __init__(self, handler: Callable[[Message, str], Awaitable[Any]], window: float = 2.0):
+        self.handler = handler
+        self.window = window
+        self._conversations: Dict[str, _ConversationState] = {}
+        self._counters = {"messages": 0, "turns": 0, "merged": 0, "cancelled": 0}
+
+    def submit(self, message: Message, conversation_id: str, aggregated_text: str = None) -> asyncio.Future:
+        """Adiciona a mensagem à janela da conversa; o future resolve com o resultado do turno que a contém.
+
+        Se a resposta do turno já saiu (reply_sent), o future resolve com True mesmo que algo falhe
+        depois, para quem reprocessa em caso de falha (worker) não repetir a resposta.
+        """
+        state = self._conversations.setdefault(conversation_id, _ConversationState())
+        waiter = asyncio.get_running_loop().create_future()
+        waiter.add_done_callback(_retrieve_exception)
+        state.pending.append(message)
+        state.waiters.append(waiter)
+        state.aggregated = aggregated_text or None
+        self._counters["messages"] += 1
+
+        if state.turn is not None and not state.turn.committed and state.turn_task and not state.turn_task.done():
+            logger.info("Nova mensagem na conversa %s: cancelando geração em andamento", conversation_id)
+            self._counters["cancelled"] += 1
+            state.turn_task.cancel()
+
+        if state.timer is not None:
+            state.timer.cancel()
+        state.timer = asyncio.create_task(self._fire_after(conversation_id, state))
+        return waiter
+
+    async def _fire_after(self, conversation_id: str, state: _ConversationState):
+        await asyncio.sleep(self.window)
+        state.timer = None
+
+        # Um turno por vez por conversa: espera o anterior terminar (ou devolver as mensagens)
+        if state.turn_task is not None and not state.turn_task.done():
+            await asyncio.wait({state.turn_task})
+        if state.timer is not None or not state.pending:
+            # Outra mensagem reabriu a janela enquanto esperávamos
+            return
+
+        turn = _Turn(state.pending, state.waiters)
+        merged = self._merge(turn.messages, state.aggregated)
+        state.pending, state.waiters, state.aggregated = [], [], None
+        state.turn = turn
+        state.turn_task = asyncio.create_task(self._run_turn(conversation_id, state, turn, merged))
+
+    async def _run_turn(self, conversation_id: str, state: _ConversationState, turn: _Turn, merged: Message):
+        _current_turn.set(turn)
+        self._counters["turns"] += 1
+        if len(turn.messages) > 1:
+            self._counters["merged"] += len(turn.messages) - 1
+        error = None
+        result = None
+        try:
+            result = await self.handler(merged, conversation_id)
+        except asyncio.CancelledError:
+            if not turn.committed:
+                # As mensagens voltam para a frente da fila e entram no próximo turno
+                state.pending[0:0] = turn.messages
+                state.waiters[0:0] = turn.waiters
+                return
+            raise
+        except Exception as e:
+            logger.error("Erro ao processar turno da conversa %s: %s", conversation_id, e)
+            error = e
+        finally:
+            if state.turn is turn:
+                state.turn = None
+            if not state.pending and state.timer is None and self._conversations.get(conversation_id) is state:
+                del self._conversations[conversation_id]
+
+        for waiter in turn.waiters:
+            if not waiter.done():
+                if turn.replied:
+                    waiter.set_result(True)
+                elif error:
+                    waiter.set_exception(error)
+                else:
+                    waiter.set_result(result)
+
+    @staticmethod
+    def _merge(messages: List[Message], aggregated: Optional[str]) -> Message:
+        last = messages[-1]
+        if len(messages) == 1:
+            return last
+        # O WTS já agrega as mensagens do contato desde a última resposta; usa quando é consistente
+        if aggregated and last.content in aggregated:
+            content = aggregated
+        else:
+            content = "\n".join(m.content for m in messages)
+        return last.model_copy(update={"content": content})
+
+    @property
+    def pending_messages(self) -> int:
+        return sum(len(state.pending) for state in self._conversations.values())
+
+    def stats(self) -> Dict:
+        return {
+            "window_seconds": self.window,
+            "active_conversations": len(self._conversations),
+            "pending_messages": self.pending_messages,
+            "turns_in_flight": sum(1 for s in self._conversations.values() if s.turn is not None),
+            **self._counters,
+        }
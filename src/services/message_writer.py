@@ -0,0 +1,124 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+class MessageWriteBuffer:
+    """Write-behind das linhas de `messages`: junta as inserções e grava em lote.
+
+    `add` devolve assim que a linha entra no buffer; um lote é gravado a cada
+    `max_batch` linhas ou `flush_interval` s depois da primeira pendente.
+    Falhas são repetidas com backoff exponencial (`max_retries`); esgotadas as
+    tentativas, o lote é gravado linha a linha e só as linhas que falharem são
+    descartadas. Com `max_buffered` linhas pendentes, `add` espera espaço
+    (memória limitada). Linhas ainda não gravadas ficam visíveis em `pending`
+    para o histórico da própria conversa (read-your-writes).
+    """
+
+    def __init__(self, insert_rows: Callable[[List[Dict]], Awaitable], max_batch: int = 100,
+                 flush_interval: float = 0.05, max_buffered: int = 10000, max_retries: int = 5,
+                 retry_base_delay: float = 0.5):
+        self.insert_rows = insert_rows
+        self.max_batch = max_batch
+        self.flush_interval = flush_interval
+        self.max_buffered = max_buffered
+        self.max_retries = max_retries
+        self.retry_base_delay = retry_base_delay
+        self._rows: List[Dict] = []
+        self._wake = asyncio.Event()
+        self._full = asyncio.Event()
+        self._space = asyncio.Event()
+        self._space.set()
+        self._task: Optional[asyncio.Task] = None
+        self._closing = False
+        self._batched_rows = 0
+        self._counters = {"rows": 0, "flushed_rows": 0, "batches": 0, "retries": 0, "dropped_rows": 0, "waits_for_space": 0}
+
+    async def add(self, row: Dict):
+        """Enfileira a linha para o próximo lote"""
+        if self._closing:
+            raise RuntimeError("MessageWriteBuffer está fechado")
+        while len(self._rows) >= self.max_buffered:
+            self._counters["waits_for_space"] += 1
+            self._space.clear()
+            await self._space.wait()
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+        self._rows.append(row)
+        self._counters["rows"] += 1
+        self._wake.set()
+        if len(self._rows) >= self.max_batch:
+            self._full.set()
+
+    def pending(self, conversation_id: str) -> List[Dict]:
+        """Linhas da conversa que ainda não chegaram ao banco"""
+        return [row for row in self._rows if row["conversation_id"] == conversation_id]
+
+    async def close(self):
+        """Grava tudo o que está pendente e encerra o flusher"""
+        self._closing = True
+        self._wake.set()
+        self._full.set()
+        if self._task is not None:
+            await self._task
+            self._task = None
+
+    async def _run(self):
+        while True:
+            await self._wake.wait()
+            if len(self._rows) < self.max_batch and not self._closing:
+                try:
+                    await asyncio.wait_for(self._full.wait(), self.flush_interval)
+                except asyncio.TimeoutError:
+                    pass
+            # Grava lotes cheios em sequência; um lote parcial só depois do intervalo ou no fechamento
+            while self._rows:
+                batch = self._rows[:self.max_batch]
+                await self._write(batch)
+                # Só sai do buffer depois de gravado, para continuar visível em pending()
+                del self._rows[:len(batch)]
+                self._space.set()
+                if len(self._rows) < self.max_batch and not self._closing:
+                    break
+            if len(self._rows) < self.max_batch:
+                self._full.clear()
+            if not self._rows:
+                self._wake.clear()
+                if self._closing:
+                    return
+
+    async def _write(self, batch: List[Dict]):
+        for attempt in range(self.max_retries + 1):
+            try:
+                await self.insert_rows(batch)
+                self._counters["batches"] += 1
+                self._batched_rows += len(batch)
+                self._counters["flushed_rows"] += len(batch)
+                return
+            except Exception as e:
+                if attempt == self.max_retries:
+                    logger.error("Falha ao gravar lote de %d mensagens após %d tentativas: %s", len(batch), attempt + 1, e)
+                    break
+                self._counters["retries"] += 1
+                delay = self.retry_base_delay * 2 ** attempt
+                logger.warning("Erro ao gravar lote de %d mensagens, nova tentativa em %.1fs: %s", len(batch), delay, e)
+                await asyncio.sleep(delay)
+
+        # Último recurso: linha a linha, descartando só as que falharem (ex: conversa apagada)
+        for row in batch:
+            try:
+                await self.insert_rows([row])
+                self._counters["flushed_rows"] += 1
+            except Exception as e:
+                self._counters["dropped_rows"] += 1
+                logger.error("Mensagem %s descartada: %s", row.get("id"), e)
+
+    def stats(self) -> Dict:
+        batches = self._counters["batches"]
+        return {
+            "buffered": len(self._rows),
+            "max_buffered": self.max_buffered,
+            **self._counters,
+            "avg_batch_size": self._batched_rows / batches if batches else 0.0,
+        }
@@ -0,0 +1,132 @@
+import time
+from typing import Any, Awaitable, Dict, Tuple
+
+from prometheus_client import Counter, Gauge, Histogram, REGISTRY, CONTENT_TYPE_LATEST, generate_latest
+from prometheus_client.core import CounterMetricFamily
+
+# Buckets cobrem de chamadas locais (ms) até gerações longas do Ollama
+_LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0, 120.0)
+
+STAGE_SECONDS = Histogram(
+    "rag_stage_duration_seconds",
+    "Latência de cada etapa do processamento de mensagens",
+    ["stage"],
+    buckets=_LATENCY_BUCKETS,
+)
+OLLAMA_TTFT_SECONDS = Histogram(
+    "rag_ollama_ttft_seconds",
+    "Tempo até o primeiro token do Ollama (latência total menos a duração da geração)",
+    buckets=_LATENCY_BUCKETS,
+)
+WEBHOOKS_TOTAL = Counter("rag_webhooks_total", "Webhooks recebidos por resultado", ["result"])
+SHED_TOTAL = Counter("rag_webhooks_shed_total", "Webhooks descartados pelo controle de admissão", ["reason", "action"])
+CONVERSATION_CACHE_TOTAL = Counter(
+    "rag_conversation_cache_total",
+    "Consultas ao cache de conversas por resultado (hit e coalesced evitam o SELECT no Supabase)",
+    ["result"],
+)
+WTS_SEND_TOTAL = Counter(
+    "rag_wts_send_total",
+    "Envios ao WTS por resultado (sent, retry, rate_limited, failed, rejected)",
+    ["result"],
+)
+STAGE_ERRORS_TOTAL = Counter("rag_stage_errors_total", "Falhas por etapa do processamento", ["stage"])
+COMPONENT_STAT = Gauge(
+    "rag_component_stat",
+    "Estatísticas numéricas dos componentes (filas, caches, pools) no momento da coleta",
+    ["component", "stat", "item"],
+)
+
+# Chaves do stats() que só crescem (contadores acumulados desde o início do processo); saem em
+# rag_component_total para permitir rate(). Dentro de COUNTER_GROUPS todas as chaves são contadores.
+COUNTER_STATS = frozenset({
+    "hits", "misses", "coalesced", "created", "round_trips_saved", "appends", "loads", "evictions",
+    "scheduled", "completed", "failed", "deferred", "messages_folded", "admitted", "shed", "busy_replies",
+    "received", "duplicates", "submitted", "timeouts", "rejected", "cancelled", "sent", "retries",
+    "rate_limited", "expired", "probes", "failures", "rows", "flushed_rows", "batches", "dropped_rows",
+    "waits_for_space", "messages", "turns", "merged", "requests", "errors", "hedges_fired", "hedges_won",
+    "overflows", "dropped_records", "prompt_chars", "prompt_eval_count", "prompt_eval_duration_ns",
+    "eval_count", "eval_duration_ns",
+})
+COUNTER_GROUPS = frozenset({"decisions", "shed_reasons"})
+
+class _ComponentTotals:
+    """Collector dos contadores dos componentes: o valor vem pronto do stats(), então é exposto como
+    está (um Counter do prometheus_client só sabe incrementar)"""
+
+    def __init__(self):
+        self.values: Dict[Tuple[str, str, str], float] = {}
+
+    def collect(self):
+        family = CounterMetricFamily(
+            "rag_component",
+            "Contadores acumulados dos componentes (hits, misses, batches...) no momento da coleta",
+            labels=["component", "stat", "item"],
+        )
+        for labels, value in self.values.items():
+            family.add_metric(labels, value)
+        yield family
+
+_component_totals = _ComponentTotals()
+REGISTRY.register(_component_totals)
+
+# Filhos dos labels resolvidos uma vez: observe() no caminho quente fica em ~1µs
+_stage_children: Dict[str, Any] = {}
+
+def observe_stage(stage: str, seconds: float):
+    child = _stage_children.get(stage)
+    if child is None:
+        child = _stage_children[stage] = STAGE_SECONDS.labels(stage)
+    child.observe(seconds)
+
+class stage_timer:
+    """Context manager que registra a duração de uma etapa (e a falha, se houver)"""
+
+    __slots__ = ("stage", "started")
+
+    def __init__(self, stage: str):
+        self.stage = stage
+
+    def __enter__(self):
+        self.started = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        observe_stage(self.stage, time.perf_counter() - self.started)
+        if exc_type is not None and issubclass(exc_type, Exception):
+            STAGE_ERRORS_TOTAL.labels(self.stage).inc()
+        return False
+
+async def timed(stage: str, awaitable: Awaitable) -> Any:
+    """Aguarda `awaitable` registrando a duração na etapa `stage`"""
+    with stage_timer(stage):
+        return await awaitable
+
+def _item_label(entry: Dict, index: int) -> str:
+    return str(entry.get("url") or entry.get("name") or index)
+
+def publish_stats(component: str, stats: Dict, prefix: str = "", item: str = "", counters: bool = False):
+    """Expõe os valores numéricos de um dicionário stats(): contadores acumulados (COUNTER_STATS) em
+    rag_component_total, o resto como gauges. Listas de dicionários (ex: endpoints do pool) saem com
+    o label `item` (url, name ou posição na lista)."""
+    if not stats:
+        return
+    for key, value in stats.items():
+        name = f"{prefix}{key}"
+        if isinstance(value, bool):
+            COMPONENT_STAT.labels(component, name, item).set(int(value))
+        elif isinstance(value, (int, float)):
+            if counters or key in COUNTER_STATS:
+                _component_totals.values[(component, name, item)] = value
+            else:
+                COMPONENT_STAT.labels(component, name, item).set(value)
+        elif isinstance(value, dict):
+            publish_stats(component, value, f"{name}_", item, counters or key in COUNTER_GROUPS)
+        elif isinstance(value, list):
+            for index, entry in enumerate(value):
+                if isinstance(entry, dict):
+                    publish_stats(component, entry, f"{name}_", _item_label(entry, index), counters)
+
+def render() -> tuple:
+    """Corpo e content-type da resposta do /metrics"""
+    return generate_latest(), CONTENT_TYPE_LATEST
@@ -0,0 +1,169 @@
+import hashlib
+import json
+import logging
+import os
+import re
+import statistics
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+MIGRATIONS_DIR = os.path.normpath(os.path.join(os.path.dirname(__file__), "..", "..", "migrations"))
+
+# Chave do advisory lock que impede dois runners de aplicar migrações ao mesmo tempo
+_LOCK_KEY = 0x6D696772
+
+_FILENAME = re.compile(r"^(\d{4})_([\w-]+)\.sql$")
+
+# Consultas quentes do armazenamento; os argumentos vêm de `_SAMPLE_ARGS` para usar dados reais
+HOT_QUERIES = {
+    "conversation_by_phone": "SELECT id FROM conversations WHERE phone_number = $1 ORDER BY created_at DESC LIMIT 1",
+    "conversation_history": (
+        "SELECT id, direction, content, created_at FROM messages "
+        "WHERE conversation_id = $1 ORDER BY created_at DESC LIMIT 10"
+    ),
+}
+
+_SAMPLE_ARGS = {
+    "conversation_by_phone": "SELECT phone_number FROM conversations LIMIT 1",
+    "conversation_history": "SELECT conversation_id FROM messages LIMIT 1",
+}
+
+@dataclass
+class Migration:
+    version: str
+    name: str
+    sql: str
+
+    @property
+    def checksum(self) -> str:
+        return hashlib.sha256(self.sql.encode()).hexdigest()
+
+def load_migrations(directory: str = MIGRATIONS_DIR) -> List[Migration]:
+    """Migrações `NNNN_nome.sql` do diretório, em ordem de versão"""
+    migrations = []
+    for filename in sorted(os.listdir(directory)):
+        match = _FILENAME.match(filename)
+        if match is None:
+            continue
+        with open(os.path.join(directory, filename), encoding="utf-8") as f:
+            migrations.append(Migration(match.group(1), match.group(2), f.read()))
+    versions = [m.version for m in migrations]
+    if len(versions) != len(set(versions)):
+        raise ValueError(f"Versões de migração duplicadas em {directory}")
+    return migrations
+
+class MigrationRunner:
+    """Aplica as migrações versionadas de `migrations/` em uma conexão asyncpg.
+
+    As versões aplicadas ficam em `schema_migrations` com o checksum do arquivo;
+    cada migração roda em uma transação própria e um advisory lock impede que
+    dois processos migrem ao mesmo tempo.
+    """
+
+    def __init__(self, connection, directory: str = MIGRATIONS_DIR):
+        self.connection = connection
+        self.migrations = load_migrations(directory)
+
+    async def _ensure_table(self):
+        await self.connection.execute("""
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version TEXT PRIMARY KEY,
+                name TEXT NOT NULL,
+                checksum TEXT NOT NULL,
+                applied_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+
+    async def applied(self) -> Dict[str, Dict]:
+        await self._ensure_table()
+        rows = await self.connection.fetch("SELECT version, name, checksum, applied_at FROM schema_migrations")
+        return {row["version"]: dict(row) for row in rows}
+
+    async def status(self) -> List[Dict]:
+        applied = await self.applied()
+        result = []
+        for migration in self.migrations:
+            row = applied.get(migration.version)
+            result.append({
+                "version": migration.version,
+                "name": migration.name,
+                "applied_at": row["applied_at"].isoformat() if row else None,
+                "modified": bool(row) and row["checksum"] != migration.checksum,
+            })
+        return result
+
+    async def pending(self, target: Optional[str] = None) -> List[Migration]:
+        applied = await self.applied()
+        for migration in self.migrations:
+            row = applied.get(migration.version)
+            if row is not None and row["checksum"] != migration.checksum:
+                logger.warning("Migração %s_%s foi alterada depois de aplicada", migration.version, migration.name)
+        return [
+            m for m in self.migrations
+            if m.version not in applied and (target is None or m.version <= target)
+        ]
+
+    async def migrate(self, target: Optional[str] = None) -> List[Migration]:
+        """Aplica as migrações pendentes (até `target`, inclusive) e retorna as aplicadas"""
+        await self.connection.execute("SELECT pg_advisory_lock($1)", _LOCK_KEY)
+        try:
+            done = []
+            for migration in await self.pending(target):
+                async with self.connection.transaction():
+                    await self.connection.execute(migration.sql)
+                    await self.connection.execute(
+                        "INSERT INTO schema_migrations (version, name, checksum) VALUES ($1, $2, $3)",
+                        migration.version, migration.name, migration.checksum
+                    )
+                logger.info("Migração aplicada: %s_%s", migration.version, migration.name)
+                done.append(migration)
+            return done
+        finally:
+            await self.connection.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+
+async def explain_hot_queries(connection, runs: int = 5) -> Dict[str, Dict]:
+    """EXPLAIN ANALYZE das consultas quentes com argumentos tirados do próprio banco.
+
+    Retorna, por consulta, a mediana do tempo de execução e de planejamento
+    (ms) em `runs` execuções e os nós/índices do plano.
+    """
+    if await connection.fetchval("SELECT to_regclass('messages') IS NULL OR to_regclass('conversations') IS NULL"):
+        return {}
+    await connection.execute("ANALYZE conversations; ANALYZE messages")
+    report = {}
+    for name, query in HOT_QUERIES.items():
+        arg = await connection.fetchval(_SAMPLE_ARGS[name])
+        if arg is None:
+            report[name] = None
+            continue
+        execution, planning, plan = [], [], None
+        for _ in range(runs):
+            raw = await connection.fetchval(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {query}", arg)
+            result = (json.loads(raw) if isinstance(raw, str) else raw)[0]
+            execution.append(result["Execution Time"])
+            planning.append(result["Planning Time"])
+            plan = result["Plan"]
+        report[name] = {
+            "execution_ms": round(statistics.median(execution), 3),
+            "planning_ms": round(statistics.median(planning), 3),
+            "plan": _plan_summary(plan),
+            "shared_buffers": plan.get("Shared Read Blocks", 0) + plan.get("Shared Hit Blocks", 0),
+        }
+    return report
+
+def _plan_summary(plan: Dict) -> List[str]:
+    """Nós do plano em pré-ordem, com o índice usado quando houver (ex: "Index Scan idx_x")"""
+    nodes = []
+    stack = [plan]
+    while stack:
+        node = stack.pop()
+        label = node["Node Type"]
+        if node.get("Index Name"):
+            label += f" {node['Index Name']}"
+        elif node.get("Relation Name"):
+            label += f" {node['Relation Name']}"
+        nodes.append(label)
+        stack.extend(reversed(node.get("Plans", [])))
+    return nodes
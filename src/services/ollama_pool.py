@@ -0,0 +1,198 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from typing import Dict, List, Optional
+
+import httpx
+
+logger = logging.getLogger(__name__)
+
+class OllamaEndpoint:
+    """Estado de uma instância do Ollama no pool"""
+
+    def __init__(self, url: str):
+        self.url = url.rstrip("/")
+        self.outstanding = 0
+        self.consecutive_failures = 0
+        self.unhealthy_until = 0.0
+        self.latency_ewma = 0.0
+        self.requests = 0
+        self.errors = 0
+
+    def is_healthy(self, now: float) -> bool:
+        return now >= self.unhealthy_until
+
+    def stats(self, now: float) -> Dict:
+        return {
+            "url": self.url,
+            "healthy": self.is_healthy(now),
+            "outstanding": self.outstanding,
+            "requests": self.requests,
+            "errors": self.errors,
+            "latency_ewma_ms": round(self.latency_ewma * 1000, 1),
+        }
+
+class OllamaPool:
+    """Distribui as requisições entre várias instâncias do Ollama.
+
+    - Escolhe a instância saudável com menos requisições em andamento
+    - Saúde passiva: após `failure_threshold` falhas seguidas a instância fica
+      fora do pool por `cooldown` segundos
+    - Afinidade por conversa: mantém a conversa na mesma instância (reuso do
+      cache KV) enquanto ela não estiver mais carregada que as outras
+    - Hedging opcional: se a resposta não chegar em `hedge_delay` segundos,
+      dispara a mesma requisição em outra instância e usa a primeira resposta
+    """
+
+    def __init__(self, urls: List[str], failure_threshold: int = 3, cooldown: float = 30.0,
+                 hedge_delay: float = 0.0, affinity: bool = True, affinity_slack: int = 1,
+                 max_affinity_entries: int = 10000, timeout: float = 60.0):
+        if not urls:
+            raise ValueError("É necessário informar pelo menos uma URL do Ollama")
+        self.endpoints = [OllamaEndpoint(url) for url in urls]
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self.hedge_delay = hedge_delay
+        self.affinity = affinity
+        self.affinity_slack = affinity_slack
+        self.max_affinity_entries = max_affinity_entries
+        self.timeout = timeout
+        self._affinity: "OrderedDict[str, OllamaEndpoint]" = OrderedDict()
+        self._client: Optional[httpx.AsyncClient] = None
+        self._hedges = {"fired": 0, "won": 0}
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=self.timeout)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
+
+    def pick(self, conversation_id: str = None, exclude: tuple = ()) -> OllamaEndpoint:
+        """Seleciona a instância para a próxima requisição"""
+        now = time.monotonic()
+        candidates = [e for e in self.endpoints if e not in exclude]
+        if not candidates:
+            candidates = list(self.endpoints)
+        healthy = [e for e in candidates if e.is_healthy(now)]
+        if not healthy:
+            # Todas fora do ar: tenta a que volta primeiro em vez de falhar direto
+            return min(candidates, key=lambda e: e.unhealthy_until)
+
+        least_loaded = min(healthy, key=lambda e: (e.outstanding, e.latency_ewma))
+
+        if self.affinity and conversation_id:
+            preferred = self._affinity.get(conversation_id)
+            if (preferred in healthy
+                    and preferred.outstanding <= least_loaded.outstanding + self.affinity_slack):
+                self._affinity.move_to_end(conversation_id)
+                return preferred
+            self._affinity[conversation_id] = least_loaded
+            self._affinity.move_to_end(conversation_id)
+            if len(self._affinity) > self.max_affinity_entries:
+                self._affinity.popitem(last=False)
+
+        return least_loaded
+
+    async def post(self, path: str, json: Dict, conversation_id: str = None) -> httpx.Response:
+        """POST na instância escolhida, com hedging opcional"""
+        primary = self.pick(conversation_id)
+        if not self.hedge_delay or len(self.endpoints) < 2:
+            return await self._send(primary, path, json)
+
+        first = asyncio.create_task(self._send(primary, path, json))
+        try:
+            done, _ = await asyncio.wait({first}, timeout=self.hedge_delay)
+            if done:
+                return first.result()
+
+            secondary = self.pick(exclude=(primary,))
+            if secondary is primary:
+                return await first
+        except BaseException:
+            # Quem chamou foi cancelado (turno substituído, timeout): a geração não continua sozinha
+            first.cancel()
+            await asyncio.gather(first, return_exceptions=True)
+            raise
+        self._hedges["fired"] += 1
+        logger.info("Hedging: %s lento, disparando também em %s", primary.url, secondary.url)
+        second = asyncio.create_task(self._send(secondary, path, json))
+        pending = {first, second}
+        error = None
+        try:
+            while pending:
+                done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+                for task in done:
+                    if task.exception() is None:
+                        if task is second:
+                            self._hedges["won"] += 1
+                        return task.result()
+                    error = task.exception()
+            raise error
+        finally:
+            for task in pending:
+                task.cancel()
+            # Espera os cancelados liberarem `outstanding` antes de devolver a resposta
+            await asyncio.gather(*pending, return_exceptions=True)
+
+    async def _send(self, endpoint: OllamaEndpoint, path: str, json: Dict) -> httpx.Response:
+        endpoint.outstanding += 1
+        endpoint.requests += 1
+        started = time.monotonic()
+        try:
+            response = await self.client.post(f"{endpoint.url}{path}", json=json)
+            if response.status_code >= 500:
+                response.raise_for_status()
+        except asyncio.CancelledError:
+            raise
+        except Exception:
+            self._mark_failure(endpoint)
+            raise
+        finally:
+            endpoint.outstanding -= 1
+        self._mark_success(endpoint, time.monotonic() - started)
+        return response
+
+    def _mark_success(self, endpoint: OllamaEndpoint, elapsed: float):
+        endpoint.consecutive_failures = 0
+        endpoint.unhealthy_until = 0.0
+        endpoint.latency_ewma = elapsed if endpoint.latency_ewma == 0 else 0.8 * endpoint.latency_ewma + 0.2 * elapsed
+
+    def _mark_failure(self, endpoint: OllamaEndpoint):
+        endpoint.errors += 1
+        endpoint.consecutive_failures += 1
+        if endpoint.consecutive_failures >= self.failure_threshold:
+            endpoint.unhealthy_until = time.monotonic() + self.cooldown
+            logger.warning("Ollama %s marcado como indisponível por %ss", endpoint.url, self.cooldown)
+
+    async def check_endpoints(self, log_errors: bool = True) -> Dict[str, bool]:
+        """Consulta /api/tags em todas as instâncias"""
+        async def check(endpoint: OllamaEndpoint) -> bool:
+            try:
+                response = await self.client.get(f"{endpoint.url}/api/tags", timeout=10.0)
+                response.raise_for_status()
+                self._mark_success(endpoint, endpoint.latency_ewma)
+                return True
+            except Exception as e:
+                if log_errors:
+                    logger.error("❌ Ollama não está respondendo em %s: %s", endpoint.url, e)
+                self._mark_failure(endpoint)
+                return False
+
+        results = await asyncio.gather(*(check(e) for e in self.endpoints))
+        return {e.url: ok for e, ok in zip(self.endpoints, results)}
+
+    def stats(self) -> Dict:
+        now = time.monotonic()
+        return {
+            "endpoints": [e.stats(now) for e in self.endpoints],
+            "hedge_delay": self.hedge_delay,
+            "hedges_fired": self._hedges["fired"],
+            "hedges_won": self._hedges["won"],
+            "affinity_entries": len(self._affinity),
+        }
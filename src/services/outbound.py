@@ -0,0 +1,255 @@
+import asyncio
+import json
+import logging
+import random
+import time
+from collections import deque
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+from typing import Awaitable, Callable, Deque, Dict, List, Optional
+
+import httpx
+
+from services.metrics import WTS_SEND_TOTAL
+
+logger = logging.getLogger(__name__)
+
+# Respostas que valem nova tentativa; os demais 4xx são definitivos
+RETRYABLE_STATUS = (408, 429, 500, 502, 503, 504)
+
+class TokenBucket:
+    """Limite de `rate` envios/s com rajadas de até `burst`; quem espera é atendido em ordem"""
+
+    def __init__(self, rate: float, burst: int):
+        self.rate = rate
+        self.burst = max(1, burst)
+        self.tokens = float(self.burst)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    async def acquire(self, max_wait: Optional[float] = None) -> Optional[float]:
+        """Espera um token e retorna quanto tempo esperou; None, sem consumir o token, se a espera passaria de `max_wait`"""
+        started = time.monotonic()
+        self.tokens = min(self.burst, self.tokens + (started - self.updated) * self.rate)
+        self.updated = started
+        # Reserva o token já (o saldo pode ficar negativo): a fila fica na ordem de chegada sem
+        # segurar um lock durante a espera
+        ready = max(self.paused_until, started + max(0.0, (1 - self.tokens) / self.rate))
+        if max_wait is not None and ready - started > max_wait:
+            return None
+        self.tokens -= 1
+        try:
+            while True:
+                # Uma pausa (429) depois da reserva também vale para quem já estava esperando
+                wait = max(ready, self.paused_until) - time.monotonic()
+                if wait <= 0:
+                    return time.monotonic() - started
+                await asyncio.sleep(wait)
+        except asyncio.CancelledError:
+            self.tokens += 1
+            raise
+
+    def pause(self, seconds: float):
+        """Segura o canal por `seconds` (ex: Retry-After de um 429)"""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+class DeadLetterStore:
+    """Envios que falharam de vez, para inspeção ou reenvio manual.
+
+    Com `redis_client` as entradas ficam em uma lista do Redis (compartilhada
+    entre processos e mantida após reinícios); sem ele, em memória. Nos dois
+    casos só as `max_entries` mais recentes são mantidas.
+    """
+
+    def __init__(self, max_entries: int = 1000, redis_client=None, key: str = "rag:wts:dead"):
+        self.max_entries = max_entries
+        self.redis = redis_client
+        self.key = key
+        self._entries: Deque[Dict] = deque(maxlen=max_entries)
+
+    async def add(self, entry: Dict):
+        if self.redis:
+            await self.redis.rpush(self.key, json.dumps(entry, ensure_ascii=False))
+            await self.redis.ltrim(self.key, -self.max_entries, -1)
+        else:
+            self._entries.append(entry)
+
+    async def recent(self, limit: int = 50) -> List[Dict]:
+        """Entradas mais recentes primeiro"""
+        if self.redis:
+            return [json.loads(raw) for raw in reversed(await self.redis.lrange(self.key, -limit, -1))]
+        return list(reversed(self._entries))[:limit]
+
+    async def count(self) -> int:
+        return await self.redis.llen(self.key) if self.redis else len(self._entries)
+
+def retry_after_seconds(response: Optional[httpx.Response]) -> Optional[float]:
+    """Valor do header Retry-After (segundos ou data HTTP), se houver"""
+    value = response.headers.get("retry-after") if response is not None else None
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, (parsedate_to_datetime(value) - datetime.now(timezone.utc)).total_seconds())
+    except (TypeError, ValueError):
+        return None
+
+class OutboundDispatcher:
+    """Envio de mensagens ao WTS com limite por canal, retentativas e dead-letter.
+
+    Cada canal (número de origem) tem um TokenBucket de `rate` envios/s; no
+    máximo `max_concurrency` requisições ficam em voo ao mesmo tempo. Respostas
+    429/5xx e erros de rede são repetidos com backoff exponencial com jitter
+    (ou o Retry-After, que também pausa o canal), até `max_attempts`. O que
+    falha de vez, ou não cabe em `max_pending`, vai para a DeadLetterStore.
+    `rate=0` desativa o limite por canal.
+
+    O envio bloqueia quem chama (a BackgroundTask do webhook ou o slot do
+    worker) durante as esperas do limite e das retentativas; `max_send_time`
+    limita esse tempo: a tentativa que não cabe mais nele vai para a
+    dead-letter. Uma requisição já em voo termina (timeout do cliente HTTP),
+    então o pior caso é `max_send_time` mais um timeout.
+    """
+
+    def __init__(self, post: Callable[[Dict], Awaitable[httpx.Response]], rate: float = 5.0, burst: int = 10,
+                 max_concurrency: int = 8, max_attempts: int = 4, retry_base_delay: float = 1.0,
+                 max_retry_delay: float = 30.0, max_pending: int = 1000, max_send_time: float = 60.0,
+                 dead_letters: DeadLetterStore = None):
+        self.post = post
+        self.rate = rate
+        self.burst = burst
+        self.max_attempts = max(1, max_attempts)
+        self.retry_base_delay = retry_base_delay
+        self.max_retry_delay = max_retry_delay
+        self.max_pending = max_pending
+        self.max_send_time = max_send_time
+        self.dead_letters = dead_letters or DeadLetterStore()
+        self._semaphore = asyncio.Semaphore(max(1, max_concurrency))
+        self._buckets: Dict[str, TokenBucket] = {}
+        self._pending = 0
+        self._in_flight = 0
+        self._latencies: Deque[float] = deque(maxlen=1000)
+        self._counters = {"sent": 0, "retries": 0, "rate_limited": 0, "failed": 0, "rejected": 0, "expired": 0,
+                          "rate_wait_seconds": 0.0}
+
+    def _bucket(self, channel: str) -> Optional[TokenBucket]:
+        if self.rate <= 0:
+            return None
+        bucket = self._buckets.get(channel)
+        if bucket is None:
+            bucket = self._buckets[channel] = TokenBucket(self.rate, self.burst)
+        return bucket
+
+    async def send(self, channel: str, payload: Dict) -> bool:
+        """Envia `payload` pelo canal; retorna False se foi para a dead-letter"""
+        if self.max_pending and self._pending >= self.max_pending:
+            self._counters["rejected"] += 1
+            WTS_SEND_TOTAL.labels("rejected").inc()
+            await self._dead_letter(channel, payload, 0, None, "fila de envio cheia")
+            return False
+
+        self._pending += 1
+        started = time.monotonic()
+        bucket = self._bucket(channel)
+        deadline = started + self.max_send_time if self.max_send_time > 0 else None
+        status, error = None, None
+        try:
+            for attempt in range(1, self.max_attempts + 1):
+                if bucket is not None:
+                    waited = await bucket.acquire(deadline - time.monotonic() if deadline else None)
+                    if waited is None:
+                        attempt -= 1
+                        error = self._expired(error)
+                        break
+                    self._counters["rate_wait_seconds"] += waited
+                response, error = None, None
+                async with self._semaphore:
+                    self._in_flight += 1
+                    try:
+                        response = await self.post(payload)
+                    except httpx.HTTPError as e:
+                        error = f"{type(e).__name__}: {e}"
+                    finally:
+                        self._in_flight -= 1
+
+                if response is not None and response.status_code == 200:
+                    self._counters["sent"] += 1
+                    self._latencies.append(time.monotonic() - started)
+                    WTS_SEND_TOTAL.labels("sent").inc()
+                    return True
+
+                status = response.status_code if response is not None else None
+                if status is not None:
+                    error = f"HTTP {status}: {response.text[:200]}"
+                if status == 429:
+                    self._counters["rate_limited"] += 1
+                    WTS_SEND_TOTAL.labels("rate_limited").inc()
+                if (status is not None and status not in RETRYABLE_STATUS) or attempt == self.max_attempts:
+                    break
+
+                delay = retry_after_seconds(response)
+                if delay is None:
+                    delay = self.retry_base_delay * (2 ** (attempt - 1)) * random.uniform(0.8, 1.2)
+                delay = min(delay, self.max_retry_delay)
+                if deadline and time.monotonic() + delay > deadline:
+                    error = self._expired(error)
+                    break
+                if status == 429 and bucket is not None:
+                    # O limite é do canal: os outros envios dele também esperam
+                    bucket.pause(delay)
+                self._counters["retries"] += 1
+                WTS_SEND_TOTAL.labels("retry").inc()
+                logger.warning("WTS: envio pelo canal %s falhou (%s); tentativa %d em %.1fs", channel, error, attempt + 1, delay)
+                await asyncio.sleep(delay)
+
+            self._counters["failed"] += 1
+            WTS_SEND_TOTAL.labels("failed").inc()
+            await self._dead_letter(channel, payload, attempt, status, error)
+            return False
+        finally:
+            self._pending -= 1
+
+    def _expired(self, error: Optional[str]) -> str:
+        self._counters["expired"] += 1
+        reason = f"tempo de envio esgotado ({self.max_send_time:g}s)"
+        return f"{reason}; último erro: {error}" if error else reason
+
+    async def _dead_letter(self, channel: str, payload: Dict, attempts: int, status: Optional[int], error: Optional[str]):
+        logger.error("💀 WTS: envio para %s movido para a dead-letter após %d tentativa(s): %s",
+                     payload.get("to"), attempts, error)
+        entry = {
+            "channel": channel,
+            "payload": payload,
+            "attempts": attempts,
+            "status": status,
+            "error": error,
+            "failed_at": datetime.now(timezone.utc).isoformat(),
+        }
+        try:
+            await self.dead_letters.add(entry)
+        except Exception as e:
+            logger.error("Erro ao gravar dead-letter do WTS: %s", e)
+
+    async def stats(self) -> Dict:
+        latencies = sorted(self._latencies)
+
+        def percentile(p: float) -> float:
+            if not latencies:
+                return 0.0
+            return latencies[min(len(latencies) - 1, int(p * len(latencies)))]
+
+        try:
+            dead_letters = await self.dead_letters.count()
+        except Exception:
+            dead_letters = None
+        return {
+            **self._counters,
+            "pending": self._pending,
+            "in_flight": self._in_flight,
+            "channels": len(self._buckets),
+            "dead_letters": dead_letters,
+            "send_seconds": {"p50": percentile(0.50), "p95": percentile(0.95), "max": latencies[-1] if latencies else 0.0},
+        }
@@ -0,0 +1,140 @@
+import asyncio
+import gzip
+import logging
+import os
+import re
+from datetime import date, datetime, timezone
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+RETENTION_MODES = ("archive", "detach", "drop")
+
+_PARTITION_NAME = re.compile(r"^messages_(\d{4})_(\d{2})$")
+
+# Chave do advisory lock que impede duas manutenções ao mesmo tempo (ex: vários servidores)
+_LOCK_KEY = 0x70617274
+
+def _month_start(value: date) -> date:
+    return value.replace(day=1)
+
+def _add_months(value: date, months: int) -> date:
+    month = value.month - 1 + months
+    return date(value.year + month // 12, month % 12 + 1, 1)
+
+class PartitionMaintainer:
+    """Manutenção das partições mensais de `messages` (migrations/0003).
+
+    A cada execução cria as partições dos próximos `months_ahead` meses e tira
+    de `messages` as partições com mais de `retention_months` meses completos:
+
+        archive: cópia em CSV gzip para `archive_dir`, DETACH e DROP
+        detach: só DETACH (a tabela fica no banco, fora das consultas)
+        drop: DETACH e DROP, sem cópia
+
+    Tabelas `messages_AAAA_MM` já desanexadas (modo detach, execução
+    interrompida) também são arquivadas/apagadas nos modos archive e drop.
+    `retention_months=0` mantém tudo. Usa uma conexão asyncpg por execução.
+    """
+
+    def __init__(self, dsn: str, retention_months: int = 0, mode: str = "archive", archive_dir: str = "archive",
+                 months_ahead: int = 2):
+        if mode not in RETENTION_MODES:
+            raise ValueError(f"Modo de retenção desconhecido: {mode}. Disponíveis: {list(RETENTION_MODES)}")
+        self.dsn = dsn
+        self.retention_months = retention_months
+        self.mode = mode
+        self.archive_dir = archive_dir
+        self.months_ahead = months_ahead
+
+    async def run_once(self, today: Optional[date] = None) -> Dict:
+        """Executa uma rodada de manutenção e retorna o que foi feito"""
+        import asyncpg
+
+        today = today or datetime.now(timezone.utc).date()
+        connection = await asyncpg.connect(self.dsn)
+        try:
+            if not await connection.fetchval("SELECT pg_try_advisory_lock($1)", _LOCK_KEY):
+                logger.info("Manutenção de partições já em andamento em outro processo")
+                return {"skipped": True}
+            try:
+                created = await connection.fetchval(
+                    "SELECT ensure_message_partitions($1, $2)", _month_start(today), self.months_ahead
+                )
+                removed = []
+                if self.retention_months > 0:
+                    cutoff = _add_months(_month_start(today), -self.retention_months)
+                    for name, month, attached in await self._partitions(connection):
+                        if month < cutoff and (attached or self.mode != "detach"):
+                            removed.append(await self._retire(connection, name, attached))
+                default_rows = await connection.fetchval("SELECT count(*) FROM messages_default")
+                if default_rows:
+                    logger.warning("messages_default tem %d linha(s) fora das partições mensais", default_rows)
+                return {"created": created, "removed": removed, "default_rows": default_rows}
+            finally:
+                await connection.execute("SELECT pg_advisory_unlock($1)", _LOCK_KEY)
+        finally:
+            await connection.close()
+
+    async def run_forever(self, interval: float, stop: asyncio.Event):
+        """Repete a manutenção a cada `interval` segundos até `stop`"""
+        while not stop.is_set():
+            try:
+                result = await self.run_once()
+                logger.info("Manutenção de partições: %s", result)
+            except Exception as e:
+                logger.exception("Erro na manutenção de partições: %s", e)
+            try:
+                await asyncio.wait_for(stop.wait(), interval)
+            except asyncio.TimeoutError:
+                pass
+
+    @staticmethod
+    async def _partitions(connection) -> List[tuple]:
+        """(nome, mês, anexada) das tabelas mensais, inclusive as já desanexadas de messages"""
+        rows = await connection.fetch("""
+            SELECT c.relname,
+                   EXISTS (SELECT 1 FROM pg_inherits i
+                           WHERE i.inhrelid = c.oid AND i.inhparent = 'messages'::regclass) AS attached
+            FROM pg_class c
+            WHERE c.relkind = 'r'
+              AND c.relnamespace = (SELECT relnamespace FROM pg_class WHERE oid = 'messages'::regclass)
+        """)
+        partitions = []
+        for row in rows:
+            match = _PARTITION_NAME.match(row["relname"])
+            if match:
+                month = date(int(match.group(1)), int(match.group(2)), 1)
+                partitions.append((row["relname"], month, row["attached"]))
+        return sorted(partitions, key=lambda item: item[1])
+
+    async def _retire(self, connection, name: str, attached: bool = True) -> Dict:
+        # Nome vem de pg_class e casou com _PARTITION_NAME: seguro para entrar no SQL
+        result = {"partition": name, "mode": self.mode}
+        # Uma transação só: se a cópia ou o DROP falhar, a partição continua anexada e com os dados
+        async with connection.transaction():
+            if self.mode == "archive":
+                # Bloqueia escritas na partição até o fim, para o arquivo ter tudo o que for apagado
+                await connection.execute(f"LOCK TABLE {name} IN SHARE MODE")
+                path, rows = await self._archive(connection, name)
+                result.update({"file": path, "rows": rows})
+            if attached:
+                await connection.execute(f"ALTER TABLE messages DETACH PARTITION {name}")
+            if self.mode in ("archive", "drop"):
+                await connection.execute(f"DROP TABLE {name}")
+        logger.info("Partição %s retirada (%s)", name, self.mode)
+        return result
+
+    async def _archive(self, connection, name: str) -> tuple:
+        """Copia a partição para `archive_dir/<nome>.csv.gz`"""
+        os.makedirs(self.archive_dir, exist_ok=True)
+        path = os.path.join(self.archive_dir, f"{name}.csv.gz")
+        partial = path + ".partial"
+        with gzip.open(partial, "wb") as f:
+            async def write(chunk: bytes):
+                f.write(chunk)
+            await connection.copy_from_table(name, output=write, format="csv", header=True)
+        rows = await connection.fetchval(f"SELECT count(*) FROM {name}")
+        # Só troca de nome (e depois apaga a tabela) com o arquivo completo
+        os.replace(partial, path)
+        return path, rows
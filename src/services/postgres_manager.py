@@ -0,0 +1,231 @@
+import json
+import uuid
+import logging
+from datetime import datetime
+from typing import List, Dict, Optional, Tuple
+from services.storage import MessageStore
+from services.conversation_cache import ConversationCache
+from services.history_cache import HistoryCache, HISTORY_COLUMNS
+from services.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+_MESSAGE_COLUMNS = (
+    "id", "conversation_id", "platform", "sender", "receiver", "message_type",
+    "external_message_id", "content", "metadata", "direction", "created_at",
+)
+
+# Colunas de conversations que update_conversation pode alterar (nomes entram no SQL)
+_CONVERSATION_UPDATABLE = (
+    "phone_number", "user_name", "status", "last_message_at", "summary", "summary_through", "summary_updated_at",
+)
+# Colunas TIMESTAMPTZ: aceitam ISO 8601 como no Supabase
+_CONVERSATION_TIMESTAMPS = ("last_message_at", "summary_through", "summary_updated_at")
+
+_FIND_CONVERSATION = """
+    SELECT id FROM conversations WHERE phone_number = $1 ORDER BY created_at DESC LIMIT 1
+"""
+
+# Índice único em phone_number (migrations/0005): com corrida entre processos, só um insert vale e
+# o outro não retorna linha; quem perdeu lê a conversa de novo
+_INSERT_CONVERSATION = """
+    INSERT INTO conversations (id, phone_number, user_name, status, created_at, updated_at)
+    VALUES ($1, $2, $3, 'active', now(), now())
+    ON CONFLICT (phone_number) DO NOTHING
+    RETURNING id
+"""
+
+_FETCH_SUMMARY = "SELECT summary, summary_through FROM conversations WHERE id = $1"
+
+_INSERT_MESSAGE = f"""
+    INSERT INTO messages ({", ".join(_MESSAGE_COLUMNS)})
+    VALUES ({", ".join(f"${i}" for i in range(1, len(_MESSAGE_COLUMNS) + 1))})
+"""
+
+# Busca (ou cria) a conversa e grava a mensagem em uma única ida ao banco. Se outro processo cria a
+# conversa ao mesmo tempo, o ON CONFLICT não insere nada e a consulta não retorna linha (nem grava a
+# mensagem): basta repetir, o novo snapshot já enxerga a conversa
+_SAVE_INCOMING = """
+    WITH existing AS (
+        SELECT id FROM conversations WHERE phone_number = $1 ORDER BY created_at DESC LIMIT 1
+    ), created AS (
+        INSERT INTO conversations (id, phone_number, user_name, status, created_at, updated_at)
+        SELECT $2, $1, $3, 'active', now(), now()
+        WHERE NOT EXISTS (SELECT 1 FROM existing)
+        ON CONFLICT (phone_number) DO NOTHING
+        RETURNING id
+    ), conversation AS (
+        SELECT id FROM existing UNION ALL SELECT id FROM created
+    )
+    INSERT INTO messages (id, conversation_id, platform, sender, receiver, message_type,
+                          external_message_id, content, metadata, direction, created_at)
+    SELECT $4, conversation.id, $5, $6, $7, $8, $9, $10, $11, $12, $13 FROM conversation
+    RETURNING conversation_id, EXISTS (SELECT 1 FROM created) AS created
+"""
+
+_FETCH_HISTORY = f"""
+    SELECT {", ".join(HISTORY_COLUMNS)} FROM messages
+    WHERE conversation_id = $1 ORDER BY created_at DESC LIMIT $2
+"""
+
+# Com o filtro em created_at o Postgres descarta as partições mais antigas que `since` (pruning)
+_FETCH_HISTORY_SINCE = f"""
+    SELECT {", ".join(HISTORY_COLUMNS)} FROM messages
+    WHERE conversation_id = $1 AND created_at >= $3 ORDER BY created_at DESC LIMIT $2
+"""
+
+class PostgresManager(MessageStore):
+    """Acesso direto ao Postgres do Supabase por um pool do asyncpg, sem passar pelo PostgREST.
+
+    As consultas usam o cache de prepared statements de cada conexão do pool
+    (`statement_cache_size`); atrás do pooler do Supabase em modo transação
+    (porta 6543) use `statement_cache_size=0`.
+    """
+
+    name = "Postgres"
+
+    def __init__(self, dsn: str, min_size: int = 2, max_size: int = 10, statement_cache_size: int = 100,
+                 conversation_cache: Optional[ConversationCache] = None, write_buffer_options: Optional[Dict] = None,
+                 history_cache: Optional[HistoryCache] = None, history_lookback_days: float = 0):
+        super().__init__(conversation_cache, write_buffer_options, history_cache, history_lookback_days)
+        self.dsn = dsn
+        self.min_size = min_size
+        self.max_size = max_size
+        self.statement_cache_size = statement_cache_size
+        self._pool = None
+
+    async def initialize(self):
+        """Cria o pool de conexões"""
+        if self._pool is not None:
+            return True
+
+        try:
+            import asyncpg
+
+            self._pool = await asyncpg.create_pool(
+                self.dsn,
+                min_size=self.min_size,
+                max_size=self.max_size,
+                statement_cache_size=self.statement_cache_size,
+                init=self._init_connection
+            )
+            await self._pool.fetchval("SELECT 1 FROM conversations LIMIT 1")
+            logger.info("Pool de conexões com o Postgres criado com sucesso")
+            return True
+        except Exception as e:
+            logger.error("Erro ao conectar com o Postgres: %s", e)
+            if self._pool is not None:
+                await self._pool.close()
+                self._pool = None
+            raise ConnectionError(f"Não foi possível conectar ao Postgres: {e}")
+
+    @staticmethod
+    async def _init_connection(connection):
+        await connection.set_type_codec("jsonb", encoder=json.dumps, decoder=json.loads, schema="pg_catalog")
+
+    async def health_check(self) -> bool:
+        """Verifica se o pool consegue executar uma consulta"""
+        try:
+            if self._pool is None:
+                return False
+            await self._pool.fetchval("SELECT 1")
+            return True
+        except Exception as e:
+            logger.error("Health check falhou: %s", e)
+            return False
+
+    async def _close(self):
+        if self._pool is not None:
+            await self._pool.close()
+            self._pool = None
+
+    @property
+    def pool(self):
+        if self._pool is None:
+            raise ConnectionError("Postgres não foi inicializado. Chame initialize() primeiro.")
+        return self._pool
+
+    @staticmethod
+    def _message_args(row: Dict) -> tuple:
+        return tuple(
+            datetime.fromisoformat(row[column]) if column == "created_at" else row[column]
+            for column in _MESSAGE_COLUMNS
+        )
+
+    async def _find_or_insert_conversation(self, phone_number: str, user_name: str = None) -> Tuple[str, bool]:
+        async with self.pool.acquire() as connection:
+            conversation_id = await connection.fetchval(_FIND_CONVERSATION, phone_number)
+            if conversation_id is not None:
+                logger.debug("Conversa existente encontrada: %s", conversation_id)
+                return str(conversation_id), False
+            conversation_id = await connection.fetchval(_INSERT_CONVERSATION, str(uuid.uuid4()), phone_number, user_name)
+            if conversation_id is None:
+                conversation_id = await connection.fetchval(_FIND_CONVERSATION, phone_number)
+                logger.info("Conversa criada por outro processo: %s", conversation_id)
+                return str(conversation_id), False
+        logger.info("Nova conversa criada: %s", conversation_id)
+        return str(conversation_id), True
+
+    async def _save_incoming(self, phone_number: str, user_name: Optional[str], row: Dict) -> Tuple[str, bool]:
+        args = self._message_args(row)
+        # args[1] (conversation_id) é decidido pela própria consulta
+        record = None
+        # Busca, criação e insert em uma consulta: não dá para separar conversation_lookup e supabase_insert
+        with stage_timer("save_incoming"):
+            for _ in range(2):
+                record = await self.pool.fetchrow(_SAVE_INCOMING, phone_number, str(uuid.uuid4()), user_name, args[0], *args[2:])
+                if record is not None:
+                    break
+        if record is None:
+            raise RuntimeError(f"Conversa de {phone_number} não encontrada após conflito na criação")
+        row["conversation_id"] = str(record["conversation_id"])
+        return row["conversation_id"], record["created"]
+
+    async def _insert_message(self, row: Dict) -> str:
+        await self.pool.execute(_INSERT_MESSAGE, *self._message_args(row))
+        return row["id"]
+
+    async def _insert_messages(self, rows: List[Dict]):
+        await self.pool.executemany(_INSERT_MESSAGE, [self._message_args(row) for row in rows])
+
+    async def _fetch_history(self, conversation_id: str, limit: int, since: Optional[datetime] = None) -> List[Dict]:
+        if since is None:
+            records = await self.pool.fetch(_FETCH_HISTORY, conversation_id, limit)
+        else:
+            records = await self.pool.fetch(_FETCH_HISTORY_SINCE, conversation_id, limit, since)
+        return [
+            {
+                "id": str(record["id"]),
+                "direction": record["direction"],
+                "content": record["content"],
+                "created_at": record["created_at"].isoformat(),
+            }
+            for record in reversed(records)
+        ]
+
+    async def get_conversation_summary(self, conversation_id: str) -> Optional[Dict]:
+        record = await self.pool.fetchrow(_FETCH_SUMMARY, conversation_id)
+        if record is None:
+            return None
+        through = record["summary_through"]
+        return {"summary": record["summary"], "summary_through": through.isoformat() if through else None}
+
+    async def update_conversation(self, conversation_id: str, updates: dict):
+        try:
+            columns = [column for column in updates if column != "updated_at"]
+            unknown = set(columns) - set(_CONVERSATION_UPDATABLE)
+            if unknown:
+                raise ValueError(f"Colunas desconhecidas: {sorted(unknown)}")
+            assignments = "".join(f"{column} = ${i}, " for i, column in enumerate(columns, start=2))
+            records = await self.pool.fetch(
+                f"UPDATE conversations SET {assignments}updated_at = now() WHERE id = $1 RETURNING *",
+                conversation_id, *(
+                    datetime.fromisoformat(updates[column])
+                    if column in _CONVERSATION_TIMESTAMPS and isinstance(updates[column], str) else updates[column]
+                    for column in columns
+                )
+            )
+            return [dict(record) for record in records]
+        except Exception as e:
+            logger.error("Erro ao atualizar conversa: %s", e)
+            return None
@@ -0,0 +1,259 @@
+import asyncio
+import gc
+import linecache
+import logging
+import os
+import signal
+import sys
+import threading
+import time
+import tracemalloc
+import types
+from collections import Counter
+from typing import Any, Awaitable, Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+# Folhas de pilha que indicam thread parada esperando (loop sem eventos, pool de threads ociosa)
+_IDLE_LEAVES = {("selectors.py", "select"), ("threading.py", "wait"), ("queue.py", "get"), ("thread.py", "_worker")}
+
+class ProfilerBusyError(Exception):
+    """Já existe uma sessão de profiling em andamento"""
+
+class _CpuSession:
+    __slots__ = ("requests", "interval", "include_idle", "started", "finished", "samples",
+                 "started_at", "ended_at", "done", "_stop", "_thread", "_previous_handler")
+
+    def __init__(self, requests: int, interval: float, include_idle: bool):
+        self.requests = requests
+        self.interval = interval
+        self.include_idle = include_idle
+        self.started = 0
+        self.finished = 0
+        self.samples: Counter = Counter()
+        self.started_at = None
+        self.ended_at = None
+        self.done = asyncio.Event()
+        self._stop = threading.Event()
+        self._thread = None
+        self._previous_handler = None
+
+    def start_sampling(self):
+        self.started_at = time.monotonic()
+        if hasattr(signal, "setitimer") and threading.current_thread() is threading.main_thread():
+            # SIGPROF conta tempo de CPU e é tratado na thread do loop entre bytecodes: amostras
+            # não ficam enviesadas para os momentos em que o loop solta o GIL
+            self._previous_handler = signal.signal(signal.SIGPROF, self._on_signal)
+            signal.setitimer(signal.ITIMER_PROF, self.interval, self.interval)
+        else:
+            self._thread = threading.Thread(target=self._sample_loop, name="profiler-sampler", daemon=True)
+            self._thread.start()
+
+    async def finish(self):
+        """Para a amostragem (idempotente) e acorda quem espera a sessão"""
+        if self.ended_at is not None:
+            return
+        self.ended_at = time.monotonic()
+        if self._previous_handler is not None:
+            signal.setitimer(signal.ITIMER_PROF, 0)
+            signal.signal(signal.SIGPROF, self._previous_handler)
+        self._stop.set()
+        if self._thread is not None:
+            await asyncio.to_thread(self._thread.join)
+        self.done.set()
+
+    def _on_signal(self, signum, frame):
+        self._sample(threading.get_ident(), frame)
+
+    def _sample_loop(self):
+        own_ident = threading.get_ident()
+        while not self._stop.wait(self.interval):
+            self._sample(own_ident, None)
+
+    def _sample(self, own_ident: int, own_frame):
+        """Registra a pilha de cada thread; `own_frame` substitui a da thread que amostra"""
+        names = {thread.ident: thread.name for thread in threading.enumerate()}
+        frames = sys._current_frames()
+        if own_frame is not None:
+            frames[own_ident] = own_frame
+        else:
+            frames.pop(own_ident, None)
+        for ident, frame in frames.items():
+            leaf = (os.path.basename(frame.f_code.co_filename), frame.f_code.co_name)
+            if not self.include_idle and leaf in _IDLE_LEAVES:
+                continue
+            stack = []
+            while frame is not None:
+                code = frame.f_code
+                stack.append(f"{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})")
+                frame = frame.f_back
+            stack.append(names.get(ident, str(ident)))
+            self.samples[";".join(reversed(stack))] += 1
+
+    def collapsed(self) -> str:
+        """Pilhas no formato "collapsed" (flamegraph.pl, speedscope, inferno)"""
+        return "\n".join(f"{stack} {count}" for stack, count in self.samples.most_common())
+
+    def summary(self, top: int = 20) -> Dict:
+        self_time: Counter = Counter()
+        for stack, count in self.samples.items():
+            self_time[stack.rsplit(";", 1)[-1]] += count
+        total = sum(self.samples.values())
+        return {
+            "requests": self.finished,
+            "duration_seconds": round((self.ended_at or time.monotonic()) - (self.started_at or time.monotonic()), 3),
+            "interval_ms": self.interval * 1000,
+            "samples": total,
+            "top_self": [
+                {"frame": frame, "samples": count, "share": round(count / total, 4)}
+                for frame, count in self_time.most_common(top)
+            ],
+        }
+
+class RequestProfiler:
+    """Profiling sob demanda do processamento de mensagens.
+
+    CPU: `profile_requests(n)` arma um profiler de amostragem (SIGPROF, ou uma
+    thread lendo `sys._current_frames()` onde não há setitimer) que roda
+    enquanto as próximas `n` mensagens são processadas e devolve as pilhas
+    agregadas de todas as threads. Desarmado, o custo no caminho
+    quente é a leitura de `armed`.
+
+    Memória: snapshots do tracemalloc com diff em relação ao anterior e
+    estimativa de memória por componente (modelo de embedding, caches, filas).
+    """
+
+    def __init__(self, interval: float = 0.005):
+        self.interval = interval
+        self.armed = False
+        self._session: Optional[_CpuSession] = None
+        self._last_snapshot: Optional[tracemalloc.Snapshot] = None
+
+    # ── CPU ──────────────────────────────────────────────────────────────
+
+    async def profile_requests(self, requests: int, timeout: float, interval: Optional[float] = None,
+                               include_idle: bool = False) -> _CpuSession:
+        """Amostra as próximas `requests` mensagens (ou até `timeout`) e devolve a sessão"""
+        if self._session is not None:
+            raise ProfilerBusyError("sessão de profiling de CPU já em andamento")
+        session = _CpuSession(max(1, requests), interval or self.interval, include_idle)
+        self._session = session
+        self.armed = True
+        logger.info("Profiler de CPU armado para %s mensagem(ns)", session.requests)
+        try:
+            await asyncio.wait_for(session.done.wait(), timeout)
+        except asyncio.TimeoutError:
+            logger.info("Profiler de CPU encerrado por timeout após %s mensagem(ns)", session.finished)
+        finally:
+            self.armed = False
+            await session.finish()
+            self._session = None
+        return session
+
+    async def track(self, awaitable: Awaitable) -> Any:
+        """Aguarda `awaitable` contando-o na sessão armada (chamar só com `armed`)"""
+        session = self._session
+        if session is None or session.started >= session.requests:
+            return await awaitable
+        session.started += 1
+        if session.started_at is None:
+            session.start_sampling()
+        if session.started >= session.requests:
+            self.armed = False
+        try:
+            return await awaitable
+        finally:
+            session.finished += 1
+            if session.finished >= session.requests:
+                await session.finish()
+
+    # ── Memória ──────────────────────────────────────────────────────────
+
+    def start_tracemalloc(self, frames: int = 25) -> Dict:
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames)
+            self._last_snapshot = None
+        return {"tracing": True, "frames": tracemalloc.get_traceback_limit()}
+
+    def stop_tracemalloc(self) -> Dict:
+        tracemalloc.stop()
+        self._last_snapshot = None
+        return {"tracing": False}
+
+    def memory_snapshot(self, top: int = 25, group_by: str = "lineno") -> Dict:
+        """Maiores alocações e diff em relação ao snapshot anterior"""
+        if not tracemalloc.is_tracing():
+            raise RuntimeError("tracemalloc não está ativo")
+        snapshot = tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, "<frozen importlib._bootstrap>"),
+            tracemalloc.Filter(False, linecache.__file__),
+        ))
+        current, peak = tracemalloc.get_traced_memory()
+        result = {
+            "traced_bytes": current,
+            "peak_bytes": peak,
+            "top": [_format_stat(stat) for stat in snapshot.statistics(group_by)[:top]],
+            "diff": None,
+        }
+        if self._last_snapshot is not None:
+            result["diff"] = [_format_stat(stat) for stat in snapshot.compare_to(self._last_snapshot, group_by)[:top]]
+        self._last_snapshot = snapshot
+        return result
+
+    def component_memory(self, components: Dict[str, Any], embedding_model=None) -> Dict:
+        """Bytes estimados por componente; objetos compartilhados contam só uma vez"""
+        report: Dict[str, Any] = {"process_rss_bytes": _process_rss()}
+        seen = {id(obj) for obj in components.values() if obj is not None}
+        if embedding_model is not None:
+            report["embedding_model"] = _model_bytes(embedding_model)
+            seen.add(id(embedding_model))
+        for name, obj in components.items():
+            report[name] = _deep_sizeof(obj, seen) if obj is not None else None
+        return report
+
+def _format_stat(stat) -> Dict:
+    frame = stat.traceback[0]
+    return {
+        "location": f"{frame.filename}:{frame.lineno}",
+        "size_bytes": stat.size,
+        "size_diff_bytes": getattr(stat, "size_diff", None),
+        "count": stat.count,
+    }
+
+def _process_rss() -> Optional[int]:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError, IndexError):
+        try:
+            import resource
+            return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+        except ImportError:
+            return None
+
+def _model_bytes(model) -> Optional[int]:
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except Exception:
+        return None
+
+# Tipos que não pertencem a um componente (código, módulos, loop, threads)
+_OPAQUE_TYPES = (type, types.ModuleType, types.FunctionType, types.BuiltinFunctionType, types.MethodType,
+                 types.CodeType, types.FrameType, asyncio.AbstractEventLoop, threading.Thread, logging.Logger)
+
+def _deep_sizeof(root, seen: set, max_objects: int = 500000) -> int:
+    """Soma sys.getsizeof do grafo alcançável a partir de `root`, sem repetir objetos de `seen`"""
+    total = sys.getsizeof(root, 0)
+    pending: List[Any] = gc.get_referents(root)
+    visited = 0
+    while pending and visited < max_objects:
+        obj = pending.pop()
+        if id(obj) in seen or isinstance(obj, _OPAQUE_TYPES):
+            continue
+        seen.add(id(obj))
+        visited += 1
+        total += sys.getsizeof(obj, 0)
+        pending.extend(gc.get_referents(obj))
+    return total
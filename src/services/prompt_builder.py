@@ -0,0 +1,154 @@
+from dataclasses import dataclass, replace
+from typing import List, Dict, Optional
+import logging
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class PromptTemplate:
+    version: str
+    system: str
+    context_header: str
+    empty_context: str
+    question: str
+    # Bloco do resumo da conversa (services/summarizer.py); None: a versão não usa resumo
+    summary: Optional[str] = None
+
+# Templates versionados. Nunca altere um template existente: crie uma nova versão,
+# assim o prefixo em cache do Ollama e as métricas continuam comparáveis.
+PROMPT_TEMPLATES: Dict[str, PromptTemplate] = {
+    "v1": PromptTemplate(
+        version="v1",
+        system=(
+            "Você é um assistente virtual prestativo e amigável que responde mensagens de WhatsApp.\n"
+            "\n"
+            "Instruções:\n"
+            "- Responda de forma útil, amigável e concisa\n"
+            "- Use o conhecimento fornecido quando relevante\n"
+            "- Mantenha o contexto da conversa\n"
+            "- Se não souber algo, seja honesto\n"
+            "- Não cumprimente o cliente, não diga \"olá\", \"olá novamente\" ou qualquer outra forma de cumprimento\n"
+            "- Responda em português brasileiro\n"
+            "- Mantenha o tom conversacional e profissional"
+        ),
+        context_header="Base de Conhecimento:\n{context}",
+        empty_context="Base de Conhecimento: (nenhum documento relevante encontrado)",
+        question="Mensagem atual do cliente: {message}",
+    ),
+}
+# v1 + bloco do resumo da conversa logo após as instruções
+PROMPT_TEMPLATES["v2"] = replace(PROMPT_TEMPLATES["v1"], version="v2", summary="Resumo da conversa até aqui:\n{summary}")
+
+DEFAULT_PROMPT_VERSION = "v2"
+
+# Prompt do resumo incremental (services/summarizer.py)
+SUMMARY_SYSTEM = (
+    "Você resume conversas de atendimento por WhatsApp entre um cliente e um assistente virtual.\n"
+    "\n"
+    "Instruções:\n"
+    "- Atualize o resumo anterior com as novas mensagens, sem perder fatos ainda relevantes\n"
+    "- Registre quem é o cliente, o que pediu, dados que informou, o que já foi respondido e o que ficou pendente\n"
+    "- Seja objetivo, em terceira pessoa e em português brasileiro\n"
+    "- Use no máximo {max_chars} caracteres\n"
+    "- Responda apenas com o resumo"
+)
+SUMMARY_REQUEST = "Resumo anterior:\n{summary}\n\nNovas mensagens:\n{messages}\n\nResumo atualizado:"
+
+class PromptBuilder:
+    """Monta o prompt em ordem estável para aproveitar o cache de prefixo do Ollama.
+
+    Ordem: instruções fixas (system) -> resumo da conversa -> histórico -> contexto recuperado -> pergunta.
+    Tudo o que varia entre requisições fica no final da lista de mensagens.
+    """
+
+    def __init__(self, version: str = DEFAULT_PROMPT_VERSION, history_turns: int = 5):
+        if version not in PROMPT_TEMPLATES:
+            raise ValueError(f"Template de prompt desconhecido: {version}. Disponíveis: {list(PROMPT_TEMPLATES)}")
+        self.template = PROMPT_TEMPLATES[version]
+        self.history_turns = history_turns
+        self._usage = {
+            "requests": 0,
+            "prompt_chars": 0,
+            "prompt_eval_count": 0,
+            "prompt_eval_duration_ns": 0,
+            "eval_count": 0,
+            "eval_duration_ns": 0,
+        }
+
+    @property
+    def version(self) -> str:
+        return self.template.version
+
+    def build(self, user_message: str, context: List[str], conversation_history: List[Dict] = None,
+              summary: Optional[str] = None) -> List[Dict]:
+        """Retorna a lista de mensagens no formato do /api/chat do Ollama.
+
+        Com `summary`, o resumo entra logo após as instruções (muda a cada
+        resumo, não a cada turno) e o histórico recebido, já limitado às
+        mensagens posteriores ao resumo, entra inteiro.
+        """
+        messages = [{"role": "system", "content": self.template.system}]
+        if summary and self.template.summary is None:
+            # Versão sem resumo: segue só com o histórico, como antes dos resumos
+            summary = None
+        if summary:
+            messages.append({"role": "system", "content": self.template.summary.format(summary=summary)})
+
+        history = list(conversation_history or [])
+        # A mensagem atual (ou as mensagens agrupadas nela) já foi salva antes do processamento
+        while history and history[-1].get("direction") == "incoming" and history[-1].get("content", "") in user_message:
+            history.pop()
+
+        if not summary:
+            history = history[-self.history_turns:] if self.history_turns else []
+        for msg in history:
+            role = "user" if msg["direction"] == "incoming" else "assistant"
+            messages.append({"role": role, "content": msg["content"]})
+
+        if context:
+            context_block = self.template.context_header.format(context="\n".join(context))
+        else:
+            context_block = self.template.empty_context
+        question = self.template.question.format(message=user_message)
+        messages.append({"role": "user", "content": f"{context_block}\n\n{question}"})
+        return messages
+
+    @staticmethod
+    def build_summary(previous_summary: Optional[str], messages: List[Dict], max_chars: int) -> List[Dict]:
+        """Prompt que incorpora `messages` ao resumo anterior"""
+        lines = "\n".join(
+            f"{'Cliente' if msg['direction'] == 'incoming' else 'Assistente'}: {msg['content']}" for msg in messages
+        )
+        return [
+            {"role": "system", "content": SUMMARY_SYSTEM.format(max_chars=max_chars)},
+            {"role": "user", "content": SUMMARY_REQUEST.format(summary=previous_summary or "(nenhum)", messages=lines)},
+        ]
+
+    def record_usage(self, messages: List[Dict], final_chunk: Optional[Dict]):
+        """Registra as contagens de tokens devolvidas pelo Ollama no último chunk"""
+        prompt_chars = sum(len(m["content"]) for m in messages)
+        final_chunk = final_chunk or {}
+        prompt_eval_count = final_chunk.get("prompt_eval_count", 0)
+
+        self._usage["requests"] += 1
+        self._usage["prompt_chars"] += prompt_chars
+        self._usage["prompt_eval_count"] += prompt_eval_count
+        self._usage["prompt_eval_duration_ns"] += final_chunk.get("prompt_eval_duration", 0)
+        self._usage["eval_count"] += final_chunk.get("eval_count", 0)
+        self._usage["eval_duration_ns"] += final_chunk.get("eval_duration", 0)
+
+        logger.debug("Prompt %s: %d chars, prompt_eval_count=%s, eval_count=%s",
+                     self.version, prompt_chars, prompt_eval_count, final_chunk.get("eval_count", 0))
+
+    def stats(self) -> Dict:
+        """Estatísticas acumuladas de uso do prompt"""
+        usage = dict(self._usage)
+        requests = usage["requests"] or 1
+        usage["template_version"] = self.version
+        usage["avg_prompt_eval_count"] = usage["prompt_eval_count"] / requests
+        usage["avg_prompt_eval_ms"] = usage["prompt_eval_duration_ns"] / requests / 1e6
+        # Quando o prefixo é reaproveitado, o Ollama avalia menos tokens por caractere enviado
+        usage["prompt_eval_tokens_per_char"] = (
+            usage["prompt_eval_count"] / usage["prompt_chars"] if usage["prompt_chars"] else 0.0
+        )
+        return usage
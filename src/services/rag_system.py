@@ -1,24 +1,34 @@
+import asyncio
 import hashlib
 import json
-from typing import List, Dict
+import time
+from typing import List, Dict, Optional, Tuple
 from sentence_transformers import SentenceTransformer
 from qdrant_client import QdrantClient
 from qdrant_client.http.models import Distance, VectorParams, PointStruct
 import logging
-import httpx
 import warnings
+from services.prompt_builder import PromptBuilder, DEFAULT_PROMPT_VERSION
+from services.ollama_pool import OllamaPool
+from services.generation_options import GenerationOptions
+from services.metrics import stage_timer, OLLAMA_TTFT_SECONDS
 
 logger = logging.getLogger(__name__)
 
 class RAGSystem:
-    def __init__(self, ollama_url, ollama_model, qdrant_host, qdrant_port):
+    def __init__(self, ollama_url, ollama_model, qdrant_host, qdrant_port, prompt_version=DEFAULT_PROMPT_VERSION,
+                 ollama_urls: List[str] = None, ollama_pool_options: Dict = None, generation_options: GenerationOptions = None):
         self.ollama_url = ollama_url
+        self.ollama_pool = OllamaPool(ollama_urls or [ollama_url], **(ollama_pool_options or {}))
         self.ollama_model = ollama_model
         self.qdrant_host = qdrant_host
         self.qdrant_port = qdrant_port
         self.embedding_model = SentenceTransformer('all-MiniLM-L6-v2')
         self.qdrant = None
         self.collection_name = "knowledge_base"
+        self._collection_ready = False
+        self.prompt_builder = PromptBuilder(prompt_version)
+        self.generation_options = generation_options or GenerationOptions()
         # Removida a inicialização lazy do construtor
     
     async def initialize_qdrant(self) -> bool:
@@ -28,32 +38,36 @@ class RAGSystem:
 
         try:
             logger.info("🔍 Inicializando Qdrant...")
-            logger.info(f"Host: {self.qdrant_host}, Port: {self.qdrant_port}")
+            logger.info("Host: %s, Port: %s", self.qdrant_host, self.qdrant_port)
             
-            self.qdrant = QdrantClient(host=self.qdrant_host, port=self.qdrant_port)
+            if self.qdrant_host == ":memory:":
+                self.qdrant = QdrantClient(location=":memory:")
+            else:
+                self.qdrant = QdrantClient(host=self.qdrant_host, port=self.qdrant_port)
             
             # Testar conexão
             collections = self.qdrant.get_collections()
-            logger.info(f"Conexão com Qdrant estabelecida. Coleções: {[c.name for c in collections.collections]}")
+            logger.info("Conexão com Qdrant estabelecida. Coleções: %s", [c.name for c in collections.collections])
             
             # Verificar se a coleção existe
             if self.collection_name not in [c.name for c in collections.collections]:
-                logger.info(f"Criando coleção '{self.collection_name}'...")
+                logger.info("Criando coleção '%s'...", self.collection_name)
                 self.qdrant.create_collection(
                     collection_name=self.collection_name,
                     vectors_config=VectorParams(size=384, distance=Distance.COSINE)
                 )
-                logger.info(f"Coleção '{self.collection_name}' criada com sucesso")
+                logger.info("Coleção '%s' criada com sucesso", self.collection_name)
             else:
-                logger.info(f"Coleção '{self.collection_name}' já existe")
+                logger.info("Coleção '%s' já existe", self.collection_name)
+            self._collection_ready = True
                 
             logger.info("✅ Qdrant inicializado com sucesso")
             return True
             
         except Exception as e:
-            logger.error(f"❌ Erro ao inicializar Qdrant: {e}")
+            logger.error("❌ Erro ao inicializar Qdrant: %s", e)
             import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.error("Traceback: %s", traceback.format_exc())
             self.qdrant = None
             return False
 
@@ -61,27 +75,33 @@ class RAGSystem:
         """Testa a conexão com o Ollama"""
         try:
             logger.info("🧠 Testando conexão com Ollama...")
-            logger.info(f"URL do Ollama: {self.ollama_url}")
+            logger.info("URLs do Ollama: %s", [e.url for e in self.ollama_pool.endpoints])
             
-            # Testar se o Ollama está respondendo
-            async with httpx.AsyncClient(timeout=10.0) as client:
-                try:
-                    logger.info("📡 Testando conectividade básica...")
-                    response = await client.get(f"{self.ollama_url}/api/tags")
-                    response.raise_for_status()
-                    logger.info("✅ Ollama está respondendo!")
-                except Exception as e:
-                    logger.error(f"❌ Ollama não está respondendo em {self.ollama_url}: {e}")
-                    logger.error("💡 Verifique se o Ollama está rodando: ollama serve")
-                    return False
-                    
-                logger.info("✅ Ollama conectado e funcionando!")
-                return True
+            # Testar se as instâncias do Ollama estão respondendo
+            logger.info("📡 Testando conectividade básica...")
+            results = await self.ollama_pool.check_endpoints()
+            if not any(results.values()):
+                logger.error("💡 Verifique se o Ollama está rodando: ollama serve")
+                return False
+
+            logger.info("✅ Ollama conectado e funcionando! (%s/%s instâncias)", sum(results.values()), len(results))
+            return True
                 
         except Exception as e:
-            logger.error(f"❌ Erro geral ao conectar com Ollama: {e}")
+            logger.error("❌ Erro geral ao conectar com Ollama: %s", e)
             return False
 
+    async def check_qdrant(self) -> bool:
+        """Verificação leve do Qdrant (lista as coleções), sem logs de diagnóstico"""
+        if not self.qdrant:
+            raise RuntimeError("Qdrant não inicializado")
+        await asyncio.to_thread(self.qdrant.get_collections)
+        return True
+
+    async def check_ollama(self) -> bool:
+        """Verificação leve do Ollama: alguma instância respondendo"""
+        return any((await self.ollama_pool.check_endpoints(log_errors=False)).values())
+
     async def add_documents_to_rag(self, documents: List[str], metadatas: List[Dict] = None):
         try:
             if not self.qdrant:
@@ -101,59 +121,79 @@ class RAGSystem:
                 collection_name=self.collection_name,
                 points=points
             )
-            logger.info(f"Adicionados {len(documents)} documentos ao RAG")
+            logger.info("Adicionados %s documentos ao RAG", len(documents))
         except Exception as e:
-            logger.error(f"Erro ao adicionar documentos: {e}")
+            logger.error("Erro ao adicionar documentos: %s", e)
+
+    def embed_query(self, text: str) -> List[float]:
+        """Gera o embedding de um texto de busca"""
+        with stage_timer("embedding"):
+            return self.embedding_model.encode([text])[0].tolist()
+
+    async def retrieve_context(self, query: str, conversation_history: List[Dict] = None, n_results: int = 3,
+                               query_embedding: List[float] = None) -> List[str]:
+        """Busca os documentos mais relevantes; embedding e busca rodam fora do event loop"""
+        return await asyncio.to_thread(self._retrieve_context_sync, query, conversation_history, n_results, query_embedding)
 
-    async def retrieve_context(self, query: str, conversation_history: List[Dict] = None, n_results: int = 3) -> List[str]:
+    def _retrieve_context_sync(self, query: str, conversation_history: List[Dict], n_results: int,
+                               query_embedding: List[float]) -> List[str]:
         try:
-            logger.info(f"Iniciando retrieve_context para query: '{query}'")
+            logger.debug("Iniciando retrieve_context para query: '%s'", query)
             
             # Verificar se o Qdrant está disponível
             if not self.qdrant:
                 logger.error("Qdrant não foi inicializado. Chame initialize_qdrant() primeiro.")
                 return []
             
-            # Verificar se a coleção existe
+            # Verificar se a coleção existe (uma vez; volta a verificar após erro na busca)
             try:
-                collections = self.qdrant.get_collections()
-                collection_names = [c.name for c in collections.collections]
-                logger.info(f"Coleções disponíveis: {collection_names}")
-                
-                if self.collection_name not in collection_names:
-                    logger.warning(f"Coleção '{self.collection_name}' não encontrada. Criando...")
-                    self.qdrant.create_collection(
-                        collection_name=self.collection_name,
-                        vectors_config=VectorParams(size=384, distance=Distance.COSINE)
-                    )
-                    logger.info(f"Coleção '{self.collection_name}' criada com sucesso")
+                if not self._collection_ready:
+                    collections = self.qdrant.get_collections()
+                    collection_names = [c.name for c in collections.collections]
+                    logger.info("Coleções disponíveis: %s", collection_names)
+                    
+                    if self.collection_name not in collection_names:
+                        logger.warning("Coleção '%s' não encontrada. Criando...", self.collection_name)
+                        self.qdrant.create_collection(
+                            collection_name=self.collection_name,
+                            vectors_config=VectorParams(size=384, distance=Distance.COSINE)
+                        )
+                        logger.info("Coleção '%s' criada com sucesso", self.collection_name)
+                    self._collection_ready = True
             except Exception as e:
-                logger.error(f"Erro ao verificar/criar coleção: {e}")
+                logger.error("Erro ao verificar/criar coleção: %s", e)
                 return []
             
             # Preparar query de busca
             search_query = query
-            if conversation_history:
-                recent_messages = [msg["content"] for msg in conversation_history[-3:]]
+            history = list(conversation_history or [])
+            # A mensagem atual já está no histórico salvo; não duplicar na busca
+            while history and history[-1].get("direction") == "incoming" and history[-1].get("content", "") in query:
+                history.pop()
+            if history:
+                recent_messages = [msg["content"] for msg in history[-3:]]
                 search_query = f"{query} {' '.join(recent_messages)}"
-                logger.info(f"Query expandida com histórico: '{search_query}'")
+                logger.debug("Query expandida com histórico: '%s'", search_query)
             
-            # Gerar embedding
+            # Gerar embedding (reaproveita o da mensagem quando a busca é só a mensagem)
             try:
-                query_embedding = self.embedding_model.encode([search_query])[0].tolist()
-                logger.info(f"Embedding gerado com sucesso (dimensão: {len(query_embedding)})")
+                if query_embedding is None or search_query != query:
+                    query_embedding = self.embed_query(search_query)
+                logger.debug("Embedding gerado com sucesso (dimensão: %s)", len(query_embedding))
             except Exception as e:
-                logger.error(f"Erro ao gerar embedding: {e}")
+                logger.error("Erro ao gerar embedding: %s", e)
                 return []
             
             # Buscar no Qdrant
             try:
-                search_result = self.qdrant.search(
-                    collection_name=self.collection_name,
-                    query_vector=query_embedding,
-                    limit=n_results
-                )
-                logger.info(f"Busca realizada com sucesso. Resultados encontrados: {len(search_result)}")
+                with stage_timer("qdrant_search"):
+                    # query_points substitui o search (removido nas versões atuais do qdrant-client)
+                    search_result = self.qdrant.query_points(
+                        collection_name=self.collection_name,
+                        query=query_embedding,
+                        limit=n_results
+                    ).points
+                logger.debug("Busca realizada com sucesso. Resultados encontrados: %s", len(search_result))
                 
                 # Extrair documentos dos resultados
                 documents = []
@@ -161,91 +201,99 @@ class RAGSystem:
                     if "document" in hit.payload:
                         documents.append(hit.payload["document"])
                     else:
-                        logger.warning(f"Resultado sem campo 'document': {hit.payload}")
+                        logger.warning("Resultado sem campo 'document': %s", hit.payload)
                 
-                logger.info(f"Documentos recuperados: {len(documents)}")
+                logger.debug("Documentos recuperados: %s", len(documents))
                 return documents
                 
             except Exception as e:
-                logger.error(f"\nErro na busca no Qdrant: {e}\n")
+                logger.error("\nErro na busca no Qdrant: %s\n", e)
+                self._collection_ready = False
                 return []
                 
         except Exception as e:
-            logger.error(f"Erro geral na recuperação de contexto: {e}")
-            import traceback
-            logger.error(f"Traceback: {traceback.format_exc()}")
+            logger.exception("Erro geral na recuperação de contexto: %s", e)
             return []
 
-    async def generate_response(self, user_message: str, context: List[str], conversation_history: List[Dict] = None) -> str:
+    async def generate_response(self, user_message: str, context: List[str], conversation_history: List[Dict] = None,
+                                conversation_id: str = None, summary: str = None) -> str:
         try:
-            context_text = "\n".join(context) if context else ""
-            history_text = ""
-            if conversation_history:
-                for msg in conversation_history[-5:]:
-                    role = "Cliente" if msg["direction"] == "incoming" else "outgoing"
-                    history_text += f"{role}: {msg['content']}\n"
-            prompt = f"""
-            Você é um assistente virtual prestativo e amigável que responde mensagens de WhatsApp.
-            
-            Base de Conhecimento:
-            {context_text}
-            
-            Histórico da Conversa:
-            {history_text}
-            
-            Mensagem atual do cliente: {user_message}
-            
-            Instruções:
-            - Responda de forma útil, amigável e concisa
-            - Use o conhecimento fornecido quando relevante
-            - Mantenha o contexto da conversa
-            - Se não souber algo, seja honesto
-            - Não cumprimente o cliente, não diga "olá", "olá novamente" ou qualquer outra forma de cumprimento
-            - Responda em português brasileiro
-            - Mantenha o tom conversacional e profissional
-            
-            Resposta:
-            """
+            with stage_timer("prompt_build"):
+                messages = self.prompt_builder.build(user_message, context, conversation_history, summary)
+                options = self.generation_options.build(messages)
+            started = time.monotonic()
 
-            async with httpx.AsyncClient(timeout=60.0) as client:
-                response = await client.post(
-                    f"{self.ollama_url}/api/chat",
+            with stage_timer("ollama_total"):
+                response = await self.ollama_pool.post(
+                    "/api/chat",
                     json={
                         "model": self.ollama_model,
-                        "messages": [{"role": "user", "content": prompt}],
-                        "options": {"temperature": 0.7}
-                    }
+                        "messages": messages,
+                        "options": options
+                    },
+                    conversation_id=conversation_id
                 )
                 response.raise_for_status()
+            elapsed = time.monotonic() - started
+            
+            # Processar resposta streaming do Ollama
+            try:
+                full_content, final_chunk = self._read_chat_response(response.text)
                 
-                # Processar resposta streaming do Ollama
-                try:
-                    # O Ollama retorna Newline Delimited JSON (NDJSON)
-                    # Cada linha é um JSON separado
-                    lines = response.text.strip().split('\n')
-                    full_content = ""
-                    
-                    for line in lines:
-                        if line.strip():
-                            try:
-                                chunk = json.loads(line)
-                                if 'message' in chunk and 'content' in chunk['message']:
-                                    full_content += chunk['message']['content']
-                            except json.JSONDecodeError:
-                                logger.warning(f"Linha inválida ignorada: {line}")
-                                continue
-                    
-                    if full_content:
-                        return full_content.strip()
-                    else:
-                        logger.warning("Nenhum conteúdo extraído da resposta do Ollama")
-                        return "Desculpe, não foi possível gerar uma resposta."
-                        
-                except Exception as e:
-                    logger.error(f"Erro ao processar resposta streaming do Ollama: {e}")
-                    logger.error(f"Resposta bruta: {response.text[:500]}...")
-                    return "Desculpe, houve um erro ao processar sua mensagem."
+                self.prompt_builder.record_usage(messages, final_chunk)
+                if final_chunk:
+                    # Sem streaming: o primeiro token chega quando termina a avaliação do prompt
+                    OLLAMA_TTFT_SECONDS.observe(max(0.0, elapsed - final_chunk.get("eval_duration", 0) / 1e9))
+                self.generation_options.record(options, messages, started, final_chunk)
                 
+                if full_content:
+                    return full_content.strip()
+                else:
+                    logger.warning("Nenhum conteúdo extraído da resposta do Ollama")
+                    return "Desculpe, não foi possível gerar uma resposta."
+                    
+            except Exception as e:
+                logger.error("Erro ao processar resposta streaming do Ollama: %s", e)
+                logger.error("Resposta bruta: %s...", response.text[:500])
+                return "Desculpe, houve um erro ao processar sua mensagem."
+            
         except Exception as e:
-            logger.error(f"Erro na geração de resposta: {e}")
-            return "Desculpe, houve um erro ao processar sua mensagem. Tente novamente em alguns instantes." 
\ No newline at end of file
+            logger.error("Erro na geração de resposta: %s", e)
+            return "Desculpe, houve um erro ao processar sua mensagem. Tente novamente em alguns instantes."
+
+    @staticmethod
+    def _read_chat_response(text: str) -> Tuple[str, Optional[Dict]]:
+        """Conteúdo e último chunk (com as contagens) de uma resposta do /api/chat"""
+        # O Ollama retorna Newline Delimited JSON (NDJSON)
+        # Cada linha é um JSON separado
+        full_content = ""
+        final_chunk = None
+        for line in text.strip().split('\n'):
+            if line.strip():
+                try:
+                    chunk = json.loads(line)
+                    if 'message' in chunk and 'content' in chunk['message']:
+                        full_content += chunk['message']['content']
+                    if chunk.get('done'):
+                        final_chunk = chunk
+                except json.JSONDecodeError:
+                    logger.warning("Linha inválida ignorada: %s", line)
+                    continue
+        return full_content, final_chunk
+
+    async def summarize(self, previous_summary: Optional[str], history: List[Dict], max_chars: int,
+                        num_predict: int, conversation_id: str = None) -> str:
+        """Resumo atualizado da conversa com as mensagens de `history`; erros são propagados"""
+        messages = self.prompt_builder.build_summary(previous_summary, history, max_chars)
+        options = self.generation_options.build(messages)
+        # Resumo deve ser fiel ao que foi dito: temperatura baixa
+        options.update(num_predict=num_predict, temperature=0.2)
+        with stage_timer("summary_total"):
+            response = await self.ollama_pool.post(
+                "/api/chat",
+                json={"model": self.ollama_model, "messages": messages, "options": options},
+                conversation_id=conversation_id
+            )
+            response.raise_for_status()
+        content, _ = self._read_chat_response(response.text)
+        return content.strip()[:max_chars]
@@ -0,0 +1,204 @@
+import uuid
+import logging
+from datetime import datetime, timedelta, timezone
+from typing import List, Dict, Optional, Tuple
+from models.schemas import Message
+from services.conversation_cache import ConversationCache
+from services.message_writer import MessageWriteBuffer
+from services.history_cache import HistoryCache
+from services.metrics import stage_timer
+
+logger = logging.getLogger(__name__)
+
+STORAGE_BACKENDS = ("supabase", "postgres")
+
+class MessageStore:
+    """Interface de armazenamento de conversas e mensagens.
+
+    Aqui ficam os caches (conversa por telefone, histórico), o write-behind e
+    a orquestração; cada backend implementa só o acesso ao banco nos métodos
+    `_find_or_insert_conversation`, `_insert_message`, `_insert_messages`,
+    `_fetch_history` e, se conseguir fazer em uma ida ao banco, `_save_incoming`.
+    """
+
+    # Nome do backend nas mensagens de erro
+    name = "banco"
+
+    def __init__(self, conversation_cache: Optional[ConversationCache] = None,
+                 write_buffer_options: Optional[Dict] = None, history_cache: Optional[HistoryCache] = None,
+                 history_lookback_days: float = 0):
+        self.conversation_cache = conversation_cache
+        self.history_cache = history_cache
+        # Janela do histórico: mensagens mais antigas são ignoradas (e, com messages particionada, nem lidas); 0 desativa
+        self.history_lookback = timedelta(days=history_lookback_days) if history_lookback_days > 0 else None
+        # Write-behind das mensagens (None grava cada mensagem na hora)
+        self.write_buffer = MessageWriteBuffer(self._insert_messages, **write_buffer_options) if write_buffer_options is not None else None
+
+    async def initialize(self):
+        raise NotImplementedError
+
+    async def health_check(self) -> bool:
+        raise NotImplementedError
+
+    async def update_conversation(self, conversation_id: str, updates: dict):
+        raise NotImplementedError
+
+    async def get_conversation_summary(self, conversation_id: str) -> Optional[Dict]:
+        """Resumo salvo da conversa: {"summary", "summary_through" (ISO 8601)}; None se a conversa não existe"""
+        raise NotImplementedError
+
+    async def close(self):
+        """Grava as mensagens pendentes e fecha as conexões"""
+        if self.write_buffer is not None:
+            await self.write_buffer.close()
+        await self._close()
+
+    async def _close(self):
+        pass
+
+    async def _find_or_insert_conversation(self, phone_number: str, user_name: str = None) -> Tuple[str, bool]:
+        """Consulta a conversa mais recente do telefone ou cria uma; retorna (id, criada)"""
+        raise NotImplementedError
+
+    async def _insert_message(self, row: Dict) -> str:
+        raise NotImplementedError
+
+    async def _insert_messages(self, rows: List[Dict]):
+        """Insert em lote usado pelo write-behind"""
+        raise NotImplementedError
+
+    async def _fetch_history(self, conversation_id: str, limit: int, since: Optional[datetime] = None) -> List[Dict]:
+        """Últimas `limit` mensagens a partir de `since` (colunas de HISTORY_COLUMNS, created_at em ISO 8601)
+        em ordem cronológica"""
+        raise NotImplementedError
+
+    async def _save_incoming(self, phone_number: str, user_name: Optional[str], row: Dict) -> Tuple[str, bool]:
+        """Busca ou cria a conversa e grava a mensagem; retorna (id da conversa, criada)"""
+        with stage_timer("conversation_lookup"):
+            conversation_id, created = await self._find_or_insert_conversation(phone_number, user_name)
+        row["conversation_id"] = conversation_id
+        with stage_timer("supabase_insert"):
+            await self._insert_message(row)
+        return conversation_id, created
+
+    async def get_or_create_conversation(self, phone_number: str, user_name: str = None) -> str:
+        cache = self.conversation_cache
+        try:
+            if cache is None:
+                conversation_id, _ = await self._find_or_insert_conversation(phone_number, user_name)
+                return conversation_id
+
+            conversation_id = await cache.get(phone_number)
+            if conversation_id is not None:
+                return conversation_id
+            # Primeiras mensagens simultâneas do mesmo telefone esperam a mesma criação
+            async with cache.creation_lock(phone_number):
+                conversation_id = await cache.get_after_wait(phone_number)
+                if conversation_id is None:
+                    conversation_id, created = await self._find_or_insert_conversation(phone_number, user_name)
+                    await cache.set(phone_number, conversation_id, created=created)
+            return conversation_id
+        except Exception as e:
+            logger.error("Erro ao gerenciar conversa: %s", e)
+            raise ConnectionError(f"Erro ao gerenciar conversa no {self.name}: {e}")
+
+    async def save_incoming_message(self, phone_number: str, message: Message, user_name: str = None) -> str:
+        """Busca ou cria a conversa do telefone e salva a mensagem nela; retorna o ID da conversa.
+
+        Com a conversa em cache é só o insert da mensagem; sem ela, backends com
+        `_save_incoming` próprio fazem busca, criação e insert em uma ida ao banco.
+        """
+        cache = self.conversation_cache
+        if cache is not None:
+            with stage_timer("conversation_lookup"):
+                conversation_id = await cache.get(phone_number)
+            if conversation_id is None:
+                async with cache.creation_lock(phone_number):
+                    conversation_id = await cache.get_after_wait(phone_number)
+                    if conversation_id is None:
+                        conversation_id, created = await self._save_incoming_uncached(phone_number, message, user_name)
+                        await cache.set(phone_number, conversation_id, created=created)
+                        return conversation_id
+            message.conversation_id = conversation_id
+            with stage_timer("supabase_insert"):
+                await self.save_message(message)
+            return conversation_id
+
+        conversation_id, _ = await self._save_incoming_uncached(phone_number, message, user_name)
+        return conversation_id
+
+    async def _save_incoming_uncached(self, phone_number: str, message: Message, user_name: Optional[str]) -> Tuple[str, bool]:
+        row = self.message_to_json(message)
+        try:
+            conversation_id, created = await self._save_incoming(phone_number, user_name, row)
+        except Exception as e:
+            logger.error("Erro ao salvar mensagem recebida: %s", e)
+            raise ConnectionError(f"Erro ao salvar mensagem no {self.name}: {e}")
+        logger.debug("Mensagem salva: %s (conversa %s%s)", row['id'], conversation_id, ', nova' if created else '')
+        message.conversation_id = row["conversation_id"] = conversation_id
+        if self.history_cache is not None:
+            self.history_cache.append(conversation_id, row)
+        return conversation_id, created
+
+    def message_to_json(self, message: Message):
+        return {
+            "id": str(uuid.uuid4()),
+            "conversation_id": message.conversation_id,
+            "platform": message.platform,
+            "sender": message.sender,
+            "receiver": message.receiver,
+            "message_type": message.message_type,
+            "external_message_id": message.id,
+            "content": message.content,
+            "metadata": message.metadata or {},
+            "direction": message.direction,
+            "created_at": datetime.now(timezone.utc).isoformat()
+        }
+
+    async def save_message(self, message: Message):
+        message_data = self.message_to_json(message)
+
+        try:
+            if self.write_buffer is not None:
+                await self.write_buffer.add(message_data)
+                message_id = message_data["id"]
+            else:
+                message_id = await self._insert_message(message_data)
+                logger.debug("Mensagem salva: %s", message_id)
+        except Exception as e:
+            logger.error("Erro ao salvar mensagem: %s", e)
+            raise ConnectionError(f"Erro ao salvar mensagem no {self.name}: {e}")
+
+        if self.history_cache is not None:
+            self.history_cache.append(message.conversation_id, message_data)
+        return message_id
+
+    async def get_conversation_history(self, conversation_id: str, limit: int = 10) -> List[Dict]:
+        """Últimas mensagens da conversa (apenas as colunas de HISTORY_COLUMNS), em ordem cronológica"""
+        cache = self.history_cache
+        if cache is not None:
+            cached = cache.get(conversation_id, limit)
+            if cached is not None:
+                return cached
+            cache.begin_load(conversation_id)
+
+        try:
+            since = datetime.now(timezone.utc) - self.history_lookback if self.history_lookback else None
+            history = await self._fetch_history(conversation_id, limit, since)
+        except Exception as e:
+            if cache is not None:
+                cache.abort_load(conversation_id)
+            logger.error("Erro ao recuperar histórico: %s", e)
+            raise ConnectionError(f"Erro ao recuperar histórico do {self.name}: {e}")
+
+        if self.write_buffer is not None:
+            # Mensagens ainda no buffer também fazem parte do histórico
+            pending = self.write_buffer.pending(conversation_id)
+            if pending:
+                saved_ids = {row["id"] for row in history}
+                history.extend(HistoryCache.project(row) for row in pending if row["id"] not in saved_ids)
+                history = sorted(history, key=lambda row: row["created_at"])[-limit:]
+
+        if cache is not None:
+            cache.load(conversation_id, history, limit)
+        return history
@@ -0,0 +1,146 @@
+import asyncio
+import logging
+import time
+from collections import OrderedDict
+from datetime import datetime, timezone
+from typing import Dict, List, Optional, Tuple
+
+from services.llm_scheduler import PRIORITY_LOW, QueueFullError, QueueTimeoutError
+
+logger = logging.getLogger(__name__)
+
+def _timestamp(value: str) -> datetime:
+    # Backends devolvem created_at com ou sem fuso; sem fuso é UTC (o que o banco grava)
+    parsed = datetime.fromisoformat(value)
+    if parsed.tzinfo is None:
+        return parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc)
+
+class ConversationSummarizer:
+    """Resumo incremental das conversas longas, fora do caminho da resposta.
+
+    Quando uma conversa acumula `every` mensagens além das `keep` mais recentes
+    depois do último resumo, as mais antigas são incorporadas ao resumo por uma
+    geração de prioridade baixa no LLMScheduler, e o resultado é salvo na
+    conversa (summary, summary_through). O prompt usa o resumo mais as
+    mensagens posteriores a ele, no máximo `every + keep`, por mais longa que a
+    conversa fique.
+
+    Os resumos lidos ficam em cache por `cache_ttl` segundos; com vários
+    processos, um resumo feito em outro processo aparece depois do TTL.
+    """
+
+    def __init__(self, store, rag_system, scheduler, every: int = 10, keep: int = 4, max_chars: int = 1200,
+                 num_predict: int = 300, cache_ttl: float = 300.0, max_cached: int = 10000):
+        if every < 1 or keep < 0:
+            raise ValueError("every deve ser >= 1 e keep >= 0")
+        self.store = store
+        self.rag_system = rag_system
+        self.scheduler = scheduler
+        self.every = every
+        self.keep = keep
+        self.max_chars = max_chars
+        self.num_predict = num_predict
+        self.cache_ttl = cache_ttl
+        self.max_cached = max_cached
+        # conversa -> (expira em, {"summary", "summary_through"})
+        self._cache: "OrderedDict[str, Tuple[float, Dict]]" = OrderedDict()
+        self._tasks: Dict[str, asyncio.Task] = {}
+        self._counters = {"scheduled": 0, "completed": 0, "failed": 0, "deferred": 0, "messages_folded": 0}
+        self._summary_chars = 0
+
+    @property
+    def history_limit(self) -> int:
+        """Mensagens a buscar do histórico: cobre tudo o que pode estar fora do resumo"""
+        return self.every + self.keep
+
+    async def get(self, conversation_id: str) -> Optional[Dict]:
+        """Resumo atual da conversa (None se não houver ou se a leitura falhar)"""
+        entry = self._cache.get(conversation_id)
+        if entry is not None and entry[0] > time.monotonic():
+            self._cache.move_to_end(conversation_id)
+            return entry[1]
+        try:
+            summary = await self.store.get_conversation_summary(conversation_id)
+        except Exception as e:
+            logger.warning("Erro ao ler resumo da conversa %s: %s", conversation_id, e)
+            return None
+        self._remember(conversation_id, summary or {})
+        return summary
+
+    def recent(self, summary: Optional[Dict], history: List[Dict]) -> List[Dict]:
+        """Mensagens do histórico posteriores ao resumo"""
+        through = (summary or {}).get("summary_through")
+        if not through:
+            return history
+        through = _timestamp(through)
+        return [msg for msg in history if _timestamp(msg["created_at"]) > through]
+
+    def maybe_schedule(self, conversation_id: str, summary: Optional[Dict], history: List[Dict]) -> bool:
+        """Agenda o resumo em background se houver mensagens suficientes fora dele"""
+        pending = self.recent(summary, history)
+        if len(pending) < self.every + self.keep or conversation_id in self._tasks:
+            return False
+        fold = pending[:len(pending) - self.keep]
+        previous = (summary or {}).get("summary")
+        task = asyncio.create_task(self._summarize(conversation_id, previous, fold))
+        self._tasks[conversation_id] = task
+        task.add_done_callback(lambda _: self._tasks.pop(conversation_id, None))
+        self._counters["scheduled"] += 1
+        return True
+
+    async def _summarize(self, conversation_id: str, previous: Optional[str], messages: List[Dict]):
+        try:
+            text = await self.scheduler.submit(
+                lambda: self.rag_system.summarize(previous, messages, self.max_chars, self.num_predict, conversation_id),
+                conversation_id=conversation_id,
+                priority=PRIORITY_LOW
+            )
+        except (QueueTimeoutError, QueueFullError) as e:
+            # Fica para o próximo turno da conversa
+            self._counters["deferred"] += 1
+            logger.info("Resumo da conversa %s adiado: %s", conversation_id, e)
+            return
+        except Exception as e:
+            self._counters["failed"] += 1
+            logger.warning("Erro ao resumir conversa %s: %s", conversation_id, e)
+            return
+        if not text:
+            self._counters["failed"] += 1
+            logger.warning("Resumo vazio para a conversa %s", conversation_id)
+            return
+
+        summary = {"summary": text, "summary_through": messages[-1]["created_at"]}
+        updated = await self.store.update_conversation(
+            conversation_id, {**summary, "summary_updated_at": datetime.now(timezone.utc).isoformat()}
+        )
+        if updated is None:
+            self._counters["failed"] += 1
+            return
+        self._remember(conversation_id, summary)
+        self._counters["completed"] += 1
+        self._counters["messages_folded"] += len(messages)
+        self._summary_chars += len(text)
+        logger.info("Resumo da conversa %s atualizado (%d mensagens, %d chars)", conversation_id, len(messages), len(text))
+
+    def _remember(self, conversation_id: str, summary: Dict):
+        self._cache[conversation_id] = (time.monotonic() + self.cache_ttl, summary)
+        self._cache.move_to_end(conversation_id)
+        while len(self._cache) > self.max_cached:
+            self._cache.popitem(last=False)
+
+    async def close(self):
+        """Cancela os resumos em andamento (são refeitos no próximo turno)"""
+        tasks = list(self._tasks.values())
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        completed = self._counters["completed"]
+        return {
+            **self._counters,
+            "in_flight": len(self._tasks),
+            "cached": len(self._cache),
+            "avg_summary_chars": self._summary_chars / completed if completed else 0.0,
+        }
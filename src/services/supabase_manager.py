@@ -2,15 +2,26 @@ import os
 import uuid
 import logging
 import requests
-from models.schemas import Message
 from datetime import datetime, timezone
-from typing import List, Dict, Optional
-from supabase import create_client, Client
+from typing import List, Dict, Optional, Tuple
+from supabase import acreate_client, AsyncClient
+from postgrest.types import ReturnMethod
+from services.storage import MessageStore
+from services.conversation_cache import ConversationCache
+from services.history_cache import HistoryCache, HISTORY_COLUMNS
 
 logger = logging.getLogger(__name__)
 
-class SupabaseManager:
-    def __init__(self, url: str, key: str):
+class SupabaseManager(MessageStore):
+    """Acesso ao Supabase pelo cliente assíncrono: as consultas não bloqueiam o event loop
+    e compartilham a mesma sessão HTTP (pool de conexões) do PostgREST."""
+
+    name = "Supabase"
+
+    def __init__(self, url: str, key: str, conversation_cache: Optional[ConversationCache] = None,
+                 write_buffer_options: Optional[Dict] = None, history_cache: Optional[HistoryCache] = None,
+                 history_lookback_days: float = 0):
+        super().__init__(conversation_cache, write_buffer_options, history_cache, history_lookback_days)
         self.url = url
         self.key = key
         self._client = None
@@ -21,13 +32,13 @@ class SupabaseManager:
             return True
             
         try:
-            self._client = create_client(self.url, self.key)
+            self._client = await acreate_client(self.url, self.key)
             # Testar conexão
-            self._client.table("conversations").select("id").limit(1).execute()
+            await self._client.table("conversations").select("id").limit(1).execute()
             logger.info("Conexão com Supabase estabelecida com sucesso")
             return True
         except Exception as e:
-            logger.error(f"Erro ao conectar com Supabase: {e}")
+            logger.error("Erro ao conectar com Supabase: %s", e)
             raise ConnectionError(f"Não foi possível conectar ao Supabase: {e}")
     
     async def health_check(self) -> bool:
@@ -35,81 +46,79 @@ class SupabaseManager:
         try:
             if self._client is None:
                 return False
-            self._client.table("conversations").select("id").limit(1).execute()
+            await self._client.table("conversations").select("id").limit(1).execute()
             return True
         except Exception as e:
-            logger.error(f"Health check falhou: {e}")
+            logger.error("Health check falhou: %s", e)
             return False
     
+    async def _close(self):
+        """Fecha a sessão HTTP compartilhada"""
+        if self._client is not None:
+            await self._client.postgrest.aclose()
+            self._client = None
+
     @property
-    def supabase(self) -> Client:
+    def supabase(self) -> AsyncClient:
         """Retorna o cliente Supabase"""
         if self._client is None:
             raise ConnectionError("Supabase não foi inicializado. Chame initialize() primeiro.")
         return self._client
-    
-    async def get_or_create_conversation(self, phone_number: str, user_name: str = None) -> str:
-        try:
-            result = self.supabase.table("conversations").select("*").eq("phone_number", phone_number).order("created_at", desc=True).limit(1).execute()
-            if result.data:
-                conversation_id = result.data[0]["id"]
-                logger.info(f"Conversa existente encontrada: {conversation_id}")
-                return conversation_id
-            conversation_data = {
-                "id": str(uuid.uuid4()),
-                "phone_number": phone_number,
-                "user_name": user_name,
-                "status": "active",
-                "created_at": datetime.now(timezone.utc).isoformat(),
-                "updated_at": datetime.now(timezone.utc).isoformat()
-            }
-            result = self.supabase.table("conversations").insert(conversation_data).execute()
-            conversation_id = result.data[0]["id"]
-            logger.info(f"Nova conversa criada: {conversation_id}")
-            return conversation_id
-        except Exception as e:
-            logger.error(f"Erro ao gerenciar conversa: {e}")
-            raise ConnectionError(f"Erro ao gerenciar conversa no Supabase: {e}")
-    
-    def message_to_json(self, message: Message):
-        return {
+
+    async def _find_conversation(self, phone_number: str) -> Optional[str]:
+        result = await self.supabase.table("conversations").select("id").eq("phone_number", phone_number).order("created_at", desc=True).limit(1).execute()
+        return result.data[0]["id"] if result.data else None
+
+    async def _find_or_insert_conversation(self, phone_number: str, user_name: str = None) -> Tuple[str, bool]:
+        conversation_id = await self._find_conversation(phone_number)
+        if conversation_id is not None:
+            logger.info("Conversa existente encontrada: %s", conversation_id)
+            return conversation_id, False
+        conversation_data = {
             "id": str(uuid.uuid4()),
-            "conversation_id": message.conversation_id,
-            "platform": message.platform,
-            "sender": message.sender,
-            "receiver": message.receiver,
-            "message_type": message.message_type,
-            "external_message_id": message.id,
-            "content": message.content,
-            "metadata": message.metadata or {},
-            "direction": message.direction,
-            "created_at": datetime.now(timezone.utc).isoformat()
+            "phone_number": phone_number,
+            "user_name": user_name,
+            "status": "active",
+            "created_at": datetime.now(timezone.utc).isoformat(),
+            "updated_at": datetime.now(timezone.utc).isoformat()
         }
+        # Índice único em phone_number (migrations/0005): se outro processo criou a conversa no meio, usa a dele
+        result = await self.supabase.table("conversations").upsert(
+            conversation_data, on_conflict="phone_number", ignore_duplicates=True
+        ).execute()
+        if not result.data:
+            conversation_id = await self._find_conversation(phone_number)
+            if conversation_id is None:
+                raise RuntimeError(f"Conversa de {phone_number} não encontrada após conflito na criação")
+            logger.info("Conversa criada por outro processo: %s", conversation_id)
+            return conversation_id, False
+        conversation_id = result.data[0]["id"]
+        logger.info("Nova conversa criada: %s", conversation_id)
+        return conversation_id, True
 
-    async def save_message(self, message: Message):
-        message_data = self.message_to_json(message)
-        
-        try:
-            result = self.supabase.table("messages").insert(message_data).execute()
-            logger.info(f"Mensagem salva: {result.data[0]['id']}")
-            return result.data[0]["id"]
-        except Exception as e:
-            logger.error(f"Erro ao salvar mensagem: {e}")
-            raise ConnectionError(f"Erro ao salvar mensagem no Supabase: {e}")
-    
-    async def get_conversation_history(self, conversation_id: str, limit: int = 10) -> List[Dict]:
-        try:
-            result = self.supabase.table("messages").select("*").eq("conversation_id", conversation_id).order("created_at", desc=True).limit(limit).execute()
-            return list(reversed(result.data))
-        except Exception as e:
-            logger.error(f"Erro ao recuperar histórico: {e}")
-            raise ConnectionError(f"Erro ao recuperar histórico do Supabase: {e}")
+    async def _insert_message(self, row: Dict) -> str:
+        result = await self.supabase.table("messages").insert(row).execute()
+        return result.data[0]["id"]
+
+    async def _insert_messages(self, rows: List[Dict]):
+        await self.supabase.table("messages").insert(rows, returning=ReturnMethod.minimal).execute()
+
+    async def _fetch_history(self, conversation_id: str, limit: int, since: Optional[datetime] = None) -> List[Dict]:
+        query = self.supabase.table("messages").select(",".join(HISTORY_COLUMNS)).eq("conversation_id", conversation_id)
+        if since is not None:
+            query = query.gte("created_at", since.isoformat())
+        result = await query.order("created_at", desc=True).limit(limit).execute()
+        return list(reversed(result.data))
     
+    async def get_conversation_summary(self, conversation_id: str) -> Optional[Dict]:
+        result = await self.supabase.table("conversations").select("summary,summary_through").eq("id", conversation_id).limit(1).execute()
+        return result.data[0] if result.data else None
+
     async def update_conversation(self, conversation_id: str, updates: dict):
         try:
             updates["updated_at"] = datetime.now(timezone.utc).isoformat()
-            result = self.supabase.table("conversations").update(updates).eq("id", conversation_id).execute()
+            result = await self.supabase.table("conversations").update(updates).eq("id", conversation_id).execute()
             return result.data
         except Exception as e:
-            logger.error(f"Erro ao atualizar conversa: {e}")
+            logger.error("Erro ao atualizar conversa: %s", e)
             return None 
\ No newline at end of file
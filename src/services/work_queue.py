@@ -0,0 +1,261 @@
+import asyncio
+import json
+import logging
+import sqlite3
+import time
+import uuid
+from dataclasses import dataclass
+from typing import Dict, List, Optional
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class Job:
+    id: str
+    payload: Dict
+    attempts: int = 0
+    enqueued_at: float = 0.0
+
+class WorkQueue:
+    """Interface da fila durável de processamento de mensagens"""
+
+    async def enqueue(self, payload: Dict) -> str:
+        raise NotImplementedError
+
+    async def consume(self, consumer: str, count: int = 1, block_ms: int = 1000) -> List[Job]:
+        raise NotImplementedError
+
+    async def ack(self, job: Job):
+        raise NotImplementedError
+
+    async def retry(self, job: Job, delay: float, error: str = None):
+        raise NotImplementedError
+
+    async def dead_letter(self, job: Job, error: str):
+        raise NotImplementedError
+
+    async def stats(self) -> Dict:
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class RedisStreamQueue(WorkQueue):
+    """Fila em Redis Streams com consumer group.
+
+    - Jobs confirmados são removidos do stream (XACK + XDEL), então o stream só guarda trabalho pendente
+    - Retentativas ficam em um sorted set e voltam ao stream quando vencem
+    - Jobs de workers que morreram são recuperados com XAUTOCLAIM após `claim_idle_ms`
+    """
+
+    def __init__(self, host: str, port: int, name: str = "rag:jobs", group: str = "workers", claim_idle_ms: int = 300000):
+        import redis.asyncio as redis
+
+        self.redis = redis.Redis(host=host, port=port, decode_responses=True)
+        self.stream = name
+        self.group = group
+        self.delayed_key = f"{name}:delayed"
+        self.dead_key = f"{name}:dead"
+        self.claim_idle_ms = claim_idle_ms
+        self._group_ready = False
+
+    async def _ensure_group(self):
+        if self._group_ready:
+            return
+        try:
+            await self.redis.xgroup_create(self.stream, self.group, id="0", mkstream=True)
+        except Exception as e:
+            if "BUSYGROUP" not in str(e):
+                raise
+        self._group_ready = True
+
+    @staticmethod
+    def _fields(job: Job) -> Dict:
+        return {"payload": json.dumps(job.payload), "attempts": job.attempts, "enqueued_at": job.enqueued_at}
+
+    @staticmethod
+    def _job(entry_id: str, fields: Dict) -> Job:
+        return Job(entry_id, json.loads(fields["payload"]), int(fields.get("attempts", 0)), float(fields.get("enqueued_at", 0)))
+
+    async def enqueue(self, payload: Dict) -> str:
+        await self._ensure_group()
+        job = Job("", payload, 0, time.time())
+        return await self.redis.xadd(self.stream, self._fields(job))
+
+    async def _promote_delayed(self):
+        """Move para o stream as retentativas cujo horário já chegou"""
+        due = await self.redis.zrangebyscore(self.delayed_key, 0, time.time(), start=0, num=100)
+        for raw in due:
+            if await self.redis.zrem(self.delayed_key, raw):
+                await self.redis.xadd(self.stream, json.loads(raw))
+
+    async def consume(self, consumer: str, count: int = 1, block_ms: int = 1000) -> List[Job]:
+        await self._ensure_group()
+        await self._promote_delayed()
+
+        # Redis 6.2 devolve [cursor, entradas]; Redis 7 acrescenta os ids removidos
+        claimed = (await self.redis.xautoclaim(
+            self.stream, self.group, consumer, min_idle_time=self.claim_idle_ms, start_id="0-0", count=count
+        ))[1]
+        if claimed:
+            return [self._job(entry_id, fields) for entry_id, fields in claimed if fields]
+
+        response = await self.redis.xreadgroup(self.group, consumer, {self.stream: ">"}, count=count, block=block_ms)
+        return [self._job(entry_id, fields) for _, entries in response for entry_id, fields in entries]
+
+    async def ack(self, job: Job):
+        async with self.redis.pipeline(transaction=True) as pipe:
+            pipe.xack(self.stream, self.group, job.id)
+            pipe.xdel(self.stream, job.id)
+            await pipe.execute()
+
+    async def retry(self, job: Job, delay: float, error: str = None):
+        retried = Job(job.id, job.payload, job.attempts + 1, job.enqueued_at)
+        await self.redis.zadd(self.delayed_key, {json.dumps(self._fields(retried)): time.time() + delay})
+        await self.ack(job)
+
+    async def dead_letter(self, job: Job, error: str):
+        entry = {**self._fields(job), "error": error, "failed_at": time.time()}
+        await self.redis.rpush(self.dead_key, json.dumps(entry))
+        await self.ack(job)
+
+    async def stats(self) -> Dict:
+        await self._ensure_group()
+        depth = await self.redis.xlen(self.stream)
+        pending = await self.redis.xpending(self.stream, self.group)
+        oldest = await self.redis.xrange(self.stream, count=1)
+        lag_seconds = 0.0
+        if oldest:
+            lag_seconds = max(0.0, time.time() - float(oldest[0][1].get("enqueued_at", time.time())))
+        return {
+            "backend": "redis",
+            "depth": max(0, depth - pending["pending"]),
+            "in_progress": pending["pending"],
+            "delayed": await self.redis.zcard(self.delayed_key),
+            "dead_letters": await self.redis.llen(self.dead_key),
+            "lag_seconds": lag_seconds,
+        }
+
+    async def close(self):
+        await self.redis.aclose()
+
+class SQLiteQueue(WorkQueue):
+    """Fila em SQLite com a mesma semântica da RedisStreamQueue, para testes e uso local"""
+
+    def __init__(self, path: str = "work_queue.db", visibility_timeout: float = 300.0):
+        self.path = path
+        self.visibility_timeout = visibility_timeout
+        self._conn = sqlite3.connect(path, check_same_thread=False, isolation_level=None)
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("""
+            CREATE TABLE IF NOT EXISTS jobs (
+                id TEXT PRIMARY KEY,
+                payload TEXT NOT NULL,
+                attempts INTEGER NOT NULL DEFAULT 0,
+                enqueued_at REAL NOT NULL,
+                available_at REAL NOT NULL,
+                locked_by TEXT,
+                locked_until REAL,
+                status TEXT NOT NULL DEFAULT 'ready',
+                error TEXT
+            )
+        """)
+        self._conn.execute("CREATE INDEX IF NOT EXISTS idx_jobs_ready ON jobs(status, available_at)")
+        self._lock = asyncio.Lock()
+
+    async def _run(self, fn, *args):
+        async with self._lock:
+            return await asyncio.to_thread(fn, *args)
+
+    async def enqueue(self, payload: Dict) -> str:
+        job_id = str(uuid.uuid4())
+        now = time.time()
+        await self._run(
+            self._conn.execute,
+            "INSERT INTO jobs (id, payload, enqueued_at, available_at) VALUES (?, ?, ?, ?)",
+            (job_id, json.dumps(payload), now, now),
+        )
+        return job_id
+
+    def _claim(self, consumer: str, count: int) -> List[Job]:
+        now = time.time()
+        cur = self._conn.cursor()
+        cur.execute("BEGIN IMMEDIATE")
+        try:
+            rows = cur.execute(
+                """SELECT id, payload, attempts, enqueued_at FROM jobs
+                   WHERE status = 'ready' AND available_at <= ? AND (locked_until IS NULL OR locked_until < ?)
+                   ORDER BY available_at LIMIT ?""",
+                (now, now, count),
+            ).fetchall()
+            cur.executemany(
+                "UPDATE jobs SET locked_by = ?, locked_until = ? WHERE id = ?",
+                [(consumer, now + self.visibility_timeout, row[0]) for row in rows],
+            )
+            cur.execute("COMMIT")
+        except Exception:
+            cur.execute("ROLLBACK")
+            raise
+        return [Job(row[0], json.loads(row[1]), row[2], row[3]) for row in rows]
+
+    async def consume(self, consumer: str, count: int = 1, block_ms: int = 1000) -> List[Job]:
+        deadline = time.monotonic() + block_ms / 1000
+        while True:
+            jobs = await self._run(self._claim, consumer, count)
+            if jobs or time.monotonic() >= deadline:
+                return jobs
+            await asyncio.sleep(min(0.1, block_ms / 1000))
+
+    async def ack(self, job: Job):
+        await self._run(self._conn.execute, "DELETE FROM jobs WHERE id = ?", (job.id,))
+
+    async def retry(self, job: Job, delay: float, error: str = None):
+        await self._run(
+            self._conn.execute,
+            "UPDATE jobs SET attempts = attempts + 1, available_at = ?, locked_by = NULL, locked_until = NULL, error = ? WHERE id = ?",
+            (time.time() + delay, error, job.id),
+        )
+
+    async def dead_letter(self, job: Job, error: str):
+        await self._run(
+            self._conn.execute,
+            "UPDATE jobs SET status = 'dead', locked_by = NULL, locked_until = NULL, error = ? WHERE id = ?",
+            (error, job.id),
+        )
+
+    def _stats(self) -> Dict:
+        now = time.time()
+        row = self._conn.execute(
+            """SELECT
+                 SUM(status = 'ready' AND available_at <= ? AND (locked_until IS NULL OR locked_until < ?)),
+                 SUM(status = 'ready' AND locked_until >= ?),
+                 SUM(status = 'ready' AND available_at > ? AND (locked_until IS NULL OR locked_until < ?)),
+                 SUM(status = 'dead'),
+                 MIN(CASE WHEN status = 'ready' THEN enqueued_at END)
+               FROM jobs""",
+            (now, now, now, now, now),
+        ).fetchone()
+        return {
+            "backend": "sqlite",
+            "depth": row[0] or 0,
+            "in_progress": row[1] or 0,
+            "delayed": row[2] or 0,
+            "dead_letters": row[3] or 0,
+            "lag_seconds": max(0.0, now - row[4]) if row[4] else 0.0,
+        }
+
+    async def stats(self) -> Dict:
+        return await self._run(self._stats)
+
+    async def close(self):
+        self._conn.close()
+
+def create_work_queue(backend: str, **options) -> Optional[WorkQueue]:
+    """Cria a fila configurada ('redis', 'sqlite') ou None para processar no próprio servidor"""
+    if not backend:
+        return None
+    if backend == "redis":
+        return RedisStreamQueue(options["redis_host"], options["redis_port"], name=options.get("name", "rag:jobs"))
+    if backend == "sqlite":
+        return SQLiteQueue(options.get("sqlite_path", "work_queue.db"))
+    raise ValueError(f"WORK_QUEUE_BACKEND inválido: {backend}")
@@ -1,13 +1,16 @@
 import httpx
 import logging
+from typing import Dict, Optional
 from models.schemas import Message
+from services.outbound import OutboundDispatcher
 
 logger = logging.getLogger(__name__)
 
 class WtsAPIService:
-    def __init__(self, token: str = None):
-        self.api_url = 'https://api.wts.chat'
+    def __init__(self, token: str = None, api_url: str = 'https://api.wts.chat', dispatcher_options: Optional[Dict] = None):
+        self.api_url = api_url.rstrip('/')
         self.api_token = token
+        self._client: Optional[httpx.AsyncClient] = None
         
         if not self.api_token:
             logger.error("WTS_API_TOKEN não encontrado nas variáveis de ambiente!")
@@ -18,6 +21,20 @@ class WtsAPIService:
             "content-type": "application/*+json",
             "Authorization": f"Bearer {self.api_token}"
         }
+        # Envios com limite por canal, retentativas e dead-letter (None envia direto, uma tentativa)
+        self.dispatcher = OutboundDispatcher(self._post_message, **dispatcher_options) if dispatcher_options is not None else None
+
+    @property
+    def client(self) -> httpx.AsyncClient:
+        """Cliente HTTP compartilhado pelos envios (reaproveita as conexões com o WTS)"""
+        if self._client is None:
+            self._client = httpx.AsyncClient(timeout=30.0, headers=self.headers)
+        return self._client
+
+    async def close(self):
+        if self._client is not None:
+            await self._client.aclose()
+            self._client = None
     
     async def test_connection(self) -> bool:
         """Testa a conexão com a API WTS"""
@@ -30,7 +47,7 @@ class WtsAPIService:
                 response = await client.get(url, headers=self.headers)
                 
                 if response.status_code != 200:
-                    logger.error(f"❌ Erro ao testar WTS API: {response.status_code} - {response.text}")
+                    logger.error("❌ Erro ao testar WTS API: %s - %s", response.status_code, response.text)
                     return False
 
                 agents = response.json()
@@ -38,20 +55,22 @@ class WtsAPIService:
                     logger.warning("⚠️ Nenhum agente encontrado na WTS API")
                     return False
                 
-                logger.info(f"✅ WTS API conectada! Agentes encontrados: {len(agents)}")
+                logger.info("✅ WTS API conectada! Agentes encontrados: %s", len(agents))
                 return True
                 
         except Exception as e:
-            logger.error(f"❌ Erro ao conectar com WTS API: {e}")
+            logger.error("❌ Erro ao conectar com WTS API: %s", e)
             return False
     
+    async def health_check(self) -> bool:
+        """Verificação leve da API (agentes cadastrados) usando o cliente compartilhado"""
+        response = await self.client.get(f"{self.api_url}/core/v1/agent")
+        if response.status_code != 200:
+            raise RuntimeError(f"HTTP {response.status_code}")
+        return len(response.json()) > 0
+
     async def send_message(self, message: Message) -> bool:
         try:
-            logger.info(f"📤 Enviando mensagem via WTS API...")
-            logger.info(f"📞 Para (original): {message.receiver}")
-            logger.info(f"📞 De (original): {message.sender}")
-            logger.info(f"💬 Conteúdo: {message.content}")
-            
             # Formatar números de telefone para o formato esperado pela WTS API
             to_number = message.receiver
             from_number = message.sender
@@ -67,30 +86,31 @@ class WtsAPIService:
                 "to": to_number,
                 "from": from_number
             }
-            
-            logger.info(f"📞 Para (formatado): {to_number}")
-            logger.info(f"📞 De (formatado): {from_number}")
 
             if message.metadata:
                 payload["metadata"] = message.metadata
 
-            logger.info(f"📦 Payload: {payload}")
+            logger.debug("📦 Payload WTS: %s", payload)
 
-            async with httpx.AsyncClient(timeout=30.0) as client:
-                url = f"{self.api_url}/chat/v1/message/send"
-                response = await client.post(url, json=payload, headers=self.headers)
-                
-            logger.info(f"📡 Response status: {response.status_code}")
-            logger.info(f"📡 Response text: {response.text}")
-                
+            if self.dispatcher is not None:
+                sent = await self.dispatcher.send(message.sender, payload)
+                if sent:
+                    logger.info("✅ WTS: mensagem enviada para %s", to_number)
+                return sent
+
+            response = await self._post_message(payload)
             if response.status_code == 200:
-                logger.info(f"✅ WTS: mensagem enviada com sucesso")
+                logger.info("✅ WTS: mensagem enviada para %s", to_number)
                 return True
             else:
-                logger.error(f"❌ WTS: erro ao enviar mensagem: {response.status_code} - {response.text}")
+                logger.error("❌ WTS: erro ao enviar mensagem: %s - %s", response.status_code, response.text)
                 return False
         except Exception as e:
-            logger.error(f"❌ WTS: erro ao enviar mensagem: {e}")
-            import traceback
-            logger.error(f"📋 Traceback: {traceback.format_exc()}")
-            return False
\ No newline at end of file
+            logger.exception("❌ WTS: erro ao enviar mensagem: %s", e)
+            return False
+
+    async def _post_message(self, payload: Dict) -> httpx.Response:
+        response = await self.client.post(f"{self.api_url}/chat/v1/message/send", json=payload)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("📡 Resposta WTS %s: %s", response.status_code, response.text)
+        return response
@@ -0,0 +1,168 @@
+"""
+Worker da fila de processamento de mensagens
+
+Consome os jobs enfileirados pelo webhook (WORK_QUEUE_BACKEND=redis|sqlite),
+processa com concorrência limitada, confirma (ack) ao terminar, agenda
+retentativas com backoff exponencial e move para a dead-letter após
+WORKER_MAX_ATTEMPTS tentativas.
+
+Uso:
+    python src/worker.py
+"""
+import asyncio
+import logging
+import os
+import random
+import signal
+import socket
+from prometheus_client import start_http_server
+from models.schemas import Message
+from services.message_coalescer import MessageCoalescer, track_turn
+from services.work_queue import Job, WorkQueue
+from controllers.messages import process_message
+from logging_config import setup_logging, shutdown_logging
+from config import (
+    get_supabase_manager,
+    get_rag_system,
+    get_external_api,
+    get_work_queue,
+    get_summarizer,
+    validate_env,
+    COALESCE_WINDOW,
+    WORKER_CONCURRENCY,
+    WORKER_MAX_ATTEMPTS,
+    WORKER_RETRY_BASE_DELAY,
+    WORKER_METRICS_PORT,
+    LOG_LEVEL,
+    LOG_FORMAT,
+    LOG_LEVELS,
+    LOG_SAMPLE_RATES,
+    LOG_QUEUE_SIZE
+)
+
+logger = logging.getLogger(__name__)
+
+class Worker:
+    def __init__(self, queue: WorkQueue, concurrency: int, max_attempts: int, retry_base_delay: float,
+                 coalesce_window: float = 0.0):
+        self.queue = queue
+        self.concurrency = concurrency
+        self.max_attempts = max_attempts
+        self.retry_base_delay = retry_base_delay
+        self.name = f"{socket.gethostname()}-{os.getpid()}"
+        self.coalescer = MessageCoalescer(process_message, window=coalesce_window) if coalesce_window > 0 else None
+        self._slots = asyncio.Semaphore(concurrency)
+        self._tasks = set()
+        self._stopping = asyncio.Event()
+
+    def stop(self):
+        self._stopping.set()
+
+    async def run(self):
+        logger.info("👷 Worker %s consumindo com concorrência %d", self.name, self.concurrency,
+                    extra={"event": "worker.started"})
+        while not self._stopping.is_set():
+            await self._slots.acquire()
+            try:
+                jobs = await self.queue.consume(self.name, count=1, block_ms=1000)
+            except Exception as e:
+                self._slots.release()
+                logger.error("❌ Erro ao consumir fila: %s", e, extra={"event": "worker.consume_error"})
+                await asyncio.sleep(1)
+                continue
+            if not jobs:
+                self._slots.release()
+                continue
+            task = asyncio.create_task(self._handle(jobs[0]))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+
+        # Desligamento: termina o que está em andamento; o resto continua na fila
+        if self._tasks:
+            logger.info("⏳ Aguardando %d job(s) em andamento...", len(self._tasks), extra={"event": "worker.draining"})
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    async def _handle(self, job: Job):
+        try:
+            message = Message(**job.payload["message"])
+            conversation_id = job.payload["conversation_id"]
+            if self.coalescer is not None:
+                # O future já resolve com True quando a resposta do turno saiu
+                ok = await self.coalescer.submit(message, conversation_id, job.payload.get("aggregated_text"))
+            else:
+                turn = track_turn([message])
+                try:
+                    ok = await process_message(message, conversation_id)
+                except Exception:
+                    if not turn.replied:
+                        raise
+                    ok = False
+                if ok is False and turn.replied:
+                    # A resposta já foi enviada: repetir o job mandaria outra ao contato
+                    logger.warning("Job %s falhou depois de enviar a resposta; confirmando sem nova tentativa", job.id,
+                                   extra={"event": "worker.ack_after_reply", "job_id": job.id, "conversation_id": conversation_id})
+                    ok = True
+            if ok is False:
+                raise RuntimeError("processamento da mensagem falhou")
+            await self.queue.ack(job)
+        except Exception as e:
+            await self._fail(job, e)
+        finally:
+            self._slots.release()
+
+    async def _fail(self, job: Job, error: Exception):
+        attempts = job.attempts + 1
+        log_extra = {"job_id": job.id, "conversation_id": job.payload.get("conversation_id"), "attempts": attempts}
+        try:
+            if attempts >= self.max_attempts:
+                logger.error("💀 Job %s movido para dead-letter após %d tentativas: %s", job.id, attempts, error,
+                             extra={"event": "worker.dead_letter", **log_extra})
+                await self.queue.dead_letter(job, str(error))
+            else:
+                delay = self.retry_base_delay * (2 ** job.attempts) * random.uniform(0.8, 1.2)
+                logger.warning("🔁 Job %s falhou (%s); nova tentativa em %.1fs", job.id, error, delay,
+                               extra={"event": "worker.retry", **log_extra})
+                await self.queue.retry(job, delay, str(error))
+        except Exception as e:
+            # Sem ack o job volta a ser entregue após o timeout de visibilidade
+            logger.error("❌ Erro ao reagendar job %s: %s", job.id, e, extra={"event": "worker.reschedule_error", **log_extra})
+
+async def main():
+    setup_logging(LOG_LEVEL, LOG_FORMAT, LOG_LEVELS, LOG_SAMPLE_RATES, LOG_QUEUE_SIZE)
+    validate_env()
+    queue = get_work_queue()
+    if queue is None:
+        raise SystemExit("WORK_QUEUE_BACKEND não configurado: o processamento acontece no próprio servidor")
+
+    if WORKER_METRICS_PORT:
+        # Histogramas por etapa e contadores deste processo (o /metrics do servidor só enxerga o dele)
+        try:
+            start_http_server(WORKER_METRICS_PORT)
+            logger.info("📈 Métricas do worker em :%d/metrics", WORKER_METRICS_PORT)
+        except OSError as e:
+            logger.warning("Não foi possível expor as métricas na porta %d: %s", WORKER_METRICS_PORT, e,
+                           extra={"event": "worker.metrics_error"})
+
+    await get_supabase_manager().initialize()
+    if not await get_rag_system().initialize_qdrant():
+        raise SystemExit("Não foi possível inicializar o Qdrant")
+
+    worker = Worker(queue, WORKER_CONCURRENCY, WORKER_MAX_ATTEMPTS, WORKER_RETRY_BASE_DELAY, COALESCE_WINDOW)
+    loop = asyncio.get_running_loop()
+    for sig in (signal.SIGINT, signal.SIGTERM):
+        loop.add_signal_handler(sig, worker.stop)
+
+    try:
+        await worker.run()
+    finally:
+        if get_summarizer() is not None:
+            await get_summarizer().close()
+        await get_rag_system().ollama_pool.close()
+        await get_external_api().close()
+        await get_supabase_manager().close()
+        await queue.close()
+        logger.info("✅ Worker desligado!", extra={"event": "worker.stopped"})
+        shutdown_logging()
+
+if __name__ == "__main__":
+    asyncio.run(main())
@@ -0,0 +1,61 @@
+"""
+Configuração dos testes: `src` e `benchmarks` (stubs das APIs externas) no path.
+
+Os testes de Postgres criam um banco descartável no servidor de TEST_DATABASE_URL
+(ex: postgresql://postgres@localhost/postgres) e são pulados sem ela.
+"""
+import asyncio
+import os
+import socket
+import sys
+import uuid
+from urllib.parse import urlsplit, urlunsplit
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, os.path.join(ROOT, "src"))
+sys.path.insert(0, os.path.join(ROOT, "benchmarks"))
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+@pytest.fixture
+def postgres_dsn():
+    """Banco descartável com as migrações aplicadas, no servidor de TEST_DATABASE_URL (sem ela, pula o teste)"""
+    base = os.getenv("TEST_DATABASE_URL")
+    if not base:
+        pytest.skip("TEST_DATABASE_URL não configurado")
+    import asyncpg
+    from services.migrations import MigrationRunner
+
+    name = f"rag_test_{uuid.uuid4().hex[:8]}"
+    parts = urlsplit(base)
+    dsn = urlunsplit(parts._replace(path=f"/{name}"))
+
+    async def create():
+        admin = await asyncpg.connect(base)
+        try:
+            await admin.execute(f'CREATE DATABASE "{name}"')
+        finally:
+            await admin.close()
+        connection = await asyncpg.connect(dsn)
+        try:
+            await MigrationRunner(connection).migrate()
+        finally:
+            await connection.close()
+
+    async def drop():
+        admin = await asyncpg.connect(base)
+        try:
+            await admin.execute(f'DROP DATABASE IF EXISTS "{name}" WITH (FORCE)')
+        finally:
+            await admin.close()
+
+    asyncio.run(create())
+    try:
+        yield dsn
+    finally:
+        asyncio.run(drop())
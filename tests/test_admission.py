@@ -0,0 +1,85 @@
+import asyncio
+
+import pytest
+
+from models.schemas import Message
+from services.admission import AdmissionController
+from services.llm_scheduler import LLMScheduler
+from services.message_coalescer import MessageCoalescer
+
+class FakeQueue:
+    def __init__(self, depth: int):
+        self.depth = depth
+        self.reads = 0
+
+    async def stats(self):
+        self.reads += 1
+        return {"depth": self.depth}
+
+def test_sheds_once_the_backlog_reaches_the_limit():
+    scheduler = LLMScheduler(max_in_flight=1)
+
+    async def scenario():
+        admission = AdmissionController(scheduler, max_backlog=2)
+        release = asyncio.Event()
+        decisions = [await admission.check()]
+        # Uma geração em andamento e uma na fila: backlog 2
+        tasks = [asyncio.create_task(scheduler.submit(release.wait, f"c{i}")) for i in range(2)]
+        await asyncio.sleep(0)
+        decisions.append(await admission.check())
+        release.set()
+        await asyncio.gather(*tasks)
+        decisions.append(await admission.check())
+        return decisions, admission.stats()
+
+    decisions, stats = asyncio.run(scenario())
+    assert decisions == [None, "backlog", None]
+    assert (stats["admitted"], stats["shed"], stats["shed_reasons"]) == (2, 1, {"backlog": 1})
+
+def test_backlog_counts_messages_waiting_in_the_coalescer():
+    async def handler(message, conversation_id):
+        return True
+
+    async def scenario():
+        coalescer = MessageCoalescer(handler, window=60)
+        admission = AdmissionController(LLMScheduler(), message_coalescer=coalescer, max_backlog=2)
+        for i in range(2):
+            coalescer.submit(Message(id=str(i), conversation_id="c1", platform="whatsapp", sender="5511",
+                                     receiver="bot", content="oi", message_type="text", direction="incoming"), "c1")
+        reason = await admission.check()
+        for state in coalescer._conversations.values():
+            state.timer.cancel()
+        return admission.backlog(), reason
+
+    assert asyncio.run(scenario()) == (2, "backlog")
+
+def test_work_queue_depth_is_cached_for_depth_ttl():
+    queue = FakeQueue(depth=5)
+
+    async def scenario():
+        admission = AdmissionController(LLMScheduler(), work_queue=queue, max_queue_depth=5, depth_ttl=60)
+        first = await admission.check()
+        queue.depth = 0
+        # Dentro do depth_ttl: usa a profundidade lida antes, sem consultar a fila
+        second = await admission.check()
+        return first, second
+
+    assert asyncio.run(scenario()) == ("queue_depth", "queue_depth")
+    assert queue.reads == 1
+
+def test_disabled_without_limits():
+    admission = AdmissionController(LLMScheduler(), max_queue_depth=10)
+    # Limite de fila sem fila de trabalho não liga o controle
+    assert not admission.enabled
+
+def test_busy_reply_respects_the_cooldown():
+    admission = AdmissionController(LLMScheduler(), max_backlog=1, mode="busy_reply",
+                                    busy_message="Estamos ocupados", busy_reply_cooldown=60)
+    assert admission.claim_busy_reply("c1") is True
+    assert admission.claim_busy_reply("c1") is False
+    assert admission.claim_busy_reply("c2") is True
+    assert admission.stats()["busy_replies"] == 2
+
+def test_unknown_mode_is_rejected():
+    with pytest.raises(ValueError):
+        AdmissionController(LLMScheduler(), mode="drop")
@@ -0,0 +1,74 @@
+import asyncio
+import time
+import uuid
+
+from services.conversation_cache import ConversationCache
+from services.storage import MessageStore
+
+class FakeStore(MessageStore):
+    """Backend em memória sem índice único: duas criações simultâneas gerariam duas conversas"""
+
+    def __init__(self, conversation_cache=None):
+        super().__init__(conversation_cache)
+        self.conversations = []
+        self.selects = 0
+
+    async def _find_or_insert_conversation(self, phone_number, user_name=None):
+        self.selects += 1
+        existing = [cid for phone, cid in self.conversations if phone == phone_number]
+        await asyncio.sleep(0.02)  # ida ao banco: outra requisição pode chegar no meio
+        if existing:
+            return existing[-1], False
+        conversation_id = str(uuid.uuid4())
+        self.conversations.append((phone_number, conversation_id))
+        return conversation_id, True
+
+def test_concurrent_first_messages_create_one_conversation():
+    cache = ConversationCache()
+    store = FakeStore(cache)
+
+    async def scenario():
+        return await asyncio.gather(*(store.get_or_create_conversation("5511") for _ in range(10)))
+
+    ids = asyncio.run(scenario())
+    assert len(set(ids)) == 1
+    assert len(store.conversations) == 1
+    # Só a primeira foi ao banco; as outras esperaram a criação e leram do cache
+    assert store.selects == 1
+    stats = cache.stats()
+    assert (stats["misses"], stats["coalesced"], stats["created"]) == (10, 9, 1)
+    assert cache._locks == {}
+
+def test_without_the_cache_the_race_creates_duplicates():
+    store = FakeStore()
+
+    async def scenario():
+        return await asyncio.gather(*(store.get_or_create_conversation("5511") for _ in range(3)))
+
+    asyncio.run(scenario())
+    assert len(store.conversations) == 3
+
+def test_hits_skip_the_database():
+    cache = ConversationCache()
+    store = FakeStore(cache)
+
+    async def scenario():
+        first = await store.get_or_create_conversation("5511")
+        return first, [await store.get_or_create_conversation("5511") for _ in range(3)]
+
+    first, hits = asyncio.run(scenario())
+    assert hits == [first] * 3
+    assert store.selects == 1
+    assert cache.stats()["hits"] == 3
+
+def test_entries_expire_and_leave_by_lru():
+    async def scenario():
+        cache = ConversationCache(ttl=0.05, max_entries=2)
+        for phone in ("a", "b", "c"):
+            await cache.set(phone, f"conv-{phone}")
+        evicted = await cache.get("a")
+        kept = await cache.get("c")
+        time.sleep(0.06)
+        return evicted, kept, await cache.get("c")
+
+    assert asyncio.run(scenario()) == (None, "conv-c", None)
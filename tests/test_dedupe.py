@@ -0,0 +1,58 @@
+import asyncio
+import time
+
+from services.dedupe import IN_PROGRESS_ACK, WebhookDeduplicator
+
+ACK = {"status": "success", "message": "Mensagem adicionada para processamento em background"}
+
+def test_retry_gets_the_original_ack():
+    async def scenario():
+        dedupe = WebhookDeduplicator(ttl=60)
+        first = await dedupe.claim("m1")
+        during = await dedupe.claim("m1")
+        await dedupe.complete("m1", ACK)
+        return first, during, await dedupe.claim("m1"), dedupe.stats()
+
+    first, during, after, stats = asyncio.run(scenario())
+    assert first is None
+    # Reenvio durante o recebimento do original: não processa de novo
+    assert during == IN_PROGRESS_ACK
+    assert after == ACK
+    assert (stats["received"], stats["duplicates"]) == (3, 2)
+
+def test_released_id_is_processed_again():
+    async def scenario():
+        dedupe = WebhookDeduplicator(ttl=60)
+        await dedupe.claim("m1")
+        await dedupe.release("m1")
+        return await dedupe.claim("m1")
+
+    assert asyncio.run(scenario()) is None
+
+def test_ids_expire_after_the_ttl():
+    async def scenario():
+        dedupe = WebhookDeduplicator(ttl=0.05)
+        await dedupe.claim("m1")
+        await dedupe.complete("m1", ACK)
+        time.sleep(0.06)
+        again = await dedupe.claim("m1")
+        # A entrada vencida de m1 é limpa quando outro ID chega
+        time.sleep(0.06)
+        await dedupe.claim("m2")
+        return again, dedupe.stats()["entries"]
+
+    again, entries = asyncio.run(scenario())
+    assert again is None
+    assert entries == 1
+
+def test_oldest_ids_leave_past_max_entries():
+    async def scenario():
+        dedupe = WebhookDeduplicator(ttl=60, max_entries=2)
+        for message_id in ("m1", "m2", "m3"):
+            await dedupe.claim(message_id)
+        return await dedupe.claim("m1"), await dedupe.claim("m3"), dedupe.stats()["entries"]
+
+    oldest, newest, entries = asyncio.run(scenario())
+    assert oldest is None
+    assert newest == IN_PROGRESS_ACK
+    assert entries == 2
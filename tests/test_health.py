@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from services.health import HealthProber
+
+def counting_probe(results):
+    """Probe que devolve os valores de `results` em sequência (o último se repete) e conta as chamadas"""
+    calls = []
+
+    async def probe():
+        calls.append(time.monotonic())
+        value = results[min(len(calls), len(results)) - 1]
+        if isinstance(value, Exception):
+            raise value
+        return value
+
+    return probe, calls
+
+def test_start_fills_the_snapshot_and_loops_refresh_it():
+    fast, fast_calls = counting_probe([True])
+    slow, slow_calls = counting_probe([True])
+
+    async def scenario():
+        prober = HealthProber({"fast": fast, "slow": slow}, interval=0.05, intervals={"slow": 10})
+        await prober.start()
+        first = prober.snapshot()
+        await asyncio.sleep(0.18)
+        await prober.close()
+        return first
+
+    first = asyncio.run(scenario())
+    assert first["fast"]["healthy"] and first["slow"]["healthy"]
+    # Cada dependência no próprio intervalo
+    assert len(fast_calls) >= 3
+    assert len(slow_calls) == 1
+
+def test_failures_timeouts_and_recovery():
+    flaky, _ = counting_probe([RuntimeError("conexão recusada"), False, True])
+
+    async def hangs():
+        await asyncio.sleep(1)
+        return True
+
+    async def scenario():
+        prober = HealthProber({"flaky": flaky, "hangs": hangs}, timeout=0.05)
+        results = [await prober.check("flaky") for _ in range(3)]
+        return results, await prober.check("hangs"), prober.stats()
+
+    results, hung, stats = asyncio.run(scenario())
+    assert [r["healthy"] for r in results] == [False, False, True]
+    assert [r["consecutive_failures"] for r in results] == [1, 2, 0]
+    assert results[0]["error"] == "conexão recusada"
+    assert hung["healthy"] is False and hung["error"] == "Timeout após 0.05s"
+    assert (stats["probes"], stats["failures"]) == (4, 3)
+
+def test_old_result_counts_as_unhealthy():
+    probe, _ = counting_probe([True])
+
+    async def scenario():
+        prober = HealthProber({"db": probe}, interval=0.02, timeout=0.01)
+        await prober.start()
+        # Sem os loops (ex: event loop travado) o resultado envelhece
+        await prober.close()
+        fresh = prober.snapshot()["db"]
+        await asyncio.sleep(3 * 0.02 + 0.01 + 0.03)
+        return fresh, prober.snapshot()["db"]
+
+    fresh, old = asyncio.run(scenario())
+    assert fresh["healthy"] and not fresh["stale"]
+    assert old["stale"] and not old["healthy"]
+
+def test_unchecked_dependency_is_none():
+    probe, _ = counting_probe([True])
+    prober = HealthProber({"db": probe})
+    assert prober.snapshot() == {"db": None}
+    assert prober.stats()["db_healthy"] is False
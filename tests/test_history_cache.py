@@ -0,0 +1,70 @@
+import time
+
+from services.history_cache import HistoryCache
+
+def row(i: int) -> dict:
+    return {"id": f"m{i}", "direction": "incoming", "content": f"mensagem {i}",
+            "created_at": f"2024-01-01T00:00:{i:02d}+00:00", "platform": "whatsapp"}
+
+def ids(rows) -> list:
+    return [r["id"] for r in rows] if rows is not None else None
+
+def test_write_during_a_load_is_not_lost():
+    cache = HistoryCache(max_messages=10)
+    cache.begin_load("c1")
+    # Salva enquanto a consulta está em andamento: o resultado do banco não tem m3
+    cache.append("c1", row(3))
+    cache.load("c1", [row(1), row(2)], limit=10)
+
+    assert ids(cache.get("c1", 10)) == ["m1", "m2", "m3"]
+    assert cache._loading == {}
+
+def test_write_already_in_the_load_result_is_not_duplicated():
+    cache = HistoryCache(max_messages=10)
+    cache.begin_load("c1")
+    cache.append("c1", row(2))
+    cache.load("c1", [row(1), row(2)], limit=10)
+
+    assert ids(cache.get("c1", 10)) == ["m1", "m2"]
+
+def test_aborted_load_stops_tracking_writes():
+    cache = HistoryCache(max_messages=10)
+    cache.begin_load("c1")
+    cache.abort_load("c1")
+    cache.append("c1", row(1))
+
+    assert cache._loading == {}
+    assert cache.get("c1", 5) is None
+
+def test_short_history_is_complete_and_a_full_page_is_not():
+    cache = HistoryCache(max_messages=5)
+    # Menos linhas que o limite: não há mais nada no banco, serve qualquer pedido
+    cache.load("short", [row(1)], limit=3)
+    # Página cheia: o banco pode ter mensagens mais antigas
+    cache.load("full", [row(1), row(2), row(3)], limit=3)
+
+    assert ids(cache.get("short", 5)) == ["m1"]
+    assert ids(cache.get("full", 3)) == ["m1", "m2", "m3"]
+    assert cache.get("full", 5) is None
+
+def test_full_buffer_marks_the_history_incomplete():
+    cache = HistoryCache(max_messages=3)
+    cache.load("c1", [row(1)], limit=3)
+    for i in (2, 3):
+        cache.append("c1", row(i))
+    assert cache._conversations["c1"].complete
+
+    # A mais antiga sai do buffer: daqui em diante ele não representa mais a conversa inteira
+    cache.append("c1", row(4))
+    assert not cache._conversations["c1"].complete
+    assert ids(cache.get("c1", 3)) == ["m2", "m3", "m4"]
+
+def test_entries_expire_after_the_ttl():
+    cache = HistoryCache(max_messages=10, ttl=0.05)
+    cache.load("c1", [row(1)], limit=10)
+    assert ids(cache.get("c1", 5)) == ["m1"]
+    time.sleep(0.06)
+
+    assert cache.get("c1", 5) is None
+    assert cache.stats()["conversations"] == 0
+    assert (cache.stats()["hits"], cache.stats()["misses"]) == (1, 1)
@@ -0,0 +1,24 @@
+import pytest
+
+from services.intent_router import IntentRouter
+
+class FakeRAG:
+    def embed_query(self, text):
+        return [1.0, 0.0]
+
+@pytest.mark.parametrize("message", ["👍", "🙏🏽", "❤️", "👨‍👩‍👧", "🇧🇷", "1️⃣", " 😂😂 "])
+def test_emoji_messages_take_the_fast_path(message):
+    decision = IntentRouter(FakeRAG(), []).route(message)
+
+    assert decision.intent == "emoji"
+    assert decision.reply is None
+
+@pytest.mark.parametrize("message", ["?", "...", "??!", "ok 👍", "1", "  "])
+def test_punctuation_and_text_go_to_rag(message):
+    router = IntentRouter(FakeRAG(), [])
+
+    assert router.route(message).intent is None
+    assert router.stats()["decisions"] == {"rag": 1}
+
+def test_emoji_only_can_be_disabled():
+    assert IntentRouter(FakeRAG(), [], emoji_only=False).route("👍").intent is None
@@ -0,0 +1,108 @@
+import asyncio
+
+import pytest
+
+from services.llm_scheduler import (
+    PRIORITY_HIGH, PRIORITY_LOW, PRIORITY_NORMAL, LLMScheduler, QueueFullError, QueueTimeoutError,
+)
+
+def run_in_order(scheduler: LLMScheduler, submissions):
+    """Ocupa a única vaga, enfileira `submissions` (conversa, prioridade) e retorna a ordem de execução"""
+    order = []
+
+    async def scenario():
+        release = asyncio.Event()
+        blocker = asyncio.create_task(scheduler.submit(release.wait, "blocker"))
+        await asyncio.sleep(0)
+
+        def job(label):
+            async def func():
+                order.append(label)
+            return func
+
+        tasks = [asyncio.create_task(scheduler.submit(job(f"{conv}:{i}"), conv, priority))
+                 for i, (conv, priority) in enumerate(submissions)]
+        await asyncio.sleep(0)
+        release.set()
+        await asyncio.gather(blocker, *tasks)
+
+    asyncio.run(scenario())
+    return order
+
+def test_in_flight_is_capped():
+    scheduler = LLMScheduler(max_in_flight=2)
+    peak = []
+
+    async def scenario():
+        async def generate():
+            peak.append(scheduler.in_flight)
+            await asyncio.sleep(0.02)
+        await asyncio.gather(*(scheduler.submit(generate, f"c{i}") for i in range(6)))
+
+    asyncio.run(scenario())
+    assert max(peak) == 2
+    assert scheduler.stats()["completed"] == 6
+    assert scheduler.in_flight == 0 and scheduler.queue_depth == 0
+
+def test_conversations_take_turns():
+    # c1 enfileira três mensagens antes de c2 e c3: nenhuma conversa monopoliza a fila
+    order = run_in_order(LLMScheduler(max_in_flight=1), [("c1", PRIORITY_NORMAL)] * 3 + [("c2", PRIORITY_NORMAL), ("c3", PRIORITY_NORMAL)])
+    assert order == ["c1:0", "c2:3", "c3:4", "c1:1", "c1:2"]
+
+def test_higher_priority_goes_first():
+    order = run_in_order(LLMScheduler(max_in_flight=1),
+                         [("summary", PRIORITY_LOW), ("c1", PRIORITY_NORMAL), ("admin", PRIORITY_HIGH)])
+    assert order == ["admin:2", "c1:1", "summary:0"]
+
+def test_full_queue_rejects():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue_size=1)
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(scheduler.submit(release.wait, "c1"))
+        queued = asyncio.create_task(scheduler.submit(release.wait, "c2"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueFullError):
+            await scheduler.submit(release.wait, "c3")
+        release.set()
+        await asyncio.gather(running, queued)
+
+    asyncio.run(scenario())
+    assert scheduler.stats()["rejected"] == 1
+
+def test_queue_timeout_frees_the_place_in_line():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue_time=0.05)
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(scheduler.submit(release.wait, "c1"))
+        await asyncio.sleep(0)
+        with pytest.raises(QueueTimeoutError):
+            await scheduler.submit(release.wait, "c2")
+        depth = scheduler.queue_depth
+        release.set()
+        await running
+        return depth
+
+    assert asyncio.run(scenario()) == 0
+    assert scheduler.stats()["timeouts"] == 1
+    assert scheduler.in_flight == 0
+
+def test_cancelled_waiter_does_not_leak_a_slot():
+    scheduler = LLMScheduler(max_in_flight=1)
+
+    async def scenario():
+        release = asyncio.Event()
+        running = asyncio.create_task(scheduler.submit(release.wait, "c1"))
+        await asyncio.sleep(0)
+        waiting = asyncio.create_task(scheduler.submit(release.wait, "c2"))
+        await asyncio.sleep(0)
+        waiting.cancel()
+        await asyncio.gather(waiting, return_exceptions=True)
+        release.set()
+        await running
+        # A vaga voltou: a próxima geração roda na hora
+        await asyncio.wait_for(scheduler.submit(lambda: asyncio.sleep(0), "c3"), 1)
+
+    asyncio.run(scenario())
+    assert scheduler.in_flight == 0 and scheduler.queue_depth == 0
@@ -0,0 +1,157 @@
+import asyncio
+
+from models.schemas import Message
+from services.message_coalescer import MessageCoalescer, begin_reply, reply_sent
+
+WINDOW = 0.05
+
+def incoming(text: str) -> Message:
+    return Message(id=text, conversation_id="c1", platform="whatsapp", sender="5511", receiver="bot",
+                   content=text, message_type="text", direction="incoming")
+
+class FakeBot:
+    """Handler no lugar do process_message: "gera" por `generate` segundos e "envia" por `send`"""
+
+    def __init__(self, generate: float = 0.0, send: float = 0.0, fail_after_send: bool = False):
+        self.generate = generate
+        self.send = send
+        self.fail_after_send = fail_after_send
+        self.started = []
+        self.sent = []
+
+    async def __call__(self, message: Message, conversation_id: str) -> bool:
+        self.started.append(message.content)
+        await asyncio.sleep(self.generate)
+        begin_reply()
+        await asyncio.sleep(self.send)
+        self.sent.append(message.content)
+        reply_sent()
+        if self.fail_after_send:
+            raise RuntimeError("falhou depois do envio")
+        return True
+
+def test_burst_inside_the_window_gets_one_reply():
+    bot = FakeBot()
+
+    async def scenario():
+        coalescer = MessageCoalescer(bot, window=WINDOW)
+        waiters = []
+        for text in ("oi", "tudo bem?", "qual o horário?"):
+            waiters.append(coalescer.submit(incoming(text), "c1"))
+            await asyncio.sleep(WINDOW / 3)
+        return await asyncio.gather(*waiters), coalescer.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert bot.sent == ["oi\ntudo bem?\nqual o horário?"]
+    assert results == [True, True, True]
+    assert (stats["turns"], stats["merged"], stats["cancelled"]) == (1, 2, 0)
+    assert stats["active_conversations"] == 0
+
+def test_message_during_generation_cancels_the_stale_reply():
+    bot = FakeBot(generate=0.3)
+
+    async def scenario():
+        coalescer = MessageCoalescer(bot, window=WINDOW)
+        first = coalescer.submit(incoming("oi"), "c1")
+        await asyncio.sleep(WINDOW + 0.1)  # turno de "oi" gerando
+        second = coalescer.submit(incoming("na verdade, quero cancelar"), "c1")
+        return await asyncio.gather(first, second), coalescer.stats()
+
+    results, stats = asyncio.run(scenario())
+    assert bot.started == ["oi", "oi\nna verdade, quero cancelar"]
+    # A resposta só para "oi" nunca sai: as duas mensagens vão para o mesmo turno
+    assert bot.sent == ["oi\nna verdade, quero cancelar"]
+    assert results == [True, True]
+    assert stats["cancelled"] == 1
+
+def test_reply_already_being_sent_is_not_cancelled():
+    bot = FakeBot(send=0.3)
+
+    async def scenario():
+        coalescer = MessageCoalescer(bot, window=WINDOW)
+        first = coalescer.submit(incoming("oi"), "c1")
+        await asyncio.sleep(WINDOW + 0.1)  # turno de "oi" já confirmado (begin_reply) e enviando
+        second = coalescer.submit(incoming("tem alguém aí?"), "c1")
+        return await asyncio.gather(first, second), coalescer.stats()
+
+    results, stats = asyncio.run(scenario())
+    # A nova mensagem espera o turno anterior terminar e ganha a própria resposta
+    assert bot.sent == ["oi", "tem alguém aí?"]
+    assert results == [True, True]
+    assert stats["cancelled"] == 0
+
+def test_failure_after_the_reply_resolves_as_done():
+    bot = FakeBot(fail_after_send=True)
+
+    async def scenario():
+        coalescer = MessageCoalescer(bot, window=WINDOW)
+        return await coalescer.submit(incoming("oi"), "c1")
+
+    # Quem reprocessa em caso de falha (worker) não pode repetir uma resposta que já saiu
+    assert asyncio.run(scenario()) is True
+    assert bot.sent == ["oi"]
+
+def test_failure_before_the_reply_reaches_the_waiters():
+    async def failing(message, conversation_id):
+        raise RuntimeError("sem resposta")
+
+    async def scenario():
+        coalescer = MessageCoalescer(failing, window=WINDOW)
+        waiter = coalescer.submit(incoming("oi"), "c1")
+        try:
+            await waiter
+        except RuntimeError as e:
+            return e
+
+    assert str(asyncio.run(scenario())) == "sem resposta"
+
+def test_process_message_turn_is_cancelled_until_the_reply_is_confirmed(monkeypatch):
+    import config
+    from controllers.messages import process_message
+    from services.intent_router import IntentRouter
+
+    class FakeStore:
+        async def get_conversation_history(self, conversation_id, limit=10):
+            return []
+
+        async def save_message(self, message):
+            return message.id
+
+    class FakeRAG:
+        def __init__(self):
+            self.generated = []
+
+        async def retrieve_context(self, query, conversation_history=None, n_results=3, query_embedding=None):
+            return []
+
+        async def generate_response(self, user_message, context, conversation_history=None, conversation_id=None,
+                                    summary=None):
+            await asyncio.sleep(0.3)
+            self.generated.append(user_message)
+            return f"resposta para {user_message!r}"
+
+    class FakeWTS:
+        def __init__(self):
+            self.sent = []
+
+        async def send_message(self, message):
+            self.sent.append(message.content)
+            return True
+
+    rag, wts = FakeRAG(), FakeWTS()
+    monkeypatch.setattr(config, "_supabase_manager", FakeStore())
+    monkeypatch.setattr(config, "_rag_system", rag)
+    monkeypatch.setattr(config, "_external_api", wts)
+    monkeypatch.setattr(config, "_intent_router", IntentRouter(rag, [], emoji_only=False))
+    monkeypatch.setattr(config, "_summarizer", None)
+
+    async def scenario():
+        coalescer = MessageCoalescer(process_message, window=WINDOW)
+        first = coalescer.submit(incoming("qual o horário?"), "c1")
+        await asyncio.sleep(WINDOW + 0.1)  # gerando a resposta só da primeira
+        second = coalescer.submit(incoming("e no sábado?"), "c1")
+        return await asyncio.gather(first, second)
+
+    assert asyncio.run(scenario()) == [True, True]
+    assert rag.generated == ["qual o horário?\ne no sábado?"]
+    assert wts.sent == ["resposta para 'qual o horário?\\ne no sábado?'"]
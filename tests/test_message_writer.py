@@ -0,0 +1,123 @@
+import asyncio
+
+from services.message_writer import MessageWriteBuffer
+
+def row(i: int, conversation_id: str = "c1") -> dict:
+    return {"id": f"m{i}", "conversation_id": conversation_id, "content": f"mensagem {i}"}
+
+class FakeTable:
+    """insert_rows em memória; `fail` decide, por lote, se a inserção falha"""
+
+    def __init__(self, delay: float = 0.0, fail=None):
+        self.delay = delay
+        self.fail = fail or (lambda rows: False)
+        self.batches = []
+        self.rows = []
+
+    async def insert_rows(self, rows):
+        await asyncio.sleep(self.delay)
+        if self.fail(rows):
+            raise ConnectionError("insert falhou")
+        self.batches.append(len(rows))
+        self.rows.extend(r["id"] for r in rows)
+
+def test_rows_are_written_in_batches():
+    table = FakeTable()
+
+    async def scenario():
+        buffer = MessageWriteBuffer(table.insert_rows, max_batch=10, flush_interval=0.05)
+        for i in range(25):
+            await buffer.add(row(i))
+        await asyncio.sleep(0.1)
+        return buffer.stats()
+
+    stats = asyncio.run(scenario())
+    assert table.batches == [10, 10, 5]
+    assert table.rows == [f"m{i}" for i in range(25)]
+    assert stats["buffered"] == 0 and stats["flushed_rows"] == 25
+
+def test_pending_rows_are_visible_until_written():
+    table = FakeTable(delay=0.1)
+
+    async def scenario():
+        buffer = MessageWriteBuffer(table.insert_rows, max_batch=10, flush_interval=0.01)
+        await buffer.add(row(1, "c1"))
+        await buffer.add(row(2, "c2"))
+        await asyncio.sleep(0.05)  # lote em gravação: ainda não chegou ao banco
+        during = [r["id"] for r in buffer.pending("c1")]
+        await asyncio.sleep(0.1)
+        return during, buffer.pending("c1")
+
+    during, after = asyncio.run(scenario())
+    assert during == ["m1"]
+    assert after == []
+
+def test_add_waits_for_space_when_the_buffer_is_full():
+    table = FakeTable(delay=0.1)
+
+    async def scenario():
+        buffer = MessageWriteBuffer(table.insert_rows, max_batch=2, flush_interval=0.01, max_buffered=2)
+        await buffer.add(row(1))
+        await buffer.add(row(2))
+        third = asyncio.create_task(buffer.add(row(3)))
+        await asyncio.sleep(0.05)
+        blocked = not third.done() and buffer.stats()["buffered"] == 2
+        await third
+        await buffer.close()
+        return blocked, buffer.stats()
+
+    blocked, stats = asyncio.run(scenario())
+    assert blocked
+    assert stats["waits_for_space"] == 1
+    assert table.rows == ["m1", "m2", "m3"]
+
+def test_failed_batch_is_retried_then_written_row_by_row():
+    # Lotes com a linha "m1" falham sempre; as outras linhas gravam sozinhas
+    table = FakeTable(fail=lambda rows: any(r["id"] == "m1" for r in rows))
+
+    async def scenario():
+        buffer = MessageWriteBuffer(table.insert_rows, max_batch=10, flush_interval=0.01, max_retries=2,
+                                    retry_base_delay=0.01)
+        for i in range(3):
+            await buffer.add(row(i))
+        await buffer.close()
+        return buffer.stats()
+
+    stats = asyncio.run(scenario())
+    assert stats["retries"] == 2
+    assert table.rows == ["m0", "m2"]
+    assert stats["dropped_rows"] == 1 and stats["flushed_rows"] == 2
+
+def test_transient_failure_is_retried_as_a_batch():
+    failures = [True, False]
+    table = FakeTable(fail=lambda rows: failures.pop(0) if failures else False)
+
+    async def scenario():
+        buffer = MessageWriteBuffer(table.insert_rows, max_batch=10, flush_interval=0.01, retry_base_delay=0.01)
+        for i in range(3):
+            await buffer.add(row(i))
+        await buffer.close()
+        return buffer.stats()
+
+    stats = asyncio.run(scenario())
+    assert table.batches == [3]
+    assert stats["retries"] == 1 and stats["dropped_rows"] == 0
+
+def test_close_flushes_pending_rows():
+    table = FakeTable()
+
+    async def scenario():
+        # Intervalo longo: sem o close, o lote parcial ainda esperaria
+        buffer = MessageWriteBuffer(table.insert_rows, max_batch=100, flush_interval=60)
+        for i in range(3):
+            await buffer.add(row(i))
+        await buffer.close()
+        try:
+            await buffer.add(row(9))
+        except RuntimeError:
+            return True
+        return False
+
+    rejected_after_close = asyncio.run(asyncio.wait_for(scenario(), 5))
+    assert table.rows == ["m0", "m1", "m2"]
+    assert rejected_after_close
@@ -0,0 +1,57 @@
+from prometheus_client import REGISTRY
+
+from services.metrics import publish_stats, render
+
+def total(component, stat, item=""):
+    return REGISTRY.get_sample_value("rag_component_total", {"component": component, "stat": stat, "item": item})
+
+def gauge(component, stat, item=""):
+    return REGISTRY.get_sample_value("rag_component_stat", {"component": component, "stat": stat, "item": item})
+
+def test_cumulative_keys_are_counters_and_the_rest_gauges():
+    publish_stats("test_cache", {"hits": 3, "misses": 1, "entries": 10, "hit_rate": 0.75, "backend": "memory"})
+
+    assert total("test_cache", "hits") == 3
+    assert total("test_cache", "misses") == 1
+    assert gauge("test_cache", "entries") == 10
+    assert gauge("test_cache", "hit_rate") == 0.75
+    assert gauge("test_cache", "hits") is None
+    assert total("test_cache", "entries") is None
+
+    publish_stats("test_cache", {"hits": 7})
+    assert total("test_cache", "hits") == 7
+
+def test_counter_groups_and_nested_dicts():
+    publish_stats("test_router", {
+        "decisions": {"rag": 5, "emoji": 2},
+        "wait_seconds": {"p50": 0.1},
+        "healthy": True,
+    })
+
+    assert total("test_router", "decisions_rag") == 5
+    assert total("test_router", "decisions_emoji") == 2
+    assert gauge("test_router", "wait_seconds_p50") == 0.1
+    assert gauge("test_router", "healthy") == 1
+
+def test_lists_are_flattened_with_an_item_label():
+    publish_stats("test_pool", {
+        "endpoints": [
+            {"url": "http://a:11434", "outstanding": 2, "requests": 10, "healthy": True},
+            {"url": "http://b:11434", "outstanding": 0, "requests": 4, "healthy": False},
+        ],
+        "hedges_fired": 1,
+        "tags": ["x", "y"],
+    })
+
+    assert gauge("test_pool", "endpoints_outstanding", "http://a:11434") == 2
+    assert gauge("test_pool", "endpoints_healthy", "http://b:11434") == 0
+    assert total("test_pool", "endpoints_requests", "http://a:11434") == 10
+    assert total("test_pool", "endpoints_requests", "http://b:11434") == 4
+    assert total("test_pool", "hedges_fired") == 1
+
+def test_render_exposes_counter_type():
+    publish_stats("test_render", {"batches": 2})
+    body, _ = render()
+    text = body.decode()
+    assert "# TYPE rag_component_total counter" in text
+    assert 'rag_component_total{component="test_render",item="",stat="batches"} 2.0' in text
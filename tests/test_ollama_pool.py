@@ -0,0 +1,119 @@
+import asyncio
+
+import httpx
+import pytest
+
+from conftest import free_port
+from services.ollama_pool import OllamaPool
+from stub_servers import create_ollama_stub, serve, shutdown
+
+CHAT = {"model": "stub", "messages": [{"role": "user", "content": "oi"}], "stream": True}
+
+def test_failing_endpoint_leaves_the_pool_after_threshold():
+    async def scenario():
+        live = await serve(create_ollama_stub(latency=0.01, reply_tokens=2, tokens_per_second=1000), free_port())
+        dead_url = f"http://127.0.0.1:{free_port()}"  # nada escutando: conexão recusada
+        pool = OllamaPool([dead_url, f"http://127.0.0.1:{live.config.port}"], failure_threshold=2, cooldown=60)
+        dead = pool.endpoints[0]
+        # Empate na escolha: a instância morta é a primeira candidata
+        errors = 0
+        try:
+            for _ in range(6):
+                try:
+                    response = await pool.post("/api/chat", CHAT)
+                    assert response.status_code == 200
+                except httpx.HTTPError:
+                    errors += 1
+        finally:
+            await pool.close()
+            await shutdown(live)
+        return pool, dead, errors
+
+    pool, dead, errors = asyncio.run(scenario())
+    assert errors == 2
+    assert dead.errors == 2
+    assert not pool.stats()["endpoints"][0]["healthy"]
+    assert pool.endpoints[1].requests == 4
+
+def test_server_errors_count_as_failures():
+    async def scenario():
+        broken = await serve(create_ollama_stub(latency=0.01, failure_rate=1.0), free_port())
+        pool = OllamaPool([f"http://127.0.0.1:{broken.config.port}"], failure_threshold=1, cooldown=60)
+        try:
+            with pytest.raises(httpx.HTTPStatusError):
+                await pool.post("/api/chat", CHAT)
+        finally:
+            await pool.close()
+            await shutdown(broken)
+        return pool
+
+    pool = asyncio.run(scenario())
+    assert pool.endpoints[0].errors == 1
+    assert not pool.stats()["endpoints"][0]["healthy"]
+
+def test_hedge_wins_and_cancels_the_slow_request():
+    async def scenario():
+        slow = await serve(create_ollama_stub(latency=2.0, reply_tokens=2, name="slow"), free_port())
+        fast = await serve(create_ollama_stub(latency=0.01, reply_tokens=2, tokens_per_second=1000, name="fast"), free_port())
+        pool = OllamaPool([f"http://127.0.0.1:{slow.config.port}", f"http://127.0.0.1:{fast.config.port}"],
+                          hedge_delay=0.1)
+        try:
+            started = asyncio.get_running_loop().time()
+            response = await pool.post("/api/chat", CHAT)
+            elapsed = asyncio.get_running_loop().time() - started
+        finally:
+            await pool.close()
+            await shutdown(slow, fast)
+        return pool, response, elapsed
+
+    pool, response, elapsed = asyncio.run(scenario())
+    assert "[fast]" in response.text
+    assert elapsed < 1.0
+    stats = pool.stats()
+    assert stats["hedges_fired"] == 1
+    assert stats["hedges_won"] == 1
+    # A requisição lenta foi cancelada: nada fica contado como em andamento nem como erro
+    assert [e.outstanding for e in pool.endpoints] == [0, 0]
+    assert pool.endpoints[0].errors == 0
+
+def test_no_hedge_when_primary_answers_in_time():
+    async def scenario():
+        a = await serve(create_ollama_stub(latency=0.01, reply_tokens=2, tokens_per_second=1000), free_port())
+        b = await serve(create_ollama_stub(latency=0.01, reply_tokens=2, tokens_per_second=1000), free_port())
+        pool = OllamaPool([f"http://127.0.0.1:{a.config.port}", f"http://127.0.0.1:{b.config.port}"], hedge_delay=1.0)
+        try:
+            await pool.post("/api/chat", CHAT)
+        finally:
+            await pool.close()
+            await shutdown(a, b)
+        return pool
+
+    pool = asyncio.run(scenario())
+    assert pool.stats()["hedges_fired"] == 0
+    assert sum(e.requests for e in pool.endpoints) == 1
+
+def test_cancelled_caller_does_not_leave_requests_running():
+    async def scenario():
+        slow = await serve(create_ollama_stub(latency=2.0, reply_tokens=2), free_port())
+        other = await serve(create_ollama_stub(latency=2.0, reply_tokens=2), free_port())
+        pool = OllamaPool([f"http://127.0.0.1:{slow.config.port}", f"http://127.0.0.1:{other.config.port}"],
+                          hedge_delay=0.3)
+        outstanding = []
+        try:
+            # Cancelado antes do hedge (só a primária em voo) e depois dele (as duas em voo)
+            for delay in (0.1, 0.5):
+                call = asyncio.create_task(pool.post("/api/chat", CHAT))
+                await asyncio.sleep(delay)
+                call.cancel()
+                with pytest.raises(asyncio.CancelledError):
+                    await call
+                outstanding.append([e.outstanding for e in pool.endpoints])
+        finally:
+            await pool.close()
+            await shutdown(slow, other)
+        return pool, outstanding
+
+    pool, outstanding = asyncio.run(scenario())
+    assert outstanding == [[0, 0], [0, 0]]
+    assert pool.stats()["hedges_fired"] == 1
+    assert [e.errors for e in pool.endpoints] == [0, 0]
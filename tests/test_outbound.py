@@ -0,0 +1,76 @@
+import asyncio
+import time
+
+from conftest import free_port
+from models.schemas import Message
+from services.outbound import DeadLetterStore, TokenBucket
+from services.wts_api import WtsAPIService
+from stub_servers import create_wts_stub, serve, shutdown
+
+def reply(i: int, sender: str = "1190000001") -> Message:
+    return Message(id=str(i), conversation_id="c", platform="whatsapp", sender=sender, receiver=f"1198{i:07d}",
+                   content=f"resposta {i}", message_type="text", direction="outgoing")
+
+def send_all(app, messages, **options):
+    """Envia as mensagens pelo dispatcher contra o stub; retorna resultados, stats e dead-letters"""
+    async def scenario():
+        server = await serve(app, free_port())
+        dead_letters = DeadLetterStore()
+        service = WtsAPIService("test", api_url=f"http://127.0.0.1:{server.config.port}",
+                                dispatcher_options={"dead_letters": dead_letters, **options})
+        try:
+            results = await asyncio.gather(*(service.send_message(m) for m in messages))
+            return results, await service.dispatcher.stats(), await dead_letters.recent()
+        finally:
+            await service.close()
+            await shutdown(server)
+    return asyncio.run(scenario())
+
+def test_429_is_retried_after_retry_after():
+    app = create_wts_stub(latency=0.0, rate_limit=2, rate_burst=1, retry_after=0.3)
+    # Sem limite no dispatcher: o segundo envio leva 429 e espera o Retry-After
+    results, stats, dead = send_all(app, [reply(1), reply(2)], rate=0, max_attempts=3, retry_base_delay=0.01)
+
+    assert results == [True, True]
+    assert app.state.rate_limited >= 1
+    assert stats["rate_limited"] == app.state.rate_limited
+    assert stats["retries"] >= 1
+    assert dead == []
+
+def test_exhausted_retries_reach_the_dead_letter_store():
+    app = create_wts_stub(latency=0.0, failure_rate=1.0)
+    results, stats, dead = send_all(app, [reply(1)], rate=0, max_attempts=3, retry_base_delay=0.01)
+
+    assert results == [False]
+    assert stats["failed"] == 1 and stats["retries"] == 2
+    assert len(dead) == 1
+    assert dead[0]["attempts"] == 3 and dead[0]["status"] == 500
+    assert dead[0]["payload"]["to"] == "+5511980000001"
+
+def test_send_time_limit_moves_long_retries_to_the_dead_letter_store():
+    app = create_wts_stub(latency=0.0, rate_limit=1, rate_burst=1, retry_after=5)
+    started = time.monotonic()
+    results, stats, dead = send_all(app, [reply(1), reply(2)], rate=0, max_attempts=4, max_send_time=1)
+
+    # O Retry-After de 5s não cabe no limite de 1s: o envio desiste sem esperar
+    assert time.monotonic() - started < 3
+    assert sorted(results) == [False, True]
+    assert stats["expired"] == 1
+    assert dead[0]["status"] == 429 and "esgotado" in dead[0]["error"]
+
+def test_bucket_does_not_hold_other_waiters_during_a_wait():
+    async def scenario():
+        bucket = TokenBucket(rate=10, burst=1)
+        assert await bucket.acquire() < 0.01
+        # Quem não pode esperar 1s desiste na hora, sem consumir token nem esperar a fila
+        started = time.monotonic()
+        waiting = asyncio.create_task(bucket.acquire())
+        await asyncio.sleep(0)
+        assert await bucket.acquire(max_wait=0.01) is None
+        assert time.monotonic() - started < 0.05
+        waited = await waiting
+        return waited, await bucket.acquire()
+
+    first, second = asyncio.run(scenario())
+    assert 0.05 < first < 0.2
+    assert 0.05 < second < 0.2
@@ -0,0 +1,85 @@
+import asyncio
+import gzip
+import os
+from datetime import date
+
+import asyncpg
+import pytest
+
+from services.partitions import PartitionMaintainer
+
+TODAY = date(2024, 6, 15)
+
+async def seed(dsn: str) -> None:
+    """Partições de jan/2024 a ago/2024 com uma mensagem em jan, fev e mar"""
+    connection = await asyncpg.connect(dsn)
+    try:
+        await connection.execute("SELECT ensure_message_partitions('2024-01-01', 7)")
+        conversation_id = await connection.fetchval(
+            "INSERT INTO conversations (phone_number) VALUES ('5511') RETURNING id"
+        )
+        for month in (1, 2, 3):
+            await connection.execute("""
+                INSERT INTO messages (conversation_id, platform, sender, receiver, content, direction, message_type, created_at)
+                VALUES ($1, 'whatsapp', '5511', 'bot', $2, 'incoming', 'text', $3)
+            """, conversation_id, f"mês {month}", date(2024, month, 10))
+    finally:
+        await connection.close()
+
+async def tables(dsn: str) -> dict:
+    """{nome: anexada} das tabelas messages_AAAA_MM"""
+    connection = await asyncpg.connect(dsn)
+    try:
+        return {name: attached for name, _, attached in await PartitionMaintainer._partitions(connection)}
+    finally:
+        await connection.close()
+
+def run(maintainer: PartitionMaintainer, dsn: str):
+    async def scenario():
+        result = await maintainer.run_once(TODAY)
+        return result, await tables(dsn)
+    return asyncio.run(scenario())
+
+def test_archive_copies_the_rows_before_dropping(postgres_dsn, tmp_path):
+    asyncio.run(seed(postgres_dsn))
+    result, remaining = run(PartitionMaintainer(postgres_dsn, 3, "archive", str(tmp_path)), postgres_dsn)
+
+    assert [r["partition"] for r in result["removed"]] == ["messages_2024_01", "messages_2024_02"]
+    assert [r["rows"] for r in result["removed"]] == [1, 1]
+    assert "messages_2024_01" not in remaining and "messages_2024_02" not in remaining
+    assert remaining["messages_2024_03"] is True
+    with gzip.open(tmp_path / "messages_2024_01.csv.gz", "rt") as f:
+        lines = f.read().splitlines()
+    assert len(lines) == 2 and "mês 1" in lines[1]
+    assert not [name for name in os.listdir(tmp_path) if name.endswith(".partial")]
+
+def test_detach_keeps_the_table_outside_messages(postgres_dsn, tmp_path):
+    asyncio.run(seed(postgres_dsn))
+    maintainer = PartitionMaintainer(postgres_dsn, 3, "detach", str(tmp_path))
+    result, remaining = run(maintainer, postgres_dsn)
+
+    assert [r["partition"] for r in result["removed"]] == ["messages_2024_01", "messages_2024_02"]
+    assert remaining["messages_2024_01"] is False and remaining["messages_2024_02"] is False
+    assert os.listdir(tmp_path) == []
+    # Já desanexadas: a próxima rodada não mexe nelas
+    result, _ = run(maintainer, postgres_dsn)
+    assert result["removed"] == []
+
+def test_drop_removes_detached_tables_left_by_detach(postgres_dsn, tmp_path):
+    asyncio.run(seed(postgres_dsn))
+    run(PartitionMaintainer(postgres_dsn, 3, "detach"), postgres_dsn)
+    result, remaining = run(PartitionMaintainer(postgres_dsn, 3, "drop"), postgres_dsn)
+
+    assert [r["partition"] for r in result["removed"]] == ["messages_2024_01", "messages_2024_02"]
+    assert "messages_2024_01" not in remaining and "messages_2024_02" not in remaining
+
+def test_failed_archive_leaves_the_partition_attached(postgres_dsn, tmp_path):
+    asyncio.run(seed(postgres_dsn))
+    # Diretório do arquivo é um arquivo comum: a cópia falha antes de desanexar
+    blocker = tmp_path / "archive"
+    blocker.write_text("")
+    with pytest.raises(OSError):
+        run(PartitionMaintainer(postgres_dsn, 3, "archive", str(blocker)), postgres_dsn)
+
+    remaining = asyncio.run(tables(postgres_dsn))
+    assert remaining["messages_2024_01"] is True and remaining["messages_2024_02"] is True
@@ -0,0 +1,129 @@
+import asyncio
+import uuid
+
+import asyncpg
+import pytest
+from prometheus_client import REGISTRY
+
+from models.schemas import Message
+from services.conversation_cache import ConversationCache
+from services.migrations import MigrationRunner
+from services.postgres_manager import PostgresManager
+
+def incoming(phone: str, content: str = "oi") -> Message:
+    return Message(id=str(uuid.uuid4()), conversation_id="", platform="whatsapp", sender=phone, receiver="bot",
+                   content=content, message_type="text", direction="incoming")
+
+def test_save_incoming_creates_the_conversation_once(postgres_dsn):
+    async def scenario():
+        store = PostgresManager(postgres_dsn, min_size=1, max_size=2)
+        await store.initialize()
+        try:
+            first = await store.save_incoming_message("5511", incoming("5511", "primeira"))
+            second = await store.save_incoming_message("5511", incoming("5511", "segunda"))
+            history = await store.get_conversation_history(first, 10)
+        finally:
+            await store.close()
+        return first, second, history
+
+    first, second, history = asyncio.run(scenario())
+    assert first == second
+    assert [m["content"] for m in history] == ["primeira", "segunda"]
+
+def test_concurrent_first_messages_share_one_conversation(postgres_dsn):
+    async def scenario():
+        # Dois pools simulam dois processos, sem o lock em memória do ConversationCache
+        stores = [PostgresManager(postgres_dsn, min_size=4, max_size=8) for _ in range(2)]
+        for store in stores:
+            await store.initialize()
+        try:
+            ids = await asyncio.gather(*(
+                stores[i % 2].save_incoming_message("5522", incoming("5522", f"m{i}")) for i in range(16)
+            ))
+            created = await asyncio.gather(*(stores[i % 2].get_or_create_conversation("5533") for i in range(16)))
+            counts = await stores[0].pool.fetchrow("""
+                SELECT (SELECT count(*) FROM conversations WHERE phone_number = '5522') AS conversations,
+                       (SELECT count(*) FROM messages WHERE sender = '5522') AS messages
+            """)
+        finally:
+            for store in stores:
+                await store.close()
+        return ids, created, counts
+
+    ids, created, counts = asyncio.run(scenario())
+    assert len(set(ids)) == 1
+    assert len(set(created)) == 1
+    assert counts["conversations"] == 1
+    assert counts["messages"] == 16
+
+def test_save_incoming_uses_the_conversation_created_by_another_process(postgres_dsn):
+    async def scenario():
+        store = PostgresManager(postgres_dsn, min_size=1, max_size=2)
+        await store.initialize()
+        other = await asyncpg.connect(postgres_dsn)
+        try:
+            other_id = str(uuid.uuid4())
+            transaction = other.transaction()
+            await transaction.start()
+            await other.execute("INSERT INTO conversations (id, phone_number) VALUES ($1, '5544')", other_id)
+            # O insert da conversa no CTE espera a transação acima (índice único) e perde a corrida
+            save = asyncio.create_task(store.save_incoming_message("5544", incoming("5544")))
+            await asyncio.sleep(0.2)
+            assert not save.done()
+            await transaction.commit()
+            conversation_id = await save
+            saved = await other.fetchval("SELECT count(*) FROM messages WHERE conversation_id = $1", other_id)
+        finally:
+            await other.close()
+            await store.close()
+        return other_id, conversation_id, saved
+
+    other_id, conversation_id, saved = asyncio.run(scenario())
+    assert conversation_id == other_id
+    assert saved == 1
+
+def test_unique_phone_migration_refuses_existing_duplicates(postgres_dsn):
+    async def scenario():
+        connection = await asyncpg.connect(postgres_dsn)
+        try:
+            # Volta ao estado anterior à 0005, com um telefone duplicado
+            await connection.execute("DROP INDEX idx_conversations_phone")
+            await connection.execute("DELETE FROM schema_migrations WHERE version = '0005'")
+            await connection.execute("INSERT INTO conversations (phone_number) VALUES ('5555'), ('5555')")
+            with pytest.raises(asyncpg.RaiseError, match="1 telefone"):
+                await MigrationRunner(connection).migrate()
+            duplicates = await connection.fetchval("SELECT count(*) FROM conversations WHERE phone_number = '5555'")
+            pending = [m.version for m in await MigrationRunner(connection).pending()]
+        finally:
+            await connection.close()
+        return duplicates, pending
+
+    duplicates, pending = asyncio.run(scenario())
+    # Nada foi aplicado nem apagado
+    assert duplicates == 2
+    assert pending == ["0005"]
+
+def stage_count(stage: str) -> float:
+    return REGISTRY.get_sample_value("rag_stage_duration_seconds_count", {"stage": stage}) or 0.0
+
+def test_save_incoming_stage_labels(postgres_dsn):
+    stages = ("conversation_lookup", "supabase_insert", "save_incoming")
+
+    async def scenario():
+        store = PostgresManager(postgres_dsn, min_size=1, max_size=2, conversation_cache=ConversationCache())
+        await store.initialize()
+        try:
+            before = [stage_count(s) for s in stages]
+            await store.save_incoming_message("5566", incoming("5566"))
+            after_miss = [stage_count(s) for s in stages]
+            await store.save_incoming_message("5566", incoming("5566"))
+            after_hit = [stage_count(s) for s in stages]
+        finally:
+            await store.close()
+        return before, after_miss, after_hit
+
+    before, after_miss, after_hit = asyncio.run(scenario())
+    # Fora do cache: consulta do cache e a consulta única do Postgres
+    assert [b - a for a, b in zip(before, after_miss)] == [1, 0, 1]
+    # Em cache: as etapas de antes (busca e insert separados)
+    assert [b - a for a, b in zip(after_miss, after_hit)] == [1, 1, 0]
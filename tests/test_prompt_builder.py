@@ -0,0 +1,29 @@
+import pytest
+
+from services.prompt_builder import DEFAULT_PROMPT_VERSION, PROMPT_TEMPLATES, PromptBuilder
+
+HISTORY = [{"direction": "incoming", "content": f"pergunta {i}"} for i in range(8)]
+
+def test_v2_carries_the_summary_after_the_instructions():
+    messages = PromptBuilder("v2").build("nova pergunta", ["doc"], HISTORY[-2:], summary="cliente quer um orçamento")
+
+    assert messages[0]["content"] == PROMPT_TEMPLATES["v2"].system
+    assert messages[1] == {"role": "system", "content": "Resumo da conversa até aqui:\ncliente quer um orçamento"}
+    assert [m["content"] for m in messages[2:4]] == ["pergunta 6", "pergunta 7"]
+
+def test_v1_prompt_is_unchanged_by_summaries():
+    builder = PromptBuilder("v1", history_turns=5)
+    with_summary = builder.build("nova pergunta", ["doc"], HISTORY, summary="cliente quer um orçamento")
+
+    assert PROMPT_TEMPLATES["v1"].summary is None
+    assert with_summary == builder.build("nova pergunta", ["doc"], HISTORY)
+    assert len(with_summary) == 1 + 5 + 1
+
+def test_v2_only_adds_the_summary_block():
+    v1, v2 = PROMPT_TEMPLATES["v1"], PROMPT_TEMPLATES["v2"]
+    assert DEFAULT_PROMPT_VERSION == "v2"
+    assert (v2.system, v2.context_header, v2.empty_context, v2.question) == (v1.system, v1.context_header, v1.empty_context, v1.question)
+
+def test_unknown_version_is_rejected():
+    with pytest.raises(ValueError):
+        PromptBuilder("v0")
@@ -0,0 +1,97 @@
+import asyncio
+
+from services.llm_scheduler import LLMScheduler
+from services.summarizer import ConversationSummarizer
+
+def message(i: int, tz: str = "+00:00") -> dict:
+    return {"id": f"m{i}", "direction": "incoming", "content": f"mensagem {i}",
+            "created_at": f"2024-01-01T10:{i:02d}:00{tz}"}
+
+class FakeStore:
+    def __init__(self):
+        self.updates = []
+
+    async def get_conversation_summary(self, conversation_id):
+        return None
+
+    async def update_conversation(self, conversation_id, data):
+        self.updates.append((conversation_id, data))
+        return {"id": conversation_id, **data}
+
+class FakeRAG:
+    def __init__(self):
+        self.folded = []
+
+    async def summarize(self, previous, history, max_chars, num_predict, conversation_id=None):
+        self.folded.append([m["id"] for m in history])
+        return f"resumo de {len(history)} mensagens"
+
+def summarizer(scheduler=None, every: int = 4, keep: int = 2):
+    store, rag = FakeStore(), FakeRAG()
+    return ConversationSummarizer(store, rag, scheduler or LLMScheduler(), every=every, keep=keep), store, rag
+
+def test_recent_keeps_only_messages_after_the_summary():
+    s, _, _ = summarizer()
+    history = [message(i) for i in range(1, 6)]
+    summary = {"summary": "…", "summary_through": message(3)["created_at"]}
+
+    assert [m["id"] for m in s.recent(summary, history)] == ["m4", "m5"]
+    assert s.recent(None, history) == history
+
+def test_recent_compares_naive_and_aware_timestamps_in_utc():
+    s, _, _ = summarizer()
+    # created_at sem fuso (UTC) contra summary_through com fuso de -03:00 (10:03 UTC)
+    history = [message(i, tz="") for i in range(1, 6)]
+    summary = {"summary": "…", "summary_through": "2024-01-01T07:03:00-03:00"}
+
+    assert [m["id"] for m in s.recent(summary, history)] == ["m4", "m5"]
+
+def test_summary_is_scheduled_only_past_the_threshold():
+    s, store, rag = summarizer(every=4, keep=2)
+
+    async def scenario():
+        below = s.maybe_schedule("c1", None, [message(i) for i in range(1, 6)])
+        at = s.maybe_schedule("c1", None, [message(i) for i in range(1, 7)])
+        # Já há um resumo em andamento para a conversa: não agenda outro
+        again = s.maybe_schedule("c1", None, [message(i) for i in range(1, 7)])
+        await asyncio.gather(*s._tasks.values())
+        return below, at, again, await s.get("c1")
+
+    below, at, again, cached = asyncio.run(scenario())
+    assert (below, at, again) == (False, True, False)
+    # As `keep` mais recentes ficam fora do resumo
+    assert rag.folded == [["m1", "m2", "m3", "m4"]]
+    assert store.updates[0][1]["summary_through"] == message(4)["created_at"]
+    assert cached == {"summary": "resumo de 4 mensagens", "summary_through": message(4)["created_at"]}
+    assert s.stats()["messages_folded"] == 4
+
+def test_messages_already_summarized_do_not_count_for_the_threshold():
+    s, _, _ = summarizer(every=4, keep=2)
+    summary = {"summary": "…", "summary_through": message(3)["created_at"]}
+
+    async def scenario():
+        return s.maybe_schedule("c1", summary, [message(i) for i in range(1, 9)])
+
+    # 8 no histórico, mas só 5 depois do resumo (< every + keep)
+    assert asyncio.run(scenario()) is False
+
+def test_summary_is_deferred_when_the_scheduler_is_full():
+    scheduler = LLMScheduler(max_in_flight=1, max_queue_size=1)
+    s, store, rag = summarizer(scheduler)
+
+    async def scenario():
+        release = asyncio.Event()
+        # Uma geração ocupa a vaga e outra ocupa a fila
+        busy = [asyncio.create_task(scheduler.submit(release.wait, "outra")) for _ in range(2)]
+        await asyncio.sleep(0)
+        scheduled = s.maybe_schedule("c1", None, [message(i) for i in range(1, 7)])
+        await asyncio.gather(*s._tasks.values())
+        release.set()
+        await asyncio.gather(*busy)
+        return scheduled
+
+    assert asyncio.run(scenario()) is True
+    assert s.stats()["deferred"] == 1
+    assert rag.folded == [] and store.updates == []
+    # Adiado não conta como em andamento: o próximo turno tenta de novo
+    assert s.stats()["in_flight"] == 0